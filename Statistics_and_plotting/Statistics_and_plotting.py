@@ -2,411 +2,251 @@
 # Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
 # Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
 
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import pingouin as pg
-import seaborn as sns
+import asyncio
+import contextvars
 import os
-import itertools
-import statistics as stats
 import math
-import ipywidgets as widgets
-from ipywidgets import HBox, VBox, Layout
-
-from IPython.display import display
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from .cache import ResultCache, default_cache as stats_cache, get_cache_key
+from .comparisons import ComparisonPlan
+from .engine import TESTS, compute_stats
+from .export import FIGURE_FORMATS, TABLE_FORMATS, export_results, get_download_link, get_result_tables, write_figures_in_background
+from .ingestion import read_upload
+from .lazy_imports import lazy_import
+from .plotting import PlotSession, PlotSettings, get_all_stats_to_annotate
+from .profiling import format_report, profiling
+
+# ipywidgets & IPython.display are only imported when the widget is launched, matplotlib when the first plot is created
+# (see lazy_imports.py)
+widgets = lazy_import('ipywidgets')
+ipython_display = lazy_import('IPython.display')
+plt = lazy_import('matplotlib.pyplot')
 
 ###################################################################
 #Overview:
 
-    # 1 Compute statistics
-    # 2 Annotate stats within the plots
-    # 3 Functions that are triggered by clicking the widget buttons
+    # 1 Compute statistics (via engine.py)
+    # 2 Collect the customization & annotation choices (plotting: see plotting.py)
+    # 3 Functions that are triggered by clicking the widget buttons (the work runs in the background)
     # 4 Create all widget elements
     # 5 Specify widget layout and launch it
-    # 6 Process statistical results for download
+    # (Processing of the statistical results for download lives in engine.py & export.py)
 
 ###################################################################
 
 
 ###################################################################
-# 1 Functions to compute the different statistics
-# 1.1 Comparison of independent samples
-def independent_samples():
-    global data_col, group_col, d_main, l_groups, performed_test
-    data_col = df.columns[0]
-    group_col = df.columns[1]
-
-    d_main = {}
-    l_groups = list(df[group_col].unique())
-    for group_id in l_groups:
-        d_main[group_id] = {'data': df.loc[df[group_col] == group_id, data_col].values,
-                            'normality_full': pg.normality(df.loc[df[group_col] == group_id, data_col].values),
-                            'normality_bool': pg.normality(df.loc[df[group_col] == group_id, data_col].values)['normal'][0]}
-
-    n_groups = len(l_groups)
-
-    d_main['summary'] = {'normality': all([d_main[elem]['normality_bool'] for elem in l_groups]),
-                         'homoscedasticity': pg.homoscedasticity([d_main[elem]['data'] for elem in l_groups])['equal_var'][0]}
-
-    parametric = all([d_main['summary']['normality'], d_main['summary']['homoscedasticity']])
-
-    if len(l_groups) > 2:
-        if parametric:
-            d_main['summary']['group_level_statistic'] = pg.anova(data=df, dv=data_col, between=group_col)
-            performed_test = 'One-way ANOVA'
-        else:
-            d_main['summary']['group_level_statistic'] = pg.kruskal(data=df, dv=data_col, between=group_col)
-            performed_test = 'Kruskal-Wallis-ANOVA'
-
-    if len(l_groups) > 1:
-        d_main['summary']['pairwise_comparisons'] = pg.pairwise_ttests(data=df, dv=data_col, between=group_col, parametric=parametric, padjust='holm')
-
-    else:
-        print('Error: The group_id column has to contain at least two different group_ids for this selection.\
-        \nDid you mean to perform a one-sample test?')   
-
-
-# 1.2 Data vs. fixed value:
-def one_sample():
-    global data_col, group_col, d_main, l_groups, performed_test, fixed_val_col, fixed_value
-    data_col = df.columns[0]
-    group_col = df.columns[1]
-    fixed_val_col = df.columns[2]
-    
-    d_main = {}
-    fixed_value = df[fixed_val_col].values[0]
-    l_groups = list(df[group_col].unique())
-    
-    group_id = l_groups[0]
-    d_main[group_id] = {'data': df.loc[df[group_col] == group_id, data_col].values,
-                        'normality_full': pg.normality(df.loc[df[group_col] == group_id, data_col].values),
-                        'normality_bool': pg.normality(df.loc[df[group_col] == group_id, data_col].values)['normal'][0]}
-    parametric = d_main[group_id]['normality_bool']
-    
-    d_main['summary'] = {'normality_full': pg.normality(df.loc[df[group_col] == group_id, data_col].values),
-                         'normality_bool': pg.normality(df.loc[df[group_col] == group_id, data_col].values)['normal'][0]}
-
-    if parametric == True:
-        d_main['summary']['pairwise_comparisons'] = pg.ttest(df[data_col].values, fixed_value)
-        performed_test = 'one sample t-test'
-    else:    
-        d_main['summary']['pairwise_comparisons'] = pg.wilcoxon(df[data_col].values - fixed_value, correction='auto')
-        performed_test = 'one sample wilcoxon rank-sum test' 
-        
-        
-# 1.3 Mixed-model ANOVA:
-def mixed_model_ANOVA():
-    global d_main, data_col, group_col, subject_col, session_col, l_groups, l_sessions, performed_test
-    data_col = df.columns[0]
-    group_col = df.columns[1]
-    subject_col = df.columns[2]
-    session_col = df.columns[3]
-    
-    d_main = {}
-    l_groups = list(df[group_col].unique())
-    l_sessions = list(df[session_col].unique())
-
-    for group_id in l_groups:
-        for session_id in l_sessions:       
-            d_main[group_id, session_id] = {'data': df.loc[(df[group_col] == group_id) & (df[session_col] == session_id), data_col].values,
-                                            'mean': df.loc[(df[group_col] == group_id) & (df[session_col] == session_id), data_col].mean(),
-                                            'normality_full': pg.normality(df.loc[(df[group_col] == group_id) 
-                                                                                  & (df[session_col] == session_id), data_col].values),
-                                            'normality_bool': pg.normality(df.loc[(df[group_col] == group_id) 
-                                                                                  & (df[session_col] == session_id), data_col].values)['normal'][0]}
-
-    n_groups = len(l_groups)*len(l_sessions)
-    d_main['summary'] = {}
-        
-    d_main['summary'] = {'normality': all([d_main[key]['normality_bool'] for key in d_main.keys() if key != 'summary']),
-                         'homoscedasticity': pg.homoscedasticity([d_main[key]['data'] for key in d_main.keys() if key != 'summary'])['equal_var'][0]}    
-   
-    parametric = all([d_main['summary']['normality'], d_main['summary']['homoscedasticity']])
-
-    d_main['summary']['group_level_statistic'] = pg.mixed_anova(data=df, dv=data_col, within=session_col, subject=subject_col, between=group_col)
-    performed_test = 'Mixed-model ANOVA'
-    # If we found some non-parametric alternative this could be implemented here
-    if parametric == False:
-        print ("Please be aware that the data require non-parametric testing.\n\
-        However, this is not implemented yet and a parametric test is computed instead.")
-        
-    d_main['summary']['pairwise_comparisons'] = pg.pairwise_ttests(data=df, dv=data_col, 
-                                                                   within=session_col, subject=subject_col, 
-                                                                   between=group_col, padjust='holm')
+# 1 Compute the statistics with the widget-free engine (see engine.py)
+#   and expose the results to the plotting and annotation functions.
+#   Results are cached, so that re-uploading a file or toggling back to a previous
+#   test selection does not compute everything again. The figure is kept alive in a
+#   PlotSession, so that refreshing the plot only redraws what changed (see plotting.py).
+#   The tables for download are also cached, so that repeated downloads only serialize them.
+plot_session, plot_session_key = None, None
+table_cache = ResultCache(max_entries=8)
+
+
+#   Notices of the engine (e.g. that the data require non-parametric testing) are warnings, which would not be shown
+#   from the background thread. They are recorded and printed with the results, also when these come from the cache.
+d_stats_messages = {}
+package_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def compute_selected_stats(df, test, plan=None):
+    results_key = get_cache_key(df, test, plan)
+    with warnings.catch_warnings(record=True) as l_warnings:
+        warnings.simplefilter('always', UserWarning)
+        results = stats_cache.get_or_compute(results_key, compute_stats, df, test, plan)
+    if results_key not in d_stats_messages:
+        d_stats_messages[results_key] = [str(warning.message) for warning in l_warnings
+                                         if issubclass(warning.category, UserWarning) and warning.filename.startswith(package_dir)]
+    return results_key, results, d_stats_messages[results_key]
+
+
+def set_globals_from_results(results):
+    global data_col, group_col, subject_col, session_col, fixed_val_col, fixed_value
+    global d_main, l_groups, l_sessions, performed_test
+    data_col = results.data_col
+    group_col = results.group_col
+    subject_col = results.subject_col
+    session_col = results.session_col
+    fixed_val_col = results.fixed_val_col
+    fixed_value = results.fixed_value
+    d_main = results.d_main
+    l_groups = list(results.l_groups)
+    l_sessions = list(results.l_sessions)
+    performed_test = results.performed_test
 
 ###################################################################    
 
     
 ###################################################################
-# 2 Functions to annotate the results of the statistical tests in the respective plots:
-# 2.1 Get and update all customization values that were set by the user:
+# 2 Functions to collect the customization & annotation choices of the user (plotting itself: see plotting.py):
+# 2.1 Get all customization values that were set by the user:
 def get_customization_values():
-    global distance_stars_to_brackets, distance_brackets_to_data, fontsize_stars_bold
-    global linewidth_annotations, fontsize_stars, annotation_brackets_factor
-    global l_xlabel_order, l_hue_order
-    
-    distance_stars_to_brackets = set_distance_stars_to_brackets.value
-    distance_brackets_to_data = set_distance_brackets_to_data.value
-    fontsize_stars = set_fontsize_stars.value
-    linewidth_annotations = set_linewidth_annotations.value
-    
-    if set_stars_fontweight_bold.value == True:
-        fontsize_stars_bold = 'bold'
-    else:
-        fontsize_stars_bold = 'normal'
-    
-    if select_bracket_no_bracket.value == 'Brackets':
-        annotation_brackets_factor = 1
-    else:
-        annotation_brackets_factor = 0
-
-    l_xlabel_order = []
-    l_xlabel_string = set_xlabel_order.value
-    
-    while ', ' in l_xlabel_string:
-        l_xlabel_order.append(l_xlabel_string[:l_xlabel_string.index(', ')])
-        l_xlabel_string = l_xlabel_string[l_xlabel_string.index(', ')+2:]
+    l_xlabel_order = tuple(set_xlabel_order.value.split(', '))
+    l_hue_order = tuple(set_hue_order.value.split(', '))
 
-    l_xlabel_order.append(l_xlabel_string)
-    
-    l_hue_order = []
-    l_hue_string = set_hue_order.value
-    
-    while ', ' in l_hue_string:
-        l_hue_order.append(l_hue_string[:l_hue_string.index(', ')])
-        l_hue_string = l_hue_string[l_hue_string.index(', ')+2:]
-
-    l_hue_order.append(l_hue_string)
-    
-        
-# 2.2 Get l_stats_to_annotate:
-# 2.2.1 For independent samples:
-def get_l_stats_to_annotate_independent_samples():
-    l_stats_to_annotate = []
-    if set_annotate_all.value==True:
-        for i in range(len(l_checkboxes)):
-            l_checkboxes[i].value = True
-    for i in range(len(l_checkboxes)):
-        if l_checkboxes[i].value:
-            checkbox_description = l_checkboxes[i].description
-            group1 = checkbox_description[:checkbox_description.index(' ')]
-            group2 = checkbox_description[checkbox_description.index(' vs. ') + 5 :]
-            l_stats_to_annotate.append((group1, group2))
-    return l_stats_to_annotate
-
-
-# 2.2.2 For Mixed-Model-ANOVA:
-def get_l_stats_to_annotate_mma():
-    l_stats_to_annotate = []
-    if set_annotate_all.value==True:
-        for i in range(len(l_checkboxes)):
-            l_checkboxes[i][1].value = True
-    for i in range(len(l_checkboxes)):
-        if l_checkboxes[i][1].value:
-            checkbox_description = l_checkboxes[i][1].description
-            group1 = checkbox_description[:checkbox_description.index(' ')]
-            group2 = checkbox_description[checkbox_description.index(' vs. ') + 5 :]
-            session_id = l_checkboxes[i][0]
-            l_stats_to_annotate.append((group1, group2, session_id))
-    return l_stats_to_annotate
-
-
-# 2.3 Get the 'stars' string for the respective pairwise comparison:
-def get_stars_str(df_tmp, group1, group2):
-    if df_tmp.loc[(df_tmp['A'] == group1) & (df_tmp['B'] == group2)].shape[0] > 0:
-        if 'p-corr' in df_tmp.loc[(df_tmp['A'] == group1) & (df_tmp['B'] == group2)].columns:
-            pval = df_tmp.loc[(df_tmp['A'] == group1) & (df_tmp['B'] == group2), 'p-corr'].iloc[0]
-        else:
-            pval = df_tmp.loc[(df_tmp['A'] == group1) & (df_tmp['B'] == group2), 'p-unc'].iloc[0]
+    if select_palette_or_individual_color.value == 0:
+        color_palette = select_color_palettes.value
+    else:
+        color_palette = {}
+        for group_id in l_groups:
+            color_palette[group_id] = group_colors_vbox.children[l_groups.index(group_id)].value
 
-    elif df_tmp.loc[(df_tmp['B'] == group1) & (df_tmp['A'] == group2)].shape[0] > 0:
-        if 'p-corr' in df_tmp.loc[(df_tmp['B'] == group1) & (df_tmp['A'] == group2)].columns:
-            pval = df_tmp.loc[(df_tmp['B'] == group1) & (df_tmp['A'] == group2), 'p-corr'].iloc[0]
-        else:
-            pval = df_tmp.loc[(df_tmp['B'] == group1) & (df_tmp['A'] == group2), 'p-unc'].iloc[0]
+    if set_yaxis_scaling_mode.value == 1:
+        ylims = (set_yaxis_lower_lim.value, set_yaxis_upper_lim.value)
     else:
-        print('There was an error with annotating the stats!')
-    if pval <= 0.001:
-        stars = '***'
-    elif pval <= 0.01:
-        stars = '**'
-    elif pval <= 0.05:
-        stars = '*'
-    else: 
-        stars = 'n.s.'
-    return stars
-
-
-# 2.4 Annotate the stats in the respective plots
-# 2.4.1 Annotate stats in independent sample plots:
-def annotate_stats_independent_samples(l_stats_to_annotate):
-    if len(l_stats_to_annotate) > 0:
-        max_total = df[data_col].max()
-        y_shift_annotation_line = max_total * distance_brackets_to_data
-        brackets_height = y_shift_annotation_line*0.5*annotation_brackets_factor
-        y_shift_annotation_text = brackets_height + y_shift_annotation_line*0.5*distance_stars_to_brackets
-        
-        # Set initial y
-        y = max_total + y_shift_annotation_line
-
-        # Add check whether group level ANOVA / Kruska-Wallis-ANOVA is significant
-        df_temp = d_main['summary']['pairwise_comparisons'].copy()
-
-        for group1, group2 in l_stats_to_annotate:
-
-            x1 = l_xlabel_order.index(group1)
-            x2 = l_xlabel_order.index(group2)
-            
-            stars = get_stars_str(df_temp, group1, group2)
-
-            plt.plot([x1, x1, x2, x2], [y, y+brackets_height, y+brackets_height, y], c='k', lw=linewidth_annotations)    
-            plt.text((x1+x2)*.5, y+y_shift_annotation_text, stars, ha='center', va='bottom', color='k', 
-                     fontsize=fontsize_stars, fontweight=fontsize_stars_bold)
-            
-            # With set_distance_stars_to_brackets being limited to 5, stars will always be closer than next annotation line
-            y = y+3*y_shift_annotation_line
-
-# 2.4.2 Annotate stats in one-sample tests:
-# 2.4.2.1 Annotate stats in scatter-, box-, and violinplots:
-def annotate_stats_one_sample(l_stats_to_annotate):
-    if len(l_stats_to_annotate) > 0:
-        max_total = df[data_col].max()
-        y_shift_annotation_line = max_total * distance_brackets_to_data
-        y_shift_annotation_text = y_shift_annotation_line*0.5*distance_stars_to_brackets
-        
-        # Set initial y
-        y = max_total + y_shift_annotation_line
-
-        # Add check whether group level ANOVA / Kruska-Wallis-ANOVA is significant
-        pval = d_main['summary']['pairwise_comparisons'].iloc[0, :]['p-val']
-        if pval <= 0.001:
-            stars = '***'
-        elif pval <= 0.01:
-            stars = '**'
-        elif pval <= 0.05:
-            stars = '*'
-        else: 
-            stars = 'n.s.'
-        
-        plt.text(0, y+y_shift_annotation_text, stars, ha='center', va='bottom', color='k', 
-                     fontsize=fontsize_stars, fontweight=fontsize_stars_bold)
-           
-            
-# 2.4.3 Annotate stats in Mixed-model ANOVA plots:
-# 2.4.3.1 Annotate stats in Mixed-model ANOVA point plot:
-def annotate_stats_mma_pointplot(l_stats_to_annotate):
-    if len(l_stats_to_annotate) > 0:
-        l_to_annotate_ordered = []
-        for session_id in l_sessions:
-            l_temp = [elem for elem in l_stats_to_annotate if elem[2]==session_id]
-            for elem in l_temp:
-                abs_mean_difference = abs(df.loc[(df[group_col]==elem[0]) & (df[session_col]==elem[2]), data_col].mean()-
-                                          df.loc[(df[group_col]==elem[1]) & (df[session_col]==elem[2]), data_col].mean())
-                l_temp[l_temp.index(elem)] = elem+(abs_mean_difference,)
-            l_temp.sort(key=sort_by_third)
-            l_to_annotate_ordered = l_to_annotate_ordered+l_temp
-
-        df_temp = d_main['summary']['pairwise_comparisons'].copy()
-        
-        for elem in l_to_annotate_ordered:
-            group1, group2, session_id, abs_mean_difference = elem
-            
-            if l_to_annotate_ordered.index(elem) == 0:
-                n_previous_annotations_in_this_session_id = 0
-            elif session_id == prev_session:
-                n_previous_annotations_in_this_session_id = n_previous_annotations_in_this_session_id + 1
-            else:
-                n_previous_annotations_in_this_session_id = 0
-            
-            x_shift_annotation_line = distance_brackets_to_data + distance_brackets_to_data * n_previous_annotations_in_this_session_id * 1.5
-            brackets_height = distance_brackets_to_data*0.5*annotation_brackets_factor
-            x_shift_annotation_text = brackets_height + distance_brackets_to_data*0.5*distance_stars_to_brackets            
-            
-            x = l_xlabel_order.index(session_id) + x_shift_annotation_line
-            y1=df.loc[(df[group_col] == group1) & (df[session_col] == session_id), data_col].mean()
-            y2=df.loc[(df[group_col] == group2) & (df[session_col] == session_id), data_col].mean()            
-            
-            stars = get_stars_str(df_temp.loc[df_temp[session_col] == session_id], group1, group2)
-            
-            plt.plot([x, x+brackets_height, x+brackets_height, x], [y1, y1, y2, y2], color='k', lw=linewidth_annotations)
-            plt.text(x+x_shift_annotation_text, (y1+y2)/2, stars, rotation=-90, ha='center', va='center', 
-                     fontsize=fontsize_stars, fontweight=fontsize_stars_bold)             
-
-            prev_session = session_id
-
-            
-# Helper function to make sorting based on 3rd element in tuple possible
-def sort_by_third(e):
-    return e[3]
-
-
-# 2.4.3.2 Annotate stats in Mixed-model ANOVA violin plot:
-def annotate_stats_mma_violinplot(l_stats_to_annotate):
-    if len(l_stats_to_annotate) > 0:
-        l_to_annotate_ordered = []
-        for session_id in l_sessions:
-            l_temp = [elem for elem in l_stats_to_annotate if elem[2]==session_id]
-            for elem in l_temp:
-                abs_mean_difference = abs(df.loc[(df[group_col]==elem[0]) & (df[session_col]==elem[2]), data_col].mean()-
-                                          df.loc[(df[group_col]==elem[1]) & (df[session_col]==elem[2]), data_col].mean())
-                l_temp[l_temp.index(elem)] = elem+(abs_mean_difference,)
-            l_temp.sort(key=sort_by_third)
-            l_to_annotate_ordered = l_to_annotate_ordered+l_temp
-
-        df_temp = d_main['summary']['pairwise_comparisons'].copy()
-
-        max_total = df[data_col].max()
-        y_shift_annotation_line = max_total * distance_brackets_to_data
-        brackets_height = y_shift_annotation_line*0.5*annotation_brackets_factor
-        y_shift_annotation_text = brackets_height + y_shift_annotation_line*0.5*distance_stars_to_brackets
-        
-        for elem in l_to_annotate_ordered:
-            group1, group2, session_id, abs_mean_difference = elem
+        ylims = None
+
+    return PlotSettings(plot_type=select_plot.value,
+                        distance_stars_to_brackets=set_distance_stars_to_brackets.value,
+                        distance_brackets_to_data=set_distance_brackets_to_data.value,
+                        fontsize_stars=set_fontsize_stars.value,
+                        stars_bold=set_stars_fontweight_bold.value,
+                        brackets=select_bracket_no_bracket.value == 'Brackets',
+                        linewidth_annotations=set_linewidth_annotations.value,
+                        l_xlabel_order=l_xlabel_order,
+                        l_hue_order=l_hue_order if select_test.value == 2 else None,
+                        color_palette=color_palette,
+                        fig_width=set_fig_width.value,
+                        fig_height=set_fig_height.value,
+                        marker_size=set_marker_size.value,
+                        show_legend=set_show_legend.value,
+                        axes_linewidth=set_axes_linewidth.value,
+                        axes_color=set_axes_color.value,
+                        axes_tick_size=set_axes_tick_size.value,
+                        yaxis_label_text=set_yaxis_label_text.value,
+                        yaxis_label_fontsize=set_yaxis_label_fontsize.value,
+                        yaxis_label_color=set_yaxis_label_color.value,
+                        xaxis_label_text=set_xaxis_label_text.value,
+                        xaxis_label_fontsize=set_xaxis_label_fontsize.value,
+                        xaxis_label_color=set_xaxis_label_color.value,
+                        ylims=ylims)
+
+        
+# 2.2 Get l_stats_to_annotate from the comparisons that were selected in the paginated checkboxes (see 4.5.1):
+def get_l_stats_to_annotate():
+    if set_annotate_all.value==True:
+        set_selected_comparisons.update(range(len(l_comparisons)))
+        show_comparison_page()
+    return [l_comparisons[i] for i in sorted(set_selected_comparisons)]
+
+
+# 2.3 Get the comparison plan, i.e. which pairwise comparisons shall be computed (see comparisons.py).
+#     Pairs of groups are entered one per line, e.g. "ctrl, drugA".
+def get_comparison_plan():
+    if select_test.value == 1:
+        return None
+    l_group_pairs = tuple(tuple(elem.strip() for elem in line.split(',')) for line in set_group_pairs.value.splitlines() if line.strip() != '')
+    return ComparisonPlan(groups=select_comparison_plan.value,
+                          control_group=(set_control_group.value.strip() or None) if select_comparison_plan.value == 'vs_control' else None,
+                          l_group_pairs=l_group_pairs if select_comparison_plan.value == 'explicit' else (),
+                          sessions=select_session_plan.value if select_test.value == 2 else 'all')
 
-            if l_to_annotate_ordered.index(elem) == 0:
-                n_previous_annotations_in_this_session_id = 0
-            elif session_id == prev_session:
-                n_previous_annotations_in_this_session_id = n_previous_annotations_in_this_session_id + 1
-            else:
-                n_previous_annotations_in_this_session_id = 0
-
-            y = max_total + y_shift_annotation_line + y_shift_annotation_line*n_previous_annotations_in_this_session_id*3
-            
-            width = 0.8
-            x_base = l_xlabel_order.index(session_id) - width/2 + width/(2*len(l_hue_order))
-            x1 = x_base + width/len(l_hue_order)*l_hue_order.index(group1)
-            x2 = x_base + width/len(l_hue_order)*l_hue_order.index(group2)
-            
-            stars = get_stars_str(df_temp.loc[df_temp[session_col] == session_id], group1, group2)
-
-            plt.plot([x1, x1, x2, x2], [y, y+brackets_height, y+brackets_height, y], color='k', lw=linewidth_annotations)
-            plt.text((x1+x2)/2, y+y_shift_annotation_text, stars, ha='center', va='bottom', 
-                     fontsize=fontsize_stars, fontweight=fontsize_stars_bold)
-            
-            prev_session = session_id
-
-            
 ###################################################################    
 
     
 ###################################################################
 # 3 Functions that are triggered by clicking on the widget buttons:
-# 3.1 Stats button:        
+# 3.1 The buttons only read the widget values and then hand over the actual work (loading, statistics, plotting,
+#     serializing) to a background thread, which is awaited on the event loop of the notebook. This keeps the widget
+#     responsive and allows to report the progress. All work runs on the same thread (one after the other), so that
+#     the figure is never modified by two jobs at once.
+#     Each click increments the generation of its button: results of a previous click that finish later are ignored.
+#     If requested, the duration of each stage (see profiling.py) is reported after the work is done.
+executor = ThreadPoolExecutor(max_workers=1)
+d_generations, d_tasks = {}, {}
+
+
+def start_task(button_name, coroutine_function):
+    d_generations[button_name] = d_generations.get(button_name, 0) + 1
+    if button_name in d_tasks and not d_tasks[button_name].done():
+        d_tasks[button_name].cancel()
+    coroutine = run_task(button_name, coroutine_function, d_generations[button_name])
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Without a running event loop (e.g. when the widget is used outside of Jupyter), the work is done right away
+        asyncio.run(coroutine)
+        return
+    d_tasks[button_name] = loop.create_task(coroutine)
+
+
+async def run_task(button_name, coroutine_function, generation):
+    try:
+        with profiling(button_name) if set_show_timing_report.value else nullcontext() as profile:
+            await coroutine_function(generation)
+        if profile is not None and is_current(button_name, generation):
+            output.append_stdout(format_report(profile.get_report()) + '\n')
+    except asyncio.CancelledError:
+        pass
+    except Exception as error:
+        output.append_stdout('Error: {}\n'.format(error))
+    finally:
+        if is_current(button_name, generation):
+            hide_progress()
+
+
+def is_current(button_name, generation):
+    return d_generations.get(button_name) == generation
+
+
+# The work runs in a copy of the current context, so that its stages are recorded in the profile of the task
+async def run_step(description, step, n_steps, func, *args):
+    show_progress(description, step, n_steps)
+    return await asyncio.get_running_loop().run_in_executor(executor, contextvars.copy_context().run, func, *args)
+
+
+def show_progress(description, step, n_steps):
+    progress_bar.max = n_steps
+    progress_bar.value = step
+    progress_bar.description = description
+    progress_bar.layout.visibility = 'visible'
+    cancel_button.layout.visibility = 'visible'
+
+
+def hide_progress():
+    progress_bar.layout.visibility = 'hidden'
+    cancel_button.layout.visibility = 'hidden'
+
+
+# 3.1.1 Cancel button: the running computation cannot be interrupted, but its results are discarded.
+def on_cancel_button_clicked(b):
+    for button_name, task in d_tasks.items():
+        d_generations[button_name] += 1
+        task.cancel()
+    hide_progress()
+    output.append_stdout('Cancelled.\n')
+
+
+# 3.2 Stats button:
 def on_stats_button_clicked(b):
-    global df, save_plot, l_checkboxes
-    if list(uploader.value.keys())[0].endswith('.csv'): 
-        with open("input.csv", "w+b") as i:
-            i.write(uploader.value[list(uploader.value.keys())[0]]['content'])
-        df = pd.read_csv('input.csv', index_col=0)
-        
-    elif list(uploader.value.keys())[0].endswith('.xlsx'):
-        with open("input.xlsx", "w+b") as i:
-            i.write(uploader.value[list(uploader.value.keys())[0]]['content'])
-        df = pd.read_excel('input.xlsx', index_col=0)
+    start_task('stats', run_stats)
+
+
+async def run_stats(generation):
+    global df, results, results_key
+    test, uploader_value, plan = TESTS[select_test.value], uploader.value, get_comparison_plan()
+    try:
+        # The upload is parsed directly from memory and only the columns of the selected test are loaded (see ingestion.py)
+        filename, new_df = await run_step('Loading the data', 0, 2, read_upload, uploader_value, test)
+        new_results_key, new_results, l_messages = await run_step('Computing the statistics', 1, 2, compute_selected_stats,
+                                                                  new_df, test, plan)
+    except ValueError as error:
+        if is_current('stats', generation):
+            with output:
+                output.clear_output()
+                print('Error: {}'.format(error))
+        return
+    if not is_current('stats', generation):
+        return
+    df, results, results_key = new_df, new_results, new_results_key
+    set_globals_from_results(results)
 
-    save_plot = False
-    
     with output:
         output.clear_output()
         
@@ -415,6 +255,9 @@ def on_stats_button_clicked(b):
         select_plot.layout.visibility = 'visible'
         expand_me_accordion.layout.visibility = 'visible'
         select_downloads.layout.visibility = 'visible'
+        select_table_format.layout.visibility = 'visible'
+        select_figure_formats.layout.visibility = 'visible'
+        select_dpis.layout.visibility = 'visible'
         download_button.layout.visibility = 'visible'
         
         if select_test.value == 0: # comparison of independent samples
@@ -425,186 +268,100 @@ def on_stats_button_clicked(b):
             select_plot.options = [('pointplot', 0), ('boxplot', 1), ('boxplot with scatterplot overlay', 2), ('violinplot', 3)]
         else:
             print('Function not implemented. Please go and annoy Dennis to finally do it')
-        
-        if select_test.value==0:
-            independent_samples()
-            checkboxes_to_add, l_checkboxes = create_checkboxes_pairwise_comparisons()
-        elif select_test.value==1:
-            one_sample()
-            checkboxes_to_add, l_checkboxes = create_checkboxes_pairwise_comparisons()
-        elif select_test.value==2:
-            mixed_model_ANOVA()
-            checkboxes_to_add, l_checkboxes = create_checkboxes_pairwise_comparisons_mma()
-
-        if len(select_annotations_vbox.children) == 0:
-                select_annotations_vbox.children = select_annotations_vbox.children + checkboxes_to_add
+
+        set_comparisons_for_annotation(results)
         
         create_group_order_text()
         create_ylims()
         create_group_color_pickers()
 
-        display(d_main['summary']['pairwise_comparisons'])   
+        for message in l_messages:
+            print(message)
+        ipython_display.display(d_main['summary']['pairwise_comparisons'])   
 
         
-# 3.2 Plotting button
+# 3.3 Plotting button
+# 3.3.1 Collect the customization input of the user (reads the widgets, so it has to run before the work is handed over):
+def get_plot_input():
+    plot_settings = get_customization_values()
+    l_stats_to_annotate = get_l_stats_to_annotate()
+    return df, results, results_key, plot_settings, l_stats_to_annotate
+
+
+# 3.3.2 Bring the figure up to date and return it.
+#       The existing figure is updated unless the data or the statistics changed since it was created.
+def get_updated_figure(df, results, results_key, plot_settings, l_stats_to_annotate):
+    global plot_session, plot_session_key
+    if plot_session is None or plot_session_key != results_key:
+        plot_session, plot_session_key = PlotSession(df, results, plot_settings, l_stats_to_annotate), results_key
+        # Detach the figure from pyplot, so that it is only shown via display()
+        plt.close(plot_session.fig)
+    return plot_session.update(plot_settings, l_stats_to_annotate)
+
+
+# 3.3.3 Plotting button
 def on_plotting_button_clicked(b):
-    global l_xlabel_order 
-    # Update all variables according to the customization input of the user
-    get_customization_values()
-    
+    start_task('plot', run_plotting)
+
+
+async def run_plotting(generation):
+    fig = await run_step('Plotting', 0, 1, get_updated_figure, *get_plot_input())
+    if not is_current('plot', generation):
+        return
     with output:
         output.clear_output()
         
         plotting_button.description = 'Refresh the plot'
-                   
-        if select_palette_or_individual_color.value == 0:
-            color_palette = select_color_palettes.value
-        else:
-            color_palette = {}
-            for group_id in l_groups:
-                color_palette[group_id] = group_colors_vbox.children[l_groups.index(group_id)].value
-             
-        fig = plt.figure(figsize=(set_fig_width.value/2.54 , set_fig_height.value/2.54), facecolor='white')
-        ax = fig.add_subplot()
-        
-        for axis in ['top', 'right']:
-            ax.spines[axis].set_visible(False)
-        
-        for axis in ['bottom','left']:
-            ax.spines[axis].set_linewidth(set_axes_linewidth.value)
-            ax.spines[axis].set_color(set_axes_color.value)      
-
-        plt.tick_params(labelsize=set_axes_tick_size.value, colors=set_axes_color.value)
-
-        if select_test.value == 0: # independent_samples()
-            if select_plot.value == 0:
-                sns.stripplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, size=set_marker_size.value)
-            elif select_plot.value == 1: 
-                sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette)
-            elif select_plot.value == 2:
-                sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, showfliers=False)
-                sns.stripplot(data=df, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=set_marker_size.value)
-            elif select_plot.value == 3:
-                sns.violinplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, cut=0)
-                sns.stripplot(data=df, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=set_marker_size.value)                
-            else:
-                print("Function not implemented. Please go and annoy Dennis to finally do it")
-        
-        elif select_test.value == 1: # one_sample()
-            if select_plot.value == 0:
-                sns.stripplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, size=set_marker_size.value)
-                plt.hlines(y=fixed_value, xmin=-0.5, xmax=0.5, color='gray', linestyle='dashed')
-            elif select_plot.value == 1: 
-                sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette)
-                plt.hlines(y=fixed_value, xmin=-0.5, xmax=0.5, color='gray', linestyle='dashed')
-            elif select_plot.value == 2:
-                sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, showfliers=False)
-                sns.stripplot(data=df, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=set_marker_size.value)
-                plt.hlines(y=fixed_value, xmin=-0.5, xmax=0.5, color='gray', linestyle='dashed')
-            elif select_plot.value == 3:
-                sns.violinplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, cut=0)
-                sns.stripplot(data=df, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=set_marker_size.value)
-                plt.hlines(y=fixed_value, xmin=-0.5, xmax=0.5, color='gray', linestyle='dashed')
-            else:
-                print("Function not implemented. Please go and annoy Dennis to finally do it")
         
+        ipython_display.display(fig)
         
-        elif select_test.value == 2: # mixed_model_ANOVA()
-            if select_plot.value == 0:
-                sns.pointplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
-                              palette=color_palette, dodge=True, ci='sd', err_style='bars', capsize=0)  
-            elif select_plot.value == 1:
-                sns.boxplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
-                            palette=color_palette)
-            elif select_plot.value == 2:
-                sns.boxplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
-                            palette=color_palette, showfliers=False)
-                sns.stripplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
-                              dodge=True, color='k', size=set_marker_size.value)
-            elif select_plot.value == 3:
-                sns.violinplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
-                               width=0.8, cut=0, palette=color_palette)
-                sns.stripplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
-                              dodge=True, color='k', size=set_marker_size.value)
-            else:
-                print("Function not implemented. Please go and annoy Dennis to finally do it")
-                          
-            if set_show_legend.value == True:
-                if select_plot.value == 0:
-                    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5), frameon=False)
-                elif select_plot.value in [1, 2, 3]:
-                    handles, labels = ax.get_legend_handles_labels()
-                    new_handles = handles[:len(l_hue_order)]
-                    new_labels = labels[:len(l_hue_order)]
-                    ax.legend(new_handles, new_labels, loc='center left', bbox_to_anchor=(1, 0.5), frameon=False)
-            else:
-                ax.get_legend().remove()
-
-        else:
-            print("Function not implemented. Please go and annoy Dennis to finally do it")
         
-        if select_test.value == 0: # independent_samples()
-            l_stats_to_annotate = get_l_stats_to_annotate_independent_samples()
-            annotate_stats_independent_samples(l_stats_to_annotate)
-        
-        elif select_test.value == 1: # one_sample()
-            l_stats_to_annotate = get_l_stats_to_annotate_independent_samples()
-            if select_plot.value in [0, 1, 2, 3]:
-                annotate_stats_one_sample(l_stats_to_annotate)
-            else:
-                print("Function not implemented. Please go and annoy Dennis to finally do it") 
-        
-        elif select_test.value == 2: # mixed_model_ANOVA()
-            l_stats_to_annotate = get_l_stats_to_annotate_mma()
-            if select_plot.value == 0:
-                annotate_stats_mma_pointplot(l_stats_to_annotate)
-            elif select_plot.value in [1, 2, 3]:
-                annotate_stats_mma_violinplot(l_stats_to_annotate)
-            else:
-                print("Function not implemented. Please go and annoy Dennis to finally do it")
-            
-        plt.ylabel(set_yaxis_label_text.value, fontsize=set_yaxis_label_fontsize.value, color=set_yaxis_label_color.value)
-        plt.xlabel(set_xaxis_label_text.value, fontsize=set_xaxis_label_fontsize.value, color=set_xaxis_label_color.value)        
-               
-        if set_yaxis_scaling_mode.value == 1:
-            plt.ylim(set_yaxis_lower_lim.value, set_yaxis_upper_lim.value)
-        
-        plt.tight_layout()
-        
-        if save_plot == True:
-            plt.savefig('customized_plot.png', dpi=300)
-        
-        plt.show()
-        
-        
-# 3.3 Download button:        
+# 3.4 Download button: serializes the cached tables and the current figure (without plotting it again, unless
+#     the settings changed) in memory and offers them as download links in the browser.
+#     The figure is rendered in all selected formats & resolutions from a snapshot on another thread,
+#     so that the plot can already be refreshed again while large files are written.
 def on_download_button_clicked(b):
-    global save_plot
-    if select_downloads.value == 0 or select_downloads.value == 2:
-        if select_test.value == 0:
-            df_individual_group_stats = get_individual_group_stats_for_download(False)
-            df_group_level_overview = get_group_level_stats_for_download()
-            df_pairwise_comparisons = d_main['summary']['pairwise_comparisons'].copy()
-        
-        elif select_test.value == 1:
-            df_individual_group_stats = get_individual_group_stats_for_download(False)
-            df_pairwise_comparisons = d_main['summary']['pairwise_comparisons'].copy()
-           
-        elif select_test.value == 2:
-            df_individual_group_stats = get_individual_group_stats_for_download(True)
-            df_group_level_overview = get_group_level_stats_for_download()
-            df_pairwise_comparisons = d_main['summary']['pairwise_comparisons'].copy()
-        
-        with pd.ExcelWriter('statistic_results.xlsx') as writer:  
-            df_individual_group_stats.to_excel(writer, sheet_name='Individual group statistics')
-            if select_test.value in [0, 2]:
-                df_group_level_overview.to_excel(writer, sheet_name='Whole-group statistics')
-            df_pairwise_comparisons.to_excel(writer, sheet_name='Pairwise comparisons')                
-                
-    if select_downloads.value == 1 or select_downloads.value == 2:
-        save_plot = True
-        plotting_button.click()
-        save_plot = False
+    start_task('download', run_download)
+
+
+async def run_download(generation):
+    table_format, figure_formats, dpis = select_table_format.value, select_figure_formats.value, select_dpis.value
+    download_tables = select_downloads.value == 0 or select_downloads.value == 2
+    download_figure = select_downloads.value == 1 or select_downloads.value == 2
+    if download_figure and (len(figure_formats) == 0 or len(dpis) == 0):
+        with output:
+            print('Please select at least one format and one resolution for the plot.')
+        return
+    n_steps = int(download_tables) + 2 * int(download_figure)
+
+    if download_tables:
+        d_exports = await run_step('Writing the tables', 0, n_steps, get_table_exports, results_key, results, table_format)
+        if not is_current('download', generation):
+            return
+        show_download_links(d_exports)
+
+    if download_figure:
+        plot_input = get_plot_input()
+        # The snapshot of the figure is taken on the worker thread, after all previous changes of the figure
+        future = await run_step('Updating the plot', n_steps - 2, n_steps, get_figures_future, plot_input, figure_formats, dpis)
+        show_progress('Rendering the plot', n_steps - 1, n_steps)
+        d_exports = await asyncio.wrap_future(future)
+        if not is_current('download', generation):
+            return
+        show_download_links(d_exports)
+
+
+def get_table_exports(results_key, results, table_format):
+    d_tables = table_cache.get_or_compute(results_key, get_result_tables, results)
+    return export_results(d_tables=d_tables, table_format=table_format)
+
+
+def get_figures_future(plot_input, figure_formats, dpis):
+    return write_figures_in_background(get_updated_figure(*plot_input), figure_formats, dpis)
+
+
+def show_download_links(d_exports):
+    output.append_display_data(ipython_display.HTML('<br>'.join(get_download_link(content, filename) for filename, content in d_exports.items())))
 
         
 ###################################################################    
@@ -614,15 +371,18 @@ def on_download_button_clicked(b):
 # 4 Functions that create the individual widget elements:
 # 4.1 Buttons:
 def create_buttons():
-    global uploader, stats_button, plotting_button, download_button
-    uploader = widgets.FileUpload(accept=('.xlsx,.csv'), multiple=False)
+    global uploader, stats_button, plotting_button, download_button, cancel_button, progress_bar, set_show_timing_report
+    uploader = widgets.FileUpload(accept=('.xlsx,.csv,.parquet,.feather'), multiple=False)
     stats_button = widgets.Button(description="Calculate stats", icon='rocket')
     plotting_button = widgets.Button(description='Plot the data', layout={'visibility': 'hidden'})
     download_button = widgets.Button(description='Download', icon='file-download', layout={'visibility': 'hidden'})
+    cancel_button = widgets.Button(description='Cancel', icon='stop', layout={'visibility': 'hidden'})
+    progress_bar = widgets.IntProgress(value=0, min=0, max=1, layout={'visibility': 'hidden'}, style={'description_width': 'initial'})
+    set_show_timing_report = widgets.Checkbox(value=False, description='Show timing report', indent=False)
 
 # 4.2 Dropdown menus:
 def create_dropdowns():
-    global select_test, select_plot, select_downloads
+    global select_test, select_plot, select_downloads, select_table_format, select_figure_formats, select_dpis
     select_test = widgets.Dropdown(options=[('Pairwise comparison of two or more independent samples', 0), 
                                             ('Comparison of one group against a fixed value (one-sample test)', 1), 
                                             ('Mixed_model_ANOVA', 2)], 
@@ -634,9 +394,53 @@ def create_dropdowns():
                                    layout={'width': '700px', 'visibility': 'hidden'}, style={'description_width': 'initial'})
 
     select_downloads = widgets.Dropdown(options=[('statistical results only', 0), ('plot only', 1), ('both', 2)], value=1,
-                                   description='Please select what you would like to write to disk:',
+                                   description='Please select what you would like to download:',
                                    layout={'width': '700px', 'visibility': 'hidden'}, style={'description_width': 'initial'})
 
+    select_table_format = widgets.Dropdown(options=[(file_format, file_format) for file_format in TABLE_FORMATS], value='xlsx',
+                                           description='Format of the statistical results:',
+                                           layout={'visibility': 'hidden'}, style={'description_width': 'initial'})
+
+    select_figure_formats = widgets.SelectMultiple(options=FIGURE_FORMATS, value=('png', ), rows=len(FIGURE_FORMATS),
+                                                   description='Format(s) of the plot:',
+                                                   layout={'visibility': 'hidden'}, style={'description_width': 'initial'})
+
+    select_dpis = widgets.SelectMultiple(options=[('150 dpi', 150), ('300 dpi', 300), ('600 dpi', 600)], value=(300, ), rows=3,
+                                         description='Resolution(s):',
+                                         layout={'visibility': 'hidden'}, style={'description_width': 'initial'})
+
+# 4.2.1 Select which pairwise comparisons are computed (see comparisons.py). The control group defaults to the
+#       first group in the data, the pairs of sessions are only used for mixed-model ANOVAs.
+def create_comparison_plan_widgets():
+    global select_comparison_plan, set_control_group, set_group_pairs, select_session_plan
+    select_comparison_plan = widgets.Dropdown(options=[('all pairs of groups', 'all'), ('each group vs. a control group', 'vs_control'),
+                                                       ('adjacent groups (in the order of the data)', 'adjacent'),
+                                                       ('only the listed pairs of groups', 'explicit')],
+                                              value='all', description='Pairwise comparisons:', style={'description_width': 'initial'})
+
+    set_control_group = widgets.Text(value='', placeholder='first group in the data', description='Control group:',
+                                     layout={'visibility': 'hidden'}, style={'description_width': 'initial'})
+
+    set_group_pairs = widgets.Textarea(value='', placeholder='one pair per line, e.g.: ctrl, drugA', description='Pairs of groups:',
+                                       layout={'visibility': 'hidden'}, style={'description_width': 'initial'})
+
+    select_session_plan = widgets.Dropdown(options=[('all pairs of sessions', 'all'), ('each session vs. the first session', 'vs_control'),
+                                                    ('adjacent sessions', 'adjacent')],
+                                           value='all', description='Sessions:', layout={'visibility': 'hidden'},
+                                           style={'description_width': 'initial'})
+
+    select_comparison_plan.observe(update_comparison_plan_widgets, names='value')
+    select_test.observe(update_comparison_plan_widgets, names='value')
+
+
+# Only show the elements that apply to the selected test & plan
+def update_comparison_plan_widgets(change=None):
+    select_comparison_plan.layout.visibility = 'hidden' if select_test.value == 1 else 'visible'
+    set_control_group.layout.visibility = 'visible' if select_test.value != 1 and select_comparison_plan.value == 'vs_control' else 'hidden'
+    set_group_pairs.layout.visibility = 'visible' if select_test.value != 1 and select_comparison_plan.value == 'explicit' else 'hidden'
+    select_session_plan.layout.visibility = 'visible' if select_test.value == 2 else 'hidden'
+
+
 # 4.3 Create all default widgets that allow customization of the stats annotations
 #     and that don´t require any information about the data (e.g. how many groups)
 def create_default_stats_annotation_widgets():
@@ -670,7 +474,7 @@ def create_default_stats_annotation_widgets():
     
     set_stars_fontweight_bold = widgets.Checkbox(description='Stars bold', value=False)
     
-    customize_stats_annotation_vbox = VBox([HBox([set_stars_fontweight_bold, select_bracket_no_bracket]),
+    customize_stats_annotation_vbox = widgets.VBox([widgets.HBox([set_stars_fontweight_bold, select_bracket_no_bracket]),
                                             set_distance_stars_to_brackets, set_distance_brackets_to_data, 
                                             set_fontsize_stars, set_linewidth_annotations]) 
 
@@ -689,14 +493,14 @@ def create_accordion_to_customize_the_plot():
         # Optional annotation of within and between statistics for mma
     customize_stats_annotation_vbox = create_default_stats_annotation_widgets()
     
-    # Create empty VBox that will be filled with checkboxes to select individual pairwise 
-    # comparisons that shall be annotated, as soon as the data is specified (stats_button.click())
-    select_annotations_vbox = VBox([])
+    # Create the pages of checkboxes to select individual pairwise comparisons that shall be annotated,
+    # which are filled as soon as the data is specified (stats_button.click())
+    select_annotations_vbox = create_comparison_pager()
     
     select_annotations_accordion = widgets.Accordion(children=[select_annotations_vbox])
     select_annotations_accordion.set_title(0, 'Select individual comparisons for annotation')
     
-    customize_annotations_accordion = widgets.Accordion(children=[VBox([select_annotations_accordion, set_annotate_all]), 
+    customize_annotations_accordion = widgets.Accordion(children=[widgets.VBox([select_annotations_accordion, set_annotate_all]), 
                                                                   customize_stats_annotation_vbox],
                                                        selected_index=None)
     
@@ -747,7 +551,7 @@ def create_vbox_y_axis():
     set_yaxis_label_text = widgets.Text(value='data', placeholder='data', description='y-axis title:', layout={'width': 'auto'})
     set_yaxis_label_fontsize = widgets.IntSlider(value=12, min=8, max=40, step=1, description='fontsize:')
     set_yaxis_label_color = widgets.ColorPicker(concise=False, description='font color', value='#000000')
-    yaxis_hbox1 = HBox([set_yaxis_label_text, set_yaxis_label_fontsize, set_yaxis_label_color])
+    yaxis_hbox1 = widgets.HBox([set_yaxis_label_text, set_yaxis_label_fontsize, set_yaxis_label_color])
     
     set_yaxis_scaling_mode = widgets.RadioButtons(description = 'Please select whether you want to use automatic or manual scaling of the yaxis:', 
                                                               options=[('Use automatic scaling', 0), ('Use manual scaling', 1)],
@@ -755,9 +559,9 @@ def create_vbox_y_axis():
     
     set_yaxis_lower_lim = widgets.FloatText(value=0.0, description='lower limit:', style={'description_width': 'initial'})
     set_yaxis_upper_lim = widgets.FloatText(value=0.0, description='upper limit:', style={'description_width': 'initial'})
-    yaxis_hbox2 = HBox([set_yaxis_lower_lim, set_yaxis_upper_lim])
+    yaxis_hbox2 = widgets.HBox([set_yaxis_lower_lim, set_yaxis_upper_lim])
 
-    return VBox([yaxis_hbox1, set_yaxis_scaling_mode, yaxis_hbox2])
+    return widgets.VBox([yaxis_hbox1, set_yaxis_scaling_mode, yaxis_hbox2])
 
 
 # 4.4.2.2 Create an HBox that allows customization of the x-axis
@@ -766,7 +570,7 @@ def create_vbox_x_axis():
     set_xaxis_label_text = widgets.Text(value='group_IDs', placeholder='group_IDs', description='x-axis title:', layout={'width': 'auto'})
     set_xaxis_label_fontsize = widgets.IntSlider(value=12, min=8, max=40, step=1, description='fontsize:')
     set_xaxis_label_color = widgets.ColorPicker(concise=False, description='font color', value='#000000')
-    xaxis_hbox = HBox([set_xaxis_label_text, set_xaxis_label_fontsize, set_xaxis_label_color])
+    xaxis_hbox = widgets.HBox([set_xaxis_label_text, set_xaxis_label_fontsize, set_xaxis_label_color])
     
     set_xlabel_order = widgets.Text(value='x label order', 
                                     placeholder='Specify the desired order of the x-axis labels with individual labels separated by a comma',
@@ -782,7 +586,7 @@ def create_vbox_x_axis():
     
     
     
-    return VBox([xaxis_hbox, set_xlabel_order, set_hue_order])
+    return widgets.VBox([xaxis_hbox, set_xlabel_order, set_hue_order])
 
 
 # 4.4.2.3 Create an HBox that allows customization of general axis features
@@ -794,7 +598,7 @@ def create_hbox_both_axes():
                                          value='#000000', style={'description_width': 'initial'}, layout={'width': 'auto'})
     set_axes_tick_size = widgets.BoundedFloatText(value=10, min=1, max=40, description='Tick label size', 
                                             style={'description_width': 'initial'}, layout={'width': 'auto'})
-    return HBox([set_axes_linewidth, set_axes_color, set_axes_tick_size])
+    return widgets.HBox([set_axes_linewidth, set_axes_color, set_axes_tick_size])
 
 
 # 4.4.3 Customize general features of the plot (like colors, size, ...)
@@ -814,62 +618,120 @@ def create_customize_plot_features_hbox():
     set_show_legend = widgets.Checkbox(value=True, description='Show legend (if applicable):', style={'description_width': 'initial'})
     set_marker_size = widgets.FloatText(value=5,description='marker size (if applicable):', style={'description_width': 'initial'})
     
-    optional_features_hbox = HBox([set_show_legend, set_marker_size])
+    optional_features_hbox = widgets.HBox([set_show_legend, set_marker_size])
     
     # Empty VBox which will be filled as soon as groups are determined (stats_button.click())
-    group_colors_vbox = VBox([])
+    group_colors_vbox = widgets.VBox([])
     
     set_fig_width = widgets.FloatSlider(value=28, min=3, max=30, description='Figure width:', style={'description_width': 'inital'})
     set_fig_height = widgets.FloatSlider(value=16, min=3, max=30, description='Figure height:', style={'description_width': 'inital'})
-    fig_size_hbox = HBox([set_fig_width, set_fig_height])
+    fig_size_hbox = widgets.HBox([set_fig_width, set_fig_height])
     
-    plot_style_features_vbox = VBox([select_palette_or_individual_color, HBox([select_color_palettes, group_colors_vbox]), fig_size_hbox, optional_features_hbox])
+    plot_style_features_vbox = widgets.VBox([select_palette_or_individual_color, widgets.HBox([select_color_palettes, group_colors_vbox]), fig_size_hbox, optional_features_hbox])
     return plot_style_features_vbox
 
 
 # 4.5 Create elements that are dependent on group information:
-# 4.5.1 Create checkboxes to select individual comparisons that shall be annotated
-# 4.5.1.1 Base-function: create and arrange checkboxes of all possible pairwise comparisons
-def create_checkboxes_pairwise_comparisons():
-    if len(l_groups) == 1:
-        l_checkboxes_temp = [widgets.Checkbox(value=False,description='{} vs. {}'.format(l_groups[0], fixed_val_col))] 
+# 4.5.1 Create checkboxes to select individual comparisons that shall be annotated.
+#       Large screens can have thousands of comparisons, so only one page of checkboxes is created, which is
+#       re-labelled when another page is shown or the comparisons are filtered. The selection is stored as
+#       indices of l_comparisons in set_selected_comparisons.
+COMPARISONS_PER_PAGE = 30
+
+
+# 4.5.1.1 Create the (empty) page of checkboxes and the elements to navigate between pages:
+def create_comparison_pager():
+    global l_page_checkboxes, set_comparison_filter, previous_page_button, next_page_button, comparison_page_label
+    global l_comparisons, l_comparison_labels, set_selected_comparisons, l_filtered_comparisons, l_page_comparisons, comparison_page
+    l_comparisons, l_comparison_labels, set_selected_comparisons = [], [], set()
+    l_filtered_comparisons, l_page_comparisons, comparison_page = [], [], 0
+
+    l_page_checkboxes = [widgets.Checkbox(value=False, description='', indent=False, layout={'visibility': 'hidden'})
+                         for i in range(COMPARISONS_PER_PAGE)]
+    for checkbox in l_page_checkboxes:
+        checkbox.observe(on_page_checkbox_changed, names='value')
+
+    set_comparison_filter = widgets.Text(value='', placeholder='e.g. ctrl', description='Filter:', continuous_update=False)
+    set_comparison_filter.observe(on_comparison_filter_changed, names='value')
+    previous_page_button = widgets.Button(description='Previous', icon='arrow-left', disabled=True)
+    previous_page_button.on_click(on_previous_page_button_clicked)
+    next_page_button = widgets.Button(description='Next', icon='arrow-right', disabled=True)
+    next_page_button.on_click(on_next_page_button_clicked)
+    comparison_page_label = widgets.Label(value='')
+
+    # Arrange checkboxes in HBoxes with 3 checkboxes per HBox
+    l_HBoxes = [widgets.HBox(l_page_checkboxes[elem:elem+3]) for elem in range(0, COMPARISONS_PER_PAGE, 3)]
+    navigation_hbox = widgets.HBox([set_comparison_filter, previous_page_button, comparison_page_label, next_page_button])
+    return widgets.VBox([navigation_hbox] + l_HBoxes)
+
+
+# 4.5.1.2 Fill the pages with all comparisons that were computed (only the planned ones, see comparisons.py):
+def set_comparisons_for_annotation(results):
+    global l_comparisons, l_comparison_labels, set_selected_comparisons
+    l_comparisons = get_all_stats_to_annotate(results)
+    if results.test == 'mixed_model_ANOVA':
+        l_comparison_labels = ['{}: {} vs. {}'.format(session_id, group1, group2) for group1, group2, session_id in l_comparisons]
     else:
-        # Create a checkbox for each pairwise comparison
-        l_checkboxes_temp = [widgets.Checkbox(value=False,description='{} vs. {}'.format(group1, group2)) 
-                             for group1, group2 in list(itertools.combinations(l_groups, 2))]
-    # Arrange checkboxes in a HBoxes with up to 3 checkboxes per HBox
-    l_HBoxes = []
-    elem = 0
-    for i in range(int(len(l_checkboxes_temp)/3)):
-        l_HBoxes.append(HBox(l_checkboxes_temp[elem:elem+3]))
-        elem = elem + 3
-
-    if len(l_checkboxes_temp) % 3 != 0:
-        l_HBoxes.append(HBox(l_checkboxes_temp[elem:]))
-
-    # Arrange HBoxes in a VBox and select all as tuple to later place in empty placeholder (select_annotations_vbox)
-    checkboxes_to_add_temp = VBox(l_HBoxes).children[:]
-
-    return checkboxes_to_add_temp, l_checkboxes_temp 
-
-
-# 4.5.1.2 Create checkboxes taking session_id into account (for mixed-model ANOVA):
-def create_checkboxes_pairwise_comparisons_mma():
-    annotate_session_stats_accordion = widgets.Accordion(children=[], selected_index=None)
-    l_all_checkboxes = []
-
-    for session_id in l_sessions:
-        checkboxes_to_add_temp, l_checkboxes_temp = create_checkboxes_pairwise_comparisons()
-        # Little complicated, but neccessary since the output of create_checkboxes_pairwise_comparisons() is a tuple
-        checkboxes_to_add_temp_vbox = VBox([])
-        checkboxes_to_add_temp_vbox.children = checkboxes_to_add_temp_vbox.children + checkboxes_to_add_temp
-        annotate_session_stats_accordion.children = annotate_session_stats_accordion.children + (checkboxes_to_add_temp_vbox, )
-        l_all_checkboxes = l_all_checkboxes + [(session_id, elem) for elem in l_checkboxes_temp]
-
-    for i in range(len(list(annotate_session_stats_accordion.children))):
-        annotate_session_stats_accordion.set_title(i, l_sessions[i])
-    
-    return VBox([annotate_session_stats_accordion]).children[:], l_all_checkboxes
+        l_comparison_labels = ['{} vs. {}'.format(group1, group2) for group1, group2 in l_comparisons]
+    set_selected_comparisons = set()
+    # Show all comparisons of the new results (resetting the filter triggers filter_comparisons)
+    if set_comparison_filter.value != '':
+        set_comparison_filter.value = ''
+    else:
+        filter_comparisons()
+
+
+def filter_comparisons():
+    global l_filtered_comparisons, comparison_page
+    filter_text = set_comparison_filter.value.strip().lower()
+    l_filtered_comparisons = [i for i, label in enumerate(l_comparison_labels) if filter_text in label.lower()]
+    comparison_page = 0
+    show_comparison_page()
+
+
+# 4.5.1.3 Show the current page. l_page_comparisons is updated first, so that setting the values of the
+#         checkboxes (which triggers on_page_checkbox_changed) keeps the selection as it is.
+def show_comparison_page():
+    global l_page_comparisons
+    first = comparison_page * COMPARISONS_PER_PAGE
+    l_page_comparisons = l_filtered_comparisons[first:first + COMPARISONS_PER_PAGE]
+    for position, checkbox in enumerate(l_page_checkboxes):
+        if position < len(l_page_comparisons):
+            checkbox.description = l_comparison_labels[l_page_comparisons[position]]
+            checkbox.value = l_page_comparisons[position] in set_selected_comparisons
+            checkbox.layout.visibility = 'visible'
+        else:
+            checkbox.value = False
+            checkbox.layout.visibility = 'hidden'
+    n_pages = max(1, math.ceil(len(l_filtered_comparisons) / COMPARISONS_PER_PAGE))
+    comparison_page_label.value = 'Page {} of {} ({} comparisons)'.format(comparison_page + 1, n_pages, len(l_filtered_comparisons))
+    previous_page_button.disabled = comparison_page == 0
+    next_page_button.disabled = comparison_page >= n_pages - 1
+
+
+def on_page_checkbox_changed(change):
+    position = l_page_checkboxes.index(change['owner'])
+    if position < len(l_page_comparisons):
+        if change['new']:
+            set_selected_comparisons.add(l_page_comparisons[position])
+        else:
+            set_selected_comparisons.discard(l_page_comparisons[position])
+
+
+def on_comparison_filter_changed(change):
+    filter_comparisons()
+
+
+def on_previous_page_button_clicked(b):
+    global comparison_page
+    comparison_page = comparison_page - 1
+    show_comparison_page()
+
+
+def on_next_page_button_clicked(b):
+    global comparison_page
+    comparison_page = comparison_page + 1
+    show_comparison_page()
 
 
 # 4.5.2 Create color pickers that allow the user to specify a color for each group
@@ -932,21 +794,25 @@ def top_level_layout():
 
     create_accordion_to_customize_the_plot()
     create_dropdowns()
+    create_comparison_plan_widgets()
     create_buttons()
 
     # Bind the on_button_clicked functions to the respective buttons:
     stats_button.on_click(on_stats_button_clicked)
     plotting_button.on_click(on_plotting_button_clicked) 
     download_button.on_click(on_download_button_clicked)
+    cancel_button.on_click(on_cancel_button_clicked)
     
     # Layout of the remaining elements
-    first_row = HBox([uploader])
-    second_row = HBox([select_test, stats_button])
-    third_row = HBox([select_plot, plotting_button])
-    third_row_extension = HBox([expand_me_accordion])
-    fourth_row = HBox([select_downloads, download_button])
+    first_row = widgets.HBox([uploader])
+    second_row = widgets.HBox([select_test, stats_button])
+    second_row_extension = widgets.HBox([select_comparison_plan, set_control_group, set_group_pairs, select_session_plan])
+    third_row = widgets.HBox([select_plot, plotting_button])
+    third_row_extension = widgets.HBox([expand_me_accordion])
+    fourth_row = widgets.HBox([select_downloads, select_table_format, select_figure_formats, select_dpis, download_button])
+    progress_row = widgets.HBox([set_show_timing_report, progress_bar, cancel_button])
 
-    stats_widget = VBox([first_row, second_row, third_row, third_row_extension, fourth_row])
+    stats_widget = widgets.VBox([first_row, second_row, second_row_extension, third_row, third_row_extension, fourth_row, progress_row])
 
 
 # 5.2 Launch function
@@ -957,82 +823,4 @@ def launch():
     # Define the output
     output = widgets.Output()
     # Display the widget:
-    display(stats_widget, output)
-    
-###################################################################    
-
-    
-###################################################################
-# 6 Functions to process the statistical data for download:
-# 6.1 Calculate individual group statistics:
-def calculate_individual_group_stats(d, key):
-    group_data = d_main[key]['data']
-    d['means'].append(np.mean(group_data))
-    d['medians'].append(np.median(group_data))
-    d['stddevs'].append(np.std(group_data))
-    d['stderrs'].append(np.std(group_data) / math.sqrt(group_data.shape[0]))
-    d['tests'].append('Shapiro-Wilk')
-    d['test_stats'].append(d_main[key]['normality_full'].iloc[0,0])
-    d['pvals'].append(d_main[key]['normality_full'].iloc[0,1])
-    d['bools'].append(d_main[key]['normality_full'].iloc[0,2])
-    return d
-
-
-# 6.2 Create the DataFrame:
-def get_individual_group_stats_for_download(include_sessions):
-    d_individual_group_stats = {'means': [],
-                                'medians': [],
-                                'stddevs': [],
-                                'stderrs': [],
-                                'tests': [],
-                                'test_stats': [], 
-                                'pvals': [], 
-                                'bools': []}
-
-    l_for_index = []
-    
-    if include_sessions == False:
-        # for independent samples & one sample:
-        for group_id in l_groups:
-            d_individual_group_stats = calculate_individual_group_stats(d_individual_group_stats, group_id)
-            l_for_index.append(group_id)
-        l_index = l_for_index
-    else:
-        # for mma:
-        for group_id in l_groups:
-            for session_id in l_sessions:
-                d_individual_group_stats = calculate_individual_group_stats(d_individual_group_stats, (group_id, session_id))
-                l_for_index.append((group_id, session_id))
-            l_index = pd.MultiIndex.from_tuples(l_for_index)
-                
-    df_individual_group_stats = pd.DataFrame(data=d_individual_group_stats)
-
-    multi_index_columns = pd.MultiIndex.from_tuples([('Group statistics', 'Mean'), ('Group statistics', 'Median'), ('Group statistics', 'Standard deviation'), ('Group statistics', 'Standard error'),
-                                             ('Test for normal distribution', 'Test'), ('Test for normal distribution', 'Test statistic'), ('Test for normal distribution', 'p-value'),
-                                             ('Test for normal distribution', 'Normally distributed?')])
-
-    df_individual_group_stats.columns = multi_index_columns
-    df_individual_group_stats.index = l_index
-
-    return df_individual_group_stats
-
-
-# 6.3 Group-level statistics:
-def get_group_level_stats_for_download():
-    df_group_level_overview = pg.homoscedasticity([d_main[key]['data'] for key in d_main.keys() if key != 'summary'])
-    df_group_level_overview.index = [0]
-    df_group_level_overview.columns = pd.MultiIndex.from_tuples([('Levene', 'W statistic'), ('Levene', 'p value'), ('Levene', 'Equal variances?')])
-
-    df_group_level_overview[('', 'all normally distributed?')] = False
-    df_group_level_overview[('', 'critera for parametric test fulfilled?')] = False
-    df_group_level_overview[('', 'performed test')] = performed_test
-    df_group_level_overview[' '] = ''
-
-    df_group_statistics = d_main['summary']['group_level_statistic'].copy()
-    
-    df_group_statistics.index = list(range(df_group_statistics.shape[0]))
-    df_group_statistics.columns = pd.MultiIndex.from_tuples([(performed_test, elem) for elem in df_group_statistics.columns])
-
-    df_group_level_overview = pd.concat([df_group_level_overview, df_group_statistics], axis=1)
-    
-    return df_group_level_overview
\ No newline at end of file
+    ipython_display.display(stats_widget, output)
@@ -0,0 +1,295 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from .comparisons import ComparisonPlan
+from .engine import TESTS, compute_stats
+from .export import FILE_EXTENSIONS as EXPORT_FILE_EXTENSIONS, FIGURE_FORMATS, TABLE_FORMATS, as_tuple, get_result_tables, write_figures, write_tables
+from .ingestion import FILE_EXTENSIONS, load_table
+from .lazy_imports import lazy_import
+from .parallel import run_in_process_pool
+from .plotting import PlotSettings, create_plot, get_all_stats_to_annotate, get_plot_type_index
+from .profiling import profiling, stage, write_report
+from .streaming import summarize_in_chunks, write_streamed_stats_to_excel
+
+# Imported when the first file is analyzed (see lazy_imports.py)
+matplotlib = lazy_import('matplotlib')
+plt = lazy_import('matplotlib.pyplot')
+
+###################################################################
+#Overview:
+
+    # 1 Saved analysis configurations
+    # 2 Find and read the input files
+    # 3 Run the analysis for each file
+    # 4 Command line interface
+
+# Batch mode applies one analysis configuration (test, plot type, annotations,
+# customization of the plot) to every file of a directory or glob pattern and
+# writes the same statistic_results.xlsx & customized_plot.png that the widget
+# creates, prefixed with the name of the respective input file. Example:
+#
+#   python -m Statistics_and_plotting.batch experiments/ --config analysis.json --output-dir results/
+
+###################################################################
+
+
+###################################################################
+# 1 Saved analysis configurations
+# "annotate" can be "all", "none", or a list of comparisons, e.g. [["ctrl", "drug"]]
+# for independent samples or [["ctrl", "ko", "session_1"]] for mixed-model ANOVAs.
+# "plot_settings" accepts all fields of plotting.PlotSettings.
+# "comparisons" selects the pairs that are compared: "all" (default), or the fields of comparisons.ComparisonPlan,
+# e.g. {"groups": "vs_control", "control_group": "ctrl"} or {"groups": "explicit", "l_group_pairs": [["ctrl", "drug"]]}.
+# "loader" accepts the options of ingestion.load_table, e.g. {"float32": true, "engine": "pyarrow"}.
+# If "chunksize" is set, files are streamed in chunks of that many rows and only the descriptive
+# statistics of each group are written (see streaming.py), for files that do not fit into memory.
+# "table_format" selects the format of the statistical results: "xlsx", "csv", "parquet" (both zipped), or "json".
+# "figure_formats" ("png", "svg", "pdf") and "dpi" accept a single value or a list, e.g. "dpi": [300, 600].
+# "profile": true writes the duration of each stage of the analysis to <name>_timing_report.json. Instead of true,
+# the options of profiling.profiling can be given, e.g. {"cprofile": true, "memory": true}.
+DEFAULT_CONFIG = {'test': 'independent_samples',
+                  'column_roles': {},
+                  'loader': {},
+                  'chunksize': None,
+                  'plot_type': 0,
+                  'annotate': 'all',
+                  'comparisons': 'all',
+                  'plot_settings': {},
+                  'downloads': 'both',
+                  'table_format': 'xlsx',
+                  'figure_formats': 'png',
+                  'dpi': 300,
+                  'profile': False}
+
+DOWNLOADS = ('statistical results only', 'plot only', 'both')
+
+
+def load_config(path):
+    with open(path) as config_file:
+        d_config = json.load(config_file)
+    return get_config(d_config)
+
+
+# Helper function to complete a (partial) configuration with the defaults and to check it
+def get_config(d_config):
+    d_config = {**DEFAULT_CONFIG, **d_config}
+    if d_config['test'] not in TESTS:
+        raise ValueError('Unknown test "{}". Please select one of: {}'.format(d_config['test'], ', '.join(TESTS)))
+    if d_config['downloads'] not in DOWNLOADS:
+        raise ValueError('Unknown downloads option "{}". Please select one of: {}'.format(d_config['downloads'], ', '.join(DOWNLOADS)))
+    if d_config['table_format'] not in TABLE_FORMATS:
+        raise ValueError('Unknown table format "{}". Please select one of: {}'.format(d_config['table_format'], ', '.join(TABLE_FORMATS)))
+    for file_format in as_tuple(d_config['figure_formats']):
+        if file_format not in FIGURE_FORMATS:
+            raise ValueError('Unknown figure format "{}". Please select one of: {}'.format(file_format, ', '.join(FIGURE_FORMATS)))
+    get_plot_type_index(d_config['test'], d_config['plot_type'])
+    get_comparison_plan(d_config)
+    return d_config
+
+
+def get_plot_settings(d_config):
+    d_plot_settings = dict(d_config['plot_settings'])
+    # JSON only knows lists, but the frozen PlotSettings expect tuples
+    for key in ['l_xlabel_order', 'l_hue_order', 'ylims']:
+        if d_plot_settings.get(key) is not None:
+            d_plot_settings[key] = tuple(d_plot_settings[key])
+    d_plot_settings['plot_type'] = get_plot_type_index(d_config['test'], d_config['plot_type'])
+    return PlotSettings(**d_plot_settings)
+
+
+def get_comparison_plan(d_config):
+    if d_config['comparisons'] == 'all':
+        return None
+    d_plan = dict(d_config['comparisons'])
+    # JSON only knows lists, but the frozen ComparisonPlan expects tuples
+    for key in ['l_group_pairs', 'l_session_pairs']:
+        if key in d_plan:
+            d_plan[key] = tuple(tuple(pair) for pair in d_plan[key])
+    return ComparisonPlan(**d_plan)
+
+
+def get_stats_to_annotate(results, annotate):
+    if annotate == 'all':
+        return get_all_stats_to_annotate(results)
+    elif annotate == 'none':
+        return []
+    else:
+        return [tuple(elem) for elem in annotate]
+
+###################################################################
+
+
+###################################################################
+# 2 Find and read the input files
+INPUT_FILE_EXTENSIONS = tuple(FILE_EXTENSIONS.keys())
+
+
+# Inputs can be individual files, directories (all supported files within), or glob patterns
+def find_input_files(l_inputs):
+    l_paths = []
+    for elem in l_inputs:
+        if os.path.isdir(elem):
+            l_candidates = sorted(os.path.join(elem, filename) for filename in os.listdir(elem))
+        elif os.path.isfile(elem):
+            l_candidates = [elem]
+        else:
+            l_candidates = sorted(glob.glob(elem))
+        l_paths = l_paths + [path for path in l_candidates if path.lower().endswith(INPUT_FILE_EXTENSIONS) and path not in l_paths]
+    return l_paths
+
+
+# The results of each file are prefixed with its name without extension. Files with the same name in the same
+# output directory (e.g. ind.csv & ind.parquet) keep their extension in the prefix (ind_csv, ind_parquet) instead,
+# so that their results do not overwrite each other. Files that would still share their prefix (the same file
+# name in different directories with one output_dir) raise an error before anything is analyzed.
+def get_output_prefixes(l_paths, output_dir=None):
+    l_prefixes = [os.path.join(output_dir if output_dir is not None else os.path.dirname(path), os.path.splitext(os.path.basename(path))[0])
+                  for path in l_paths]
+    l_keys = [os.path.normcase(os.path.abspath(prefix)) for prefix in l_prefixes]
+    l_prefixes = [prefix + '_' + os.path.splitext(path)[1][1:].lower() if l_keys.count(key) > 1 else prefix
+                  for path, prefix, key in zip(l_paths, l_prefixes, l_keys)]
+
+    d_paths = {}
+    for path, prefix in zip(l_paths, l_prefixes):
+        d_paths.setdefault(os.path.normcase(os.path.abspath(prefix)), []).append(path)
+    l_collisions = [l_colliding for l_colliding in d_paths.values() if len(l_colliding) > 1]
+    if len(l_collisions) > 0:
+        raise ValueError('The results of these input files would overwrite each other: {}. Please rename the files or write the '
+                         'results next to each input file (without an output directory).'.format(
+                             '; '.join(', '.join(l_colliding) for l_colliding in l_collisions)))
+    return l_prefixes
+
+###################################################################
+
+
+###################################################################
+# 3 Run the analysis for each file
+# 3.1 Analyze a single file and return the paths of all files that were written (prefix: see get_output_prefixes):
+def analyze_file(path, d_config, output_dir=None, prefix=None):
+    if prefix is None:
+        prefix = get_output_prefixes([path], output_dir)[0]
+
+    if not d_config['profile']:
+        return write_analysis(path, d_config, prefix)
+    d_profiling_options = d_config['profile'] if isinstance(d_config['profile'], dict) else {}
+    with profiling(os.path.basename(path), **d_profiling_options) as profile:
+        l_written = write_analysis(path, d_config, prefix)
+    l_written.append(write_report(profile.get_report(), prefix + '_timing_report.json'))
+    return l_written
+
+
+def write_analysis(path, d_config, prefix):
+    if d_config['chunksize'] is not None:
+        df_cell_stats = summarize_in_chunks(path, d_config['test'], d_config['chunksize'],
+                                            float32=d_config['loader'].get('float32', False), **d_config['column_roles'])
+        write_streamed_stats_to_excel(df_cell_stats, prefix + '_group_statistics.xlsx')
+        return [prefix + '_group_statistics.xlsx']
+
+    # Only the columns of the selected test are read
+    df = load_table(path, d_config['test'], **d_config['loader'], **d_config['column_roles'])
+    results = compute_stats(df, d_config['test'], get_comparison_plan(d_config), **d_config['column_roles'])
+
+    l_written = []
+    if d_config['downloads'] in ['statistical results only', 'both']:
+        results_path = prefix + '_statistic_results' + EXPORT_FILE_EXTENSIONS[d_config['table_format']]
+        l_written.append(write_tables(get_result_tables(results), d_config['table_format'], results_path))
+
+    if d_config['downloads'] in ['plot only', 'both']:
+        l_stats_to_annotate = get_stats_to_annotate(results, d_config['annotate'])
+        fig = create_plot(df, results, get_plot_settings(d_config), l_stats_to_annotate)
+        for filename, content in write_figures(fig, d_config['figure_formats'], d_config['dpi'], prefix + '_customized_plot').items():
+            with stage('write_file'), open(filename, 'wb') as figure_file:
+                figure_file.write(content)
+            l_written.append(filename)
+        plt.close(fig)
+
+    return l_written
+
+
+# 3.2 Default progress report, called after each file:
+def print_progress(i, n_files, d_report):
+    if d_report['status'] == 'done':
+        print('[{}/{}] {} done ({:.1f} s)'.format(i, n_files, d_report['input'], d_report['duration']))
+    else:
+        print('[{}/{}] {} failed: {}'.format(i, n_files, d_report['input'], d_report['error']))
+
+
+# 3.3 Analyze a single file and report the outcome instead of raising an error,
+#     so that one broken file does not stop the whole batch:
+def analyze_file_with_report(path, d_config, output_dir=None, prefix=None):
+    start = time.perf_counter()
+    try:
+        l_written = analyze_file(path, d_config, output_dir, prefix)
+        d_report = {'input': path, 'status': 'done', 'outputs': l_written}
+    except Exception as error:
+        d_report = {'input': path, 'status': 'failed', 'error': '{}: {}'.format(type(error).__name__, error)}
+    d_report['duration'] = time.perf_counter() - start
+    return d_report
+
+
+# 3.4 Analyze all files, optionally distributed across n_workers processes (None: one per CPU core).
+#     The reports are returned in the order of the input files.
+def run_batch(l_inputs, d_config, output_dir=None, progress=print_progress, n_workers=1):
+    if isinstance(l_inputs, str):
+        l_inputs = [l_inputs]
+    d_config = get_config(d_config)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    l_paths = find_input_files(l_inputs)
+    l_prefixes = get_output_prefixes(l_paths, output_dir)
+    l_finished = []
+
+    def report_progress(i, d_report):
+        l_finished.append(i)
+        if progress is not None:
+            progress(len(l_finished), len(l_paths), d_report)
+
+    return run_in_process_pool(analyze_file_with_report,
+                               [(path, d_config, output_dir, prefix) for path, prefix in zip(l_paths, l_prefixes)],
+                               n_workers, callback=report_progress)
+
+###################################################################
+
+
+###################################################################
+# 4 Command line interface
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m Statistics_and_plotting.batch',
+                                     description='Apply a saved analysis configuration to many data files '
+                                                 '(.csv, .xlsx, .parquet, .feather).')
+    parser.add_argument('inputs', nargs='+', help='Input files, directories, or glob patterns')
+    parser.add_argument('--config', help='Path to the analysis configuration (.json). Defaults are used if not specified.')
+    parser.add_argument('--output-dir', help='Directory for the results (default: next to each input file)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of files that are analyzed in parallel (0: one per CPU core, default: 1)')
+    parser.add_argument('--quiet', action='store_true', help='Do not report the progress')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write the duration of each stage of the analysis to <name>_timing_report.json')
+    args = parser.parse_args(argv)
+
+    # Render the plots without any display
+    matplotlib.use('Agg')
+
+    d_config = load_config(args.config) if args.config else dict(DEFAULT_CONFIG)
+    if args.profile and not d_config['profile']:
+        d_config['profile'] = True
+    l_reports = run_batch(args.inputs, d_config, args.output_dir, progress=None if args.quiet else print_progress,
+                          n_workers=args.workers or None)
+
+    n_failed = len([d_report for d_report in l_reports if d_report['status'] == 'failed'])
+    if not args.quiet:
+        print('Analyzed {} file(s), {} failed.'.format(len(l_reports), n_failed))
+    return 1 if n_failed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
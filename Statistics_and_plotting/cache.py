@@ -0,0 +1,136 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .comparisons import plans_all_pairs
+from .engine import compute_stats, resolve_column_roles
+
+###################################################################
+#Overview:
+
+    # 1 Cache keys
+    # 2 LRU cache with an optional on-disk tier
+    # 3 Cached computation of the statistics
+
+# Re-uploading the same file or toggling back to a previous test selection
+# returns the stored results instead of computing all statistics again.
+
+###################################################################
+
+
+###################################################################
+# 1 Cache keys
+# Increase whenever the content of StatsResults changes, so that old entries on disk are not used anymore
+CACHE_VERSION = 3
+
+
+# Hash of the content of the columns that are used by the test plus the test configuration (including the
+# comparison plan, see comparisons.py). Columns that are not used by the test (and the index) do not affect the key.
+def get_cache_key(df, test, plan=None, **column_roles):
+    d_column_roles = resolve_column_roles(df, test, **column_roles)
+    l_cols = list(d_column_roles.values())
+    hasher = hashlib.sha256()
+    hasher.update(repr((CACHE_VERSION, test, sorted(d_column_roles.items()), [str(df[col].dtype) for col in l_cols])).encode())
+    if not plans_all_pairs(plan):
+        hasher.update(repr(plan).encode())
+    hasher.update(pd.util.hash_pandas_object(df[l_cols], index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+# Hash of any other parameters, e.g. the customization values of a plot
+def get_params_key(*params):
+    return hashlib.sha256(repr(params).encode()).hexdigest()
+
+###################################################################
+
+
+###################################################################
+# 2 LRU cache with an optional on-disk tier
+# Keeps the max_entries most recently used entries in memory. If a cache_dir is specified,
+# all entries are also pickled to disk, so that they survive a restart of the kernel.
+class ResultCache:
+
+    def __init__(self, max_entries=32, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.d_entries = OrderedDict()
+        self.lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.d_entries:
+                self.d_entries.move_to_end(key)
+                return self.d_entries[key]
+        if self.cache_dir is not None and os.path.isfile(self.get_path(key)):
+            try:
+                with open(self.get_path(key), 'rb') as cache_file:
+                    value = pickle.load(cache_file)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                # Unreadable entries (e.g. written by an incompatible version) are treated as missing
+                return default
+            self.put(key, value, write_to_disk=False)
+            return value
+        return default
+
+    def put(self, key, value, write_to_disk=True):
+        with self.lock:
+            self.d_entries[key] = value
+            self.d_entries.move_to_end(key)
+            while len(self.d_entries) > self.max_entries:
+                self.d_entries.popitem(last=False)
+        if self.cache_dir is not None and write_to_disk:
+            # Write to a temporary file first, so that other processes never read a partially written entry
+            tmp_path = self.get_path(key) + '.{}.tmp'.format(os.getpid())
+            with open(tmp_path, 'wb') as cache_file:
+                pickle.dump(value, cache_file)
+            os.replace(tmp_path, self.get_path(key))
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        value = self.get(key)
+        if value is None:
+            value = func(*args, **kwargs)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.d_entries.clear()
+        if self.cache_dir is not None:
+            for filename in os.listdir(self.cache_dir):
+                if filename.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, filename))
+
+    def __contains__(self, key):
+        with self.lock:
+            if key in self.d_entries:
+                return True
+        return self.cache_dir is not None and os.path.isfile(self.get_path(key))
+
+    def __len__(self):
+        return len(self.d_entries)
+
+###################################################################
+
+
+###################################################################
+# 3 Cached computation of the statistics
+default_cache = ResultCache()
+
+
+def cached_compute_stats(df, test, cache=None, plan=None, **column_roles):
+    if cache is None:
+        cache = default_cache
+    return cache.get_or_compute(get_cache_key(df, test, plan, **column_roles), compute_stats, df, test, plan, **column_roles)
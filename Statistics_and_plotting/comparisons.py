@@ -0,0 +1,201 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import itertools
+import pandas as pd
+from dataclasses import dataclass
+
+from .correction import correct_pvals
+from .lazy_imports import lazy_import
+from .profiling import stage
+
+# Imported when it is used for the first time (see lazy_imports.py)
+pg = lazy_import('pingouin')
+
+###################################################################
+#Overview:
+
+    # 1 Comparison plans
+    # 2 Select the planned pairs
+    # 3 Compute only the planned pairwise comparisons
+
+# By default, every group is compared with every other group, which grows
+# quadratically with the number of groups (60 groups: 1770 comparisons).
+# A ComparisonPlan declares which pairs are actually needed, e.g.:
+#
+#   plan = ComparisonPlan(groups='vs_control', control_group='ctrl', sessions='adjacent')
+#   results = compute_stats(df, 'mixed_model_ANOVA', plan=plan)
+#
+# Only the planned pairs are tested and Holm-corrected. The table of pairwise
+# comparisons has the same columns as the one of pingouin.pairwise_ttests.
+# The pairs of independent samples are tested with pairwise.py.
+
+###################################################################
+
+
+###################################################################
+# 1 Comparison plans
+# 'all': all pairs, 'vs_control': every level vs. the control (default: the first level in the data),
+# 'adjacent': neighbours in the order of the data (e.g. consecutive sessions), 'explicit': only the listed pairs
+PLAN_MODES = ('all', 'vs_control', 'adjacent', 'explicit')
+
+
+# groups: pairs of groups (mixed-model ANOVA: for the main effect of the group and within each session),
+# sessions: pairs of sessions for the main effect of the session (mixed-model ANOVA only)
+@dataclass(frozen=True)
+class ComparisonPlan:
+    groups: str = 'all'
+    control_group: object = None
+    l_group_pairs: tuple = ()
+    sessions: str = 'all'
+    control_session: object = None
+    l_session_pairs: tuple = ()
+
+    def __post_init__(self):
+        for mode in [self.groups, self.sessions]:
+            if mode not in PLAN_MODES:
+                raise ValueError('Unknown comparison plan "{}". Please select one of: {}'.format(mode, ', '.join(PLAN_MODES)))
+
+
+# Helper function to check whether all pairs are compared (also if no plan was specified)
+def plans_all_pairs(plan):
+    return plan is None or (plan.groups == 'all' and plan.sessions == 'all')
+
+###################################################################
+
+
+###################################################################
+# 2 Select the planned pairs
+# 2.1 Helper function to find a level that was specified by the user, e.g. the group_id 1 as "1"
+def resolve_level(value, l_levels, role):
+    for level in l_levels:
+        if level == value or str(level) == str(value):
+            return level
+    raise ValueError('The {} "{}" of the comparison plan does not occur in the data.'.format(role, value))
+
+
+# 2.2 Pairs (A, B) of the plan. Like in the tables of pingouin, the pairs are ordered and oriented
+#     as all combinations of l_sorted_levels, while "adjacent" and the default control refer to l_levels
+#     (order of the data).
+def get_planned_pairs(mode, l_levels, l_sorted_levels, control=None, l_explicit_pairs=(), role='group_id'):
+    if mode == 'all':
+        return list(itertools.combinations(l_sorted_levels, 2))
+    elif mode == 'vs_control':
+        control = l_levels[0] if control is None else resolve_level(control, l_levels, role)
+        l_planned = [frozenset([control, level]) for level in l_levels if level != control]
+    elif mode == 'adjacent':
+        l_planned = [frozenset(pair) for pair in zip(l_levels[:-1], l_levels[1:])]
+    else:
+        l_planned = []
+        for pair in l_explicit_pairs:
+            if len(pair) != 2:
+                raise ValueError('Please specify the pairs of the comparison plan as ({0}1, {0}2), not {1}.'.format(role, pair))
+            level1, level2 = [resolve_level(value, l_levels, role) for value in pair]
+            if level1 == level2:
+                raise ValueError('The {} "{}" cannot be compared with itself.'.format(role, level1))
+            l_planned.append(frozenset([level1, level2]))
+        if len(l_planned) == 0:
+            raise ValueError('Please specify at least one pair of {}s for the comparison plan.'.format(role))
+    set_planned = set(l_planned)
+    return [pair for pair in itertools.combinations(l_sorted_levels, 2) if frozenset(pair) in set_planned]
+
+
+# 2.3 pingouin sorts the levels (categoricals in the order of their categories)
+def get_sorted_levels(series, l_levels):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        l_categories = list(series.cat.categories)
+        return sorted(l_levels, key=l_categories.index)
+    return sorted(l_levels)
+
+
+# Without a plan, all pairs
+def get_planned_group_pairs(plan, series, l_groups):
+    if plan is None:
+        plan = ComparisonPlan()
+    return get_planned_pairs(plan.groups, l_groups, get_sorted_levels(series, l_groups), plan.control_group,
+                             plan.l_group_pairs, 'group_id')
+
+
+def get_planned_session_pairs(plan, series, l_sessions):
+    if plan is None:
+        plan = ComparisonPlan()
+    return get_planned_pairs(plan.sessions, l_sessions, get_sorted_levels(series, l_sessions), plan.control_session,
+                             plan.l_session_pairs, 'session_id')
+
+###################################################################
+
+
+###################################################################
+# 3 Compute only the planned pairwise comparisons
+# 3.1 A single comparison, with the columns of pingouin.pairwise_ttests
+def compare_pair(x, y, paired, parametric):
+    d_row = {'Paired': paired, 'Parametric': parametric}
+    if parametric:
+        df_test = pg.ttest(x, y, paired=paired)
+        d_row['T'], d_row['dof'] = df_test['T'].iat[0], df_test['dof'].iat[0]
+    elif paired:
+        df_test = pg.wilcoxon(x, y)
+        d_row['W-val'] = df_test['W-val'].iat[0]
+    else:
+        df_test = pg.mwu(x, y)
+        d_row['U-val'] = df_test['U-val'].iat[0]
+    d_row['alternative'] = 'two-sided'
+    d_row['p-unc'] = df_test['p-val'].iat[0]
+    if parametric:
+        d_row['BF10'] = df_test['BF10'].iat[0]
+    d_row['hedges'] = pg.compute_effsize(x, y, eftype='hedges', paired=paired)
+    return d_row
+
+
+# 3.2 Holm correction within one block of comparisons (e.g. the main effect of the session).
+#     As in pingouin, single comparisons of a main effect are not corrected.
+def correct_block(l_rows, always=False):
+    if len(l_rows) > 1 or (always and len(l_rows) == 1):
+        pvals_corrected = correct_pvals([d_row['p-unc'] for d_row in l_rows], method='holm')
+        for d_row, pval_corrected in zip(l_rows, pvals_corrected):
+            d_row['p-corr'], d_row['p-adjust'] = pval_corrected, 'holm'
+    return l_rows
+
+
+COLUMN_ORDER = ['Contrast', 'A', 'B', 'Paired', 'Parametric', 'T', 'U-val', 'W-val', 'dof', 'alternative',
+                'p-unc', 'p-corr', 'p-adjust', 'BF10', 'hedges']
+
+
+def get_table(l_rows, l_columns=COLUMN_ORDER):
+    df_table = pd.DataFrame(l_rows, columns=l_columns)
+    return df_table.dropna(how='all', axis=1)
+
+
+# 3.3 Mixed-model ANOVA, from the subject x session matrix (see mixed_anova.py), which contains only the subjects
+#     with data in every session (like in pingouin). Main effect of the session (paired, planned pairs of sessions),
+#     main effect of the group (means of each subject across sessions, planned pairs of groups), and the planned
+#     pairs of groups within each session.
+def planned_pairwise_tests_mixed(matrix, group_col, session_col, l_session_pairs, l_group_pairs):
+    with stage('pairwise_tests'):
+        d_session_indices = {session_id: i for i, session_id in enumerate(matrix.l_sessions)}
+        group_ids = matrix.group_ids
+
+        l_session_rows = []
+        for session1, session2 in l_session_pairs:
+            x, y = matrix.values[:, d_session_indices[session1]], matrix.values[:, d_session_indices[session2]]
+            l_session_rows.append({'Contrast': session_col, session_col: '-', 'A': session1, 'B': session2,
+                                   **compare_pair(x, y, True, True)})
+
+        subject_means = matrix.values.mean(axis=1)
+        l_group_rows = []
+        for group1, group2 in l_group_pairs:
+            x, y = subject_means[group_ids == group1], subject_means[group_ids == group2]
+            l_group_rows.append({'Contrast': group_col, session_col: '-', 'A': group1, 'B': group2,
+                                 **compare_pair(x, y, False, True)})
+
+        l_interaction_rows = []
+        for session_id in matrix.l_sessions:
+            session_data = matrix.values[:, d_session_indices[session_id]]
+            for group1, group2 in l_group_pairs:
+                x, y = session_data[group_ids == group1], session_data[group_ids == group2]
+                l_interaction_rows.append({'Contrast': '{} * {}'.format(session_col, group_col), session_col: session_id,
+                                           'A': group1, 'B': group2, **compare_pair(x, y, False, True)})
+
+        l_rows = correct_block(l_session_rows) + correct_block(l_group_rows) + correct_block(l_interaction_rows, always=True)
+        return get_table(l_rows, COLUMN_ORDER[:1] + [session_col] + COLUMN_ORDER[1:])
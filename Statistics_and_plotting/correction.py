@@ -0,0 +1,89 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import numpy as np
+
+###################################################################
+#Overview:
+
+    # 1 Correction for multiple comparisons
+    # 2 Significance stars
+
+# Both work on whole arrays of p-values at once (e.g. all comparisons of a
+# screen, or of all variables / files of an experiment), so that switching
+# the correction method or the thresholds of the stars is cheap, e.g.:
+#
+#   pvals_corrected = correct_pvals(df_all['p-unc'], method='fdr_bh')
+#   l_stars = get_stars(pvals_corrected, thresholds=(0.0001, 0.001, 0.01, 0.05))
+#
+# The corrected p-values are the same as those of pingouin.multicomp.
+
+###################################################################
+
+
+###################################################################
+# 1 Correction for multiple comparisons
+CORRECTION_METHODS = ('holm', 'bonferroni', 'fdr_bh', 'fdr_by', 'none')
+
+
+# Returns the corrected p-values in the shape & order of pvals. Missing p-values (NaN) stay missing and
+# do not count as tests.
+def correct_pvals(pvals, method='holm'):
+    if method not in CORRECTION_METHODS:
+        raise ValueError('Unknown correction method "{}". Please select one of: {}'.format(method, ', '.join(CORRECTION_METHODS)))
+    pvals = np.asarray(pvals, dtype=np.float64)
+    if method == 'none':
+        return pvals.copy()
+
+    pvals_flat = pvals.ravel()
+    valid = ~np.isnan(pvals_flat)
+    pvals_valid = pvals_flat[valid]
+    n_tests = pvals_valid.size
+    pvals_corrected = np.full(pvals_flat.shape, np.nan)
+    if n_tests == 0:
+        return pvals_corrected.reshape(pvals.shape)
+
+    if method == 'bonferroni':
+        pvals_corrected[valid] = np.minimum(pvals_valid * n_tests, 1)
+        return pvals_corrected.reshape(pvals.shape)
+
+    order = np.argsort(pvals_valid)
+    pvals_sorted = pvals_valid[order]
+    if method == 'holm':
+        # Step-down: the i-th smallest p-value is multiplied by the number of remaining tests
+        pvals_sorted = np.maximum.accumulate(pvals_sorted * np.arange(n_tests, 0, -1))
+    else:
+        # Step-up (Benjamini-Hochberg, or Benjamini-Yekutieli for arbitrary dependence)
+        ecdf_factor = np.arange(1, n_tests + 1) / n_tests
+        if method == 'fdr_by':
+            ecdf_factor = ecdf_factor / np.sum(1.0 / np.arange(1, n_tests + 1))
+        pvals_sorted = np.minimum.accumulate((pvals_sorted / ecdf_factor)[::-1])[::-1]
+
+    pvals_valid_corrected = np.empty(n_tests)
+    pvals_valid_corrected[order] = np.minimum(pvals_sorted, 1)
+    pvals_corrected[valid] = pvals_valid_corrected
+    return pvals_corrected.reshape(pvals.shape)
+
+###################################################################
+
+
+###################################################################
+# 2 Significance stars
+# A p-value gets the label of the first threshold that it does not exceed, e.g. 0.01 -> '**',
+# and the last label if it exceeds all thresholds (or is missing).
+STAR_THRESHOLDS = (0.001, 0.01, 0.05)
+STAR_LABELS = ('***', '**', '*', 'n.s.')
+
+
+# Returns an array of labels in the shape of pvals, or a single label for a single p-value
+def get_stars(pvals, thresholds=STAR_THRESHOLDS, labels=STAR_LABELS):
+    if len(labels) != len(thresholds) + 1:
+        raise ValueError('Please specify one label more than thresholds (the last one for p-values above all thresholds).')
+    if any(np.diff(thresholds) <= 0):
+        raise ValueError('The thresholds of the stars have to be in ascending order.')
+    # NaN is sorted behind all thresholds and therefore gets the last label
+    l_bins = np.searchsorted(np.asarray(thresholds, dtype=np.float64), np.asarray(pvals, dtype=np.float64), side='left')
+    if np.ndim(l_bins) == 0:
+        return labels[l_bins]
+    return np.asarray(labels, dtype=object)[l_bins]
@@ -0,0 +1,442 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import pandas as pd
+import numpy as np
+import warnings
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+
+from .comparisons import get_planned_group_pairs, get_planned_session_pairs, plans_all_pairs, planned_pairwise_tests_mixed
+from .correction import get_stars
+from .lazy_imports import lazy_import
+from .mixed_anova import compute_mixed_anova, get_subject_matrix
+from .pairwise import pairwise_tests_independent
+from .profiling import stage
+
+# pingouin & scipy are only imported when the first statistics are computed (see lazy_imports.py)
+pg = lazy_import('pingouin')
+stats = lazy_import('scipy.stats')
+
+###################################################################
+#Overview:
+
+    # 1 Container for the results of a statistical test
+    # 2 Prepare the data and check assumptions
+    # 3 Compute statistics
+    # 4 Process statistical results for download
+
+# This module is the headless part of the widget: it does not import ipywidgets
+# or IPython and does not touch any module-level state, so it can be used from
+# batch jobs, scripts, or several threads at once.
+
+###################################################################
+
+
+###################################################################
+# 1 Container for the results of a statistical test
+TESTS = ('independent_samples', 'one_sample', 'mixed_model_ANOVA')
+
+# Column roles of each test, in the order in which the widget expects the columns
+COLUMN_ROLES = {'independent_samples': ('data_col', 'group_col'),
+                'one_sample': ('data_col', 'group_col', 'fixed_val_col'),
+                'mixed_model_ANOVA': ('data_col', 'group_col', 'subject_col', 'session_col')}
+
+
+# d_cells holds one read-only data array per group (or (group, session)) cell,
+# df_cell_stats the descriptive statistics and Shapiro-Wilk results of all cells,
+# d_main['summary'] the group-level results of the performed test, and d_pvals
+# the p-value & stars of each pairwise comparison for annotation (see 3.4), and
+# comparison_plan the pairs that were compared (None: all pairs, see comparisons.py)
+@dataclass(frozen=True)
+class StatsResults:
+    test: str
+    performed_test: str
+    parametric: bool
+    data_col: str
+    group_col: str
+    l_groups: tuple
+    d_cells: MappingProxyType
+    df_cell_stats: pd.DataFrame
+    d_main: MappingProxyType
+    df_homoscedasticity: pd.DataFrame = None
+    subject_col: str = None
+    session_col: str = None
+    fixed_val_col: str = None
+    fixed_value: float = None
+    l_sessions: tuple = ()
+    d_pvals: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    comparison_plan: object = None
+
+    # MappingProxyTypes cannot be pickled, which is required e.g. to return the results from worker processes
+    def __reduce__(self):
+        d_fields = {elem.name: getattr(self, elem.name) for elem in fields(self)}
+        d_fields['d_cells'] = dict(self.d_cells)
+        d_fields['d_main'] = {key: dict(value) for key, value in self.d_main.items()}
+        d_fields['d_pvals'] = dict(self.d_pvals)
+        return (unpickle_results, (d_fields, ))
+
+
+def unpickle_results(d_fields):
+    d_fields['d_cells'], d_fields['d_main'] = freeze(d_fields['d_cells'], d_fields['d_main'])
+    d_fields['d_pvals'] = MappingProxyType(d_fields['d_pvals'])
+    return StatsResults(**d_fields)
+
+
+# Helper function to lock the cell data and the summary against modification
+def freeze(d_cells, d_main):
+    for cell_data in d_cells.values():
+        cell_data.setflags(write=False)
+    d_main['summary'] = MappingProxyType(d_main['summary'])
+    return MappingProxyType(d_cells), MappingProxyType(d_main)
+
+
+# Helper function to resolve the column roles. By default, the columns are expected
+# in the order data, group_id, (subject_id / fixed value), session_id
+def get_column(df, col, position):
+    if col is None:
+        return df.columns[position]
+    if col not in df.columns:
+        raise KeyError('Column "{}" not found in the data.'.format(col))
+    return col
+
+
+def resolve_column_roles(df, test, **column_roles):
+    if test not in COLUMN_ROLES:
+        raise ValueError('Unknown test "{}". Please select one of: {}'.format(test, ', '.join(TESTS)))
+    for role in column_roles:
+        if role not in COLUMN_ROLES[test]:
+            raise TypeError('{} does not use the column role "{}".'.format(test, role))
+    return {role: get_column(df, column_roles.get(role), position) for position, role in enumerate(COLUMN_ROLES[test])}
+
+###################################################################
+
+
+###################################################################
+# 2 Prepare the data and check the assumptions of parametric tests
+# 2.1 Split the data column in a single pass into one contiguous array per cell.
+#     Cells are defined by the values in l_cell_cols (e.g. group_id, or group_id & session_id) and
+#     the returned dict preserves the order in which the cells first appear in the data.
+#     The row indices of the cells only depend on the grouping columns, so they can be
+#     computed once and passed as d_cell_indices when several data columns are analyzed.
+#     Categorical grouping columns (see ingestion.load_table) are grouped by their integer codes,
+#     observed=True skips categories (or combinations of them) that do not occur in the data.
+def get_cell_indices(df, l_cell_cols):
+    if len(l_cell_cols) == 1:
+        return df.groupby(l_cell_cols[0], sort=False, observed=True).indices
+    else:
+        return df.groupby(l_cell_cols, sort=False, observed=True).indices
+
+
+def partition_cells(df, data_col, l_cell_cols, d_cell_indices=None):
+    with stage('partition_cells'):
+        if d_cell_indices is None:
+            d_cell_indices = get_cell_indices(df, l_cell_cols)
+        # Missing values are removed once here (as pingouin does), so that n and all statistics of a cell refer to
+        # the same values
+        values = df[data_col].to_numpy(dtype=np.float64)
+        d_cells = {}
+        for key, indices in d_cell_indices.items():
+            cell_data = values[indices]
+            d_cells[key] = np.ascontiguousarray(cell_data[~np.isnan(cell_data)])
+        return d_cells
+
+
+# 2.2 Arrange the (ragged) cell arrays in one NaN-padded matrix with one row per cell
+def pad_cells(l_arrays):
+    n_obs = np.array([cell_data.shape[0] for cell_data in l_arrays])
+    padded = np.full((len(l_arrays), n_obs.max()), np.nan)
+    padded[np.arange(n_obs.max()) < n_obs[:, None]] = np.concatenate(l_arrays)
+    return padded, n_obs
+
+
+# 2.3 Descriptive statistics and Shapiro-Wilk test for all cells at once:
+def get_cell_stats(d_cells, l_keys, alpha=0.05):
+    padded, n_obs = pad_cells([d_cells[key] for key in l_keys])
+    # Cells without any values (e.g. only missing values) get n=0 and NaN for all statistics
+    measured = n_obs > 0
+    medians = np.full(len(l_keys), np.nan)
+    medians[measured] = np.nanmedian(padded[measured], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.nansum(padded, axis=1) / n_obs
+        stddevs = np.sqrt(np.nansum((padded - means[:, None])**2, axis=1) / n_obs)
+        sems = stddevs / np.sqrt(n_obs)
+
+    # Cells with the same number of observations form a dense block, which
+    # allows to test all of them within a single call of the Shapiro-Wilk test
+    test_stats = np.full(len(l_keys), np.nan)
+    pvals = np.full(len(l_keys), np.nan)
+    for n in np.unique(n_obs[n_obs >= 3]):
+        rows = np.flatnonzero(n_obs == n)
+        test_stats[rows], pvals[rows] = stats.shapiro(padded[rows, :n], axis=1)
+
+    if isinstance(l_keys[0], tuple):
+        index = pd.MultiIndex.from_tuples(l_keys)
+    else:
+        index = pd.Index(l_keys)
+
+    return pd.DataFrame({'n': n_obs,
+                         'mean': means,
+                         'median': medians,
+                         'std': stddevs,
+                         'sem': sems,
+                         'W': test_stats,
+                         'pval': pvals,
+                         'normal': pvals > alpha}, index=index)
+
+
+# 2.4 Levene´s test (centered on the median, like scipy & pingouin) across all cells at once. Cells without
+#     any values are left out (as pingouin drops missing values); with less than two cells, the result is NaN.
+def get_homoscedasticity(d_cells, l_keys, alpha=0.05):
+    l_keys = [key for key in l_keys if d_cells[key].shape[0] > 0]
+    if len(l_keys) < 2:
+        return pd.DataFrame({'W': np.nan, 'pval': np.nan, 'equal_var': False}, index=['levene'])
+    padded, n_obs = pad_cells([d_cells[key] for key in l_keys])
+    n_cells, n_total = len(l_keys), n_obs.sum()
+    deviations = np.abs(padded - np.nanmedian(padded, axis=1)[:, None])
+    cell_means = np.nansum(deviations, axis=1) / n_obs
+    grand_mean = np.sum(n_obs * cell_means) / n_total
+    numerator = (n_total - n_cells) * np.sum(n_obs * (cell_means - grand_mean)**2)
+    denominator = (n_cells - 1) * np.nansum((deviations - cell_means[:, None])**2)
+    statistic = numerator / denominator
+    pval = stats.f.sf(statistic, n_cells - 1, n_total - n_cells)
+    return pd.DataFrame({'W': statistic, 'pval': pval, 'equal_var': pval > alpha}, index=['levene'])
+
+###################################################################
+
+
+###################################################################
+# 3 Functions to compute the different statistics
+# 3.1 Comparison of independent samples
+# With a comparison plan (see comparisons.py), only the planned pairs of groups are compared.
+def independent_samples(df, data_col=None, group_col=None, d_cell_indices=None, plan=None):
+    data_col = get_column(df, data_col, 0)
+    group_col = get_column(df, group_col, 1)
+
+    d_cells = partition_cells(df, data_col, [group_col], d_cell_indices)
+    l_groups = list(d_cells.keys())
+    if len(l_groups) < 2:
+        raise ValueError('The group_id column has to contain at least two different group_ids for this selection.\n'
+                         'Did you mean to perform a one-sample test?')
+    # Groups with only missing values are kept (with n=0), but at least two groups need data
+    l_empty_groups = [group_id for group_id in l_groups if d_cells[group_id].shape[0] == 0]
+    if len(l_groups) - len(l_empty_groups) < 2:
+        raise ValueError('At least two group_ids need data for this selection, but there are no data for group_id "{}".'.format(
+            '", "'.join(str(group_id) for group_id in l_empty_groups)))
+
+    with stage('cell_statistics_and_normality'):
+        df_cell_stats = get_cell_stats(d_cells, l_groups)
+    with stage('homoscedasticity'):
+        df_homoscedasticity = get_homoscedasticity(d_cells, l_groups)
+
+    d_main = {'summary': {'normality': df_cell_stats['normal'].all(),
+                          'homoscedasticity': df_homoscedasticity['equal_var'].iloc[0]}}
+
+    parametric = all([d_main['summary']['normality'], d_main['summary']['homoscedasticity']])
+
+    if len(l_groups) > 2:
+        if parametric:
+            with stage('anova'):
+                d_main['summary']['group_level_statistic'] = pg.anova(data=df, dv=data_col, between=group_col)
+            performed_test = 'One-way ANOVA'
+        else:
+            with stage('kruskal'):
+                d_main['summary']['group_level_statistic'] = pg.kruskal(data=df, dv=data_col, between=group_col)
+            performed_test = 'Kruskal-Wallis-ANOVA'
+    else:
+        # With only two groups, the pairwise comparison is the only test that is performed
+        if parametric:
+            performed_test = 'independent samples t-test'
+        else:
+            performed_test = 'Mann-Whitney U test'
+
+    # Same results as pg.pairwise_ttests(padjust='holm'), computed from statistics of each group (see pairwise.py)
+    if plans_all_pairs(plan):
+        plan = None
+    l_group_pairs = get_planned_group_pairs(plan, df[group_col], l_groups)
+    d_main['summary']['pairwise_comparisons'] = pairwise_tests_independent(d_cells, l_groups, l_group_pairs, group_col, parametric)
+
+    d_cells, d_main = freeze(d_cells, d_main)
+    return StatsResults(test='independent_samples', performed_test=performed_test, parametric=parametric,
+                        data_col=data_col, group_col=group_col, l_groups=tuple(l_groups), d_cells=d_cells,
+                        df_cell_stats=df_cell_stats, d_main=d_main, df_homoscedasticity=df_homoscedasticity,
+                        d_pvals=get_pval_index(d_main['summary']['pairwise_comparisons']), comparison_plan=plan)
+
+
+# 3.2 Data vs. fixed value:
+def one_sample(df, data_col=None, group_col=None, fixed_val_col=None, d_cell_indices=None):
+    data_col = get_column(df, data_col, 0)
+    group_col = get_column(df, group_col, 1)
+    fixed_val_col = get_column(df, fixed_val_col, 2)
+
+    fixed_value = df[fixed_val_col].values[0]
+    d_cells = partition_cells(df, data_col, [group_col], d_cell_indices)
+    l_groups = list(d_cells.keys())
+    if d_cells[l_groups[0]].shape[0] == 0:
+        raise ValueError('There are no data for group_id "{}".'.format(l_groups[0]))
+
+    with stage('cell_statistics_and_normality'):
+        df_cell_stats = get_cell_stats(d_cells, l_groups[:1])
+    parametric = df_cell_stats['normal'].iloc[0]
+
+    d_main = {'summary': {'normality': parametric}}
+
+    if parametric == True:
+        with stage('ttest'):
+            d_main['summary']['pairwise_comparisons'] = pg.ttest(df[data_col].values, fixed_value)
+        performed_test = 'one sample t-test'
+    else:
+        with stage('wilcoxon'):
+            d_main['summary']['pairwise_comparisons'] = pg.wilcoxon(df[data_col].values - fixed_value, correction='auto')
+        performed_test = 'one sample wilcoxon rank-sum test'
+
+    d_pvals = {(None, frozenset([l_groups[0], fixed_val_col])): get_pval_and_stars(d_main['summary']['pairwise_comparisons']['p-val'].iloc[0])}
+
+    d_cells, d_main = freeze(d_cells, d_main)
+    return StatsResults(test='one_sample', performed_test=performed_test, parametric=parametric,
+                        data_col=data_col, group_col=group_col, l_groups=tuple(l_groups), d_cells=d_cells,
+                        df_cell_stats=df_cell_stats, d_main=d_main, fixed_val_col=fixed_val_col, fixed_value=fixed_value,
+                        d_pvals=MappingProxyType(d_pvals))
+
+
+# 3.3 Mixed-model ANOVA (with a comparison plan, only the planned pairs of groups and sessions are compared):
+def mixed_model_ANOVA(df, data_col=None, group_col=None, subject_col=None, session_col=None, d_cell_indices=None, plan=None):
+    data_col = get_column(df, data_col, 0)
+    group_col = get_column(df, group_col, 1)
+    subject_col = get_column(df, subject_col, 2)
+    session_col = get_column(df, session_col, 3)
+
+    l_groups = list(df[group_col].unique())
+    l_sessions = list(df[session_col].unique())
+    d_cells = partition_cells(df, data_col, [group_col, session_col], d_cell_indices)
+    l_keys = [(group_id, session_id) for group_id in l_groups for session_id in l_sessions]
+    for key in l_keys:
+        if key not in d_cells:
+            raise ValueError('There are no data for group_id "{}" in session_id "{}".'.format(*key))
+
+    with stage('cell_statistics_and_normality'):
+        df_cell_stats = get_cell_stats(d_cells, l_keys)
+    with stage('homoscedasticity'):
+        df_homoscedasticity = get_homoscedasticity(d_cells, l_keys)
+
+    d_main = {'summary': {'normality': df_cell_stats['normal'].all(),
+                          'homoscedasticity': df_homoscedasticity['equal_var'].iloc[0]}}
+
+    parametric = all([d_main['summary']['normality'], d_main['summary']['homoscedasticity']])
+
+    # The subject x session matrix is built (and checked) once for the ANOVA and all pairwise comparisons.
+    # Same results as pg.mixed_anova and pg.pairwise_ttests(padjust='holm') (see mixed_anova.py)
+    matrix = get_subject_matrix(df, data_col, group_col, subject_col, session_col)
+    d_main['summary']['group_level_statistic'] = compute_mixed_anova(matrix, group_col, session_col)
+    performed_test = 'Mixed-model ANOVA'
+    # If we found some non-parametric alternative this could be implemented here
+    if parametric == False:
+        warnings.warn('Please be aware that the data require non-parametric testing. '
+                      'However, this is not implemented yet and a parametric test is computed instead. '
+                      'Permutation tests are available in resampling.py.')
+
+    if plans_all_pairs(plan):
+        plan = None
+    l_session_pairs = get_planned_session_pairs(plan, df[session_col], l_sessions)
+    l_group_pairs = get_planned_group_pairs(plan, df[group_col], l_groups)
+    d_main['summary']['pairwise_comparisons'] = planned_pairwise_tests_mixed(matrix, group_col, session_col,
+                                                                             l_session_pairs, l_group_pairs)
+
+    d_cells, d_main = freeze(d_cells, d_main)
+    return StatsResults(test='mixed_model_ANOVA', performed_test=performed_test, parametric=parametric,
+                        data_col=data_col, group_col=group_col, l_groups=tuple(l_groups), d_cells=d_cells,
+                        df_cell_stats=df_cell_stats, d_main=d_main, df_homoscedasticity=df_homoscedasticity,
+                        subject_col=subject_col, session_col=session_col, l_sessions=tuple(l_sessions),
+                        d_pvals=get_pval_index(d_main['summary']['pairwise_comparisons'], session_col), comparison_plan=plan)
+
+
+# 3.4 Index of the pairwise comparisons, built once so that the annotation of a plot does not have to
+#     search the table of pairwise comparisons for every annotated pair. Keys are (session_id, {group1, group2}),
+#     with session_id None for tests without sessions, values are (p-value, stars). As in the table, the
+#     Holm-corrected p-value is used wherever available. For mixed-model ANOVAs, the main effects are stored
+#     with session_id '-' (as in the table), all group comparisons within a session with their session_id.
+def get_pval_index(df_pairwise, session_col=None):
+    pval_col = 'p-corr' if 'p-corr' in df_pairwise.columns else 'p-unc'
+    if session_col is None:
+        l_sessions = [None] * df_pairwise.shape[0]
+    else:
+        l_sessions = df_pairwise[session_col].tolist()
+    # The stars of all comparisons are assigned at once (see correction.py)
+    pvals = df_pairwise[pval_col].to_numpy(dtype=np.float64)
+    d_pvals = {}
+    for session_id, group1, group2, pval, stars in zip(l_sessions, df_pairwise['A'], df_pairwise['B'], pvals, get_stars(pvals)):
+        d_pvals.setdefault((session_id, frozenset([group1, group2])), (pval, stars))
+    return MappingProxyType(d_pvals)
+
+
+def get_pval_and_stars(pval):
+    return pval, get_stars(pval)
+
+
+# 3.5 Common entry point that dispatches to the selected test (one-sample tests only have a single comparison,
+#     so a comparison plan does not apply to them):
+def compute_stats(df, test, plan=None, **kwargs):
+    if test not in TESTS:
+        raise ValueError('Unknown test "{}". Please select one of: {}'.format(test, ', '.join(TESTS)))
+    with stage('compute_stats'):
+        if test == 'independent_samples':
+            return independent_samples(df, plan=plan, **kwargs)
+        elif test == 'one_sample':
+            return one_sample(df, **kwargs)
+        else:
+            return mixed_model_ANOVA(df, plan=plan, **kwargs)
+
+###################################################################
+
+
+###################################################################
+# 4 Functions to process the statistical data for download:
+# 4.1 Individual group statistics (also used for the summaries of streamed data, see streaming.py):
+def get_individual_group_stats_for_download(results):
+    return get_cell_stats_for_download(results.df_cell_stats)
+
+
+def get_cell_stats_for_download(df_cell_stats, normality_test='Shapiro-Wilk'):
+    df_individual_group_stats = pd.DataFrame({('Group statistics', 'Mean'): df_cell_stats['mean'],
+                                              ('Group statistics', 'Median'): df_cell_stats['median'],
+                                              ('Group statistics', 'Standard deviation'): df_cell_stats['std'],
+                                              ('Group statistics', 'Standard error'): df_cell_stats['sem'],
+                                              ('Test for normal distribution', 'Test'): normality_test,
+                                              ('Test for normal distribution', 'Test statistic'): df_cell_stats['W'],
+                                              ('Test for normal distribution', 'p-value'): df_cell_stats['pval'],
+                                              ('Test for normal distribution', 'Normally distributed?'): df_cell_stats['normal']},
+                                             index=df_cell_stats.index)
+    return df_individual_group_stats
+
+
+# 4.2 Group-level statistics:
+def get_group_level_stats_for_download(results):
+    d_summary = results.d_main['summary']
+    df_group_level_overview = results.df_homoscedasticity.copy()
+    df_group_level_overview.index = [0]
+    df_group_level_overview.columns = pd.MultiIndex.from_tuples([('Levene', 'W statistic'), ('Levene', 'p value'), ('Levene', 'Equal variances?')])
+
+    df_group_level_overview[('', 'all normally distributed?')] = d_summary['normality']
+    df_group_level_overview[('', 'critera for parametric test fulfilled?')] = results.parametric
+    df_group_level_overview[('', 'performed test')] = results.performed_test
+    df_group_level_overview[' '] = ''
+
+    if 'group_level_statistic' in d_summary:
+        df_group_statistics = d_summary['group_level_statistic'].copy()
+
+        df_group_statistics.index = list(range(df_group_statistics.shape[0]))
+        df_group_statistics.columns = pd.MultiIndex.from_tuples([(results.performed_test, elem) for elem in df_group_statistics.columns])
+
+        df_group_level_overview = pd.concat([df_group_level_overview, df_group_statistics], axis=1)
+
+    return df_group_level_overview
+
+
+# 4.3 Write all tables to a single .xlsx file:
+def write_results_to_excel(results, path):
+    with pd.ExcelWriter(path) as writer:
+        get_individual_group_stats_for_download(results).to_excel(writer, sheet_name='Individual group statistics')
+        if results.test in ['independent_samples', 'mixed_model_ANOVA']:
+            get_group_level_stats_for_download(results).to_excel(writer, sheet_name='Whole-group statistics')
+        results.d_main['summary']['pairwise_comparisons'].to_excel(writer, sheet_name='Pairwise comparisons')
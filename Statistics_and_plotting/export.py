@@ -0,0 +1,272 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import base64
+import contextvars
+import html
+import io
+import json
+import pickle
+import zipfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .engine import get_group_level_stats_for_download, get_individual_group_stats_for_download
+from .lazy_imports import lazy_import
+from .profiling import stage
+
+# Imported when the first figure is rendered in the background (see lazy_imports.py)
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+
+###################################################################
+#Overview:
+
+    # 1 Tables of the statistical results
+    # 2 Serialize the tables (.xlsx, .csv, .parquet, .json)
+    # 3 Serialize figures (several formats & resolutions, optionally in the background)
+    # 4 Downloads
+
+# Exports are built from the results and figures that already exist, without
+# computing statistics or re-plotting anything. Every function returns the
+# serialized content as bytes (e.g. for a browser download), or writes it to
+# a path or file-like object if a target is specified.
+
+###################################################################
+
+
+###################################################################
+# 1 Tables of the statistical results (one per sheet of the widget´s statistic_results.xlsx)
+TABLE_FORMATS = ('xlsx', 'csv', 'parquet', 'json')
+
+
+def get_result_tables(results):
+    with stage('result_tables'):
+        d_tables = {'Individual group statistics': get_individual_group_stats_for_download(results)}
+        if results.test in ['independent_samples', 'mixed_model_ANOVA']:
+            d_tables['Whole-group statistics'] = get_group_level_stats_for_download(results)
+        d_tables['Pairwise comparisons'] = results.d_main['summary']['pairwise_comparisons']
+        return d_tables
+
+###################################################################
+
+
+###################################################################
+# 2 Serialize the tables
+# 2.1 Helper function to return the content as bytes if no target is specified
+def write_to_target(write_func, target):
+    if target is None:
+        buffer = io.BytesIO()
+        write_func(buffer)
+        return buffer.getvalue()
+    write_func(target)
+    return target
+
+
+# 2.2 .xlsx: with xlsxwriter (if installed), all sheets are written row by row in constant_memory mode, which keeps only
+#     the current row in memory. Otherwise, the tables are written with pandas & openpyxl.
+def write_xlsx(d_tables, target):
+    try:
+        import xlsxwriter
+    except ImportError:
+        with pd.ExcelWriter(target, engine='openpyxl') as writer:
+            for sheet_name, df_table in d_tables.items():
+                df_table.to_excel(writer, sheet_name=sheet_name)
+        return
+
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True, 'nan_inf_to_errors': True})
+    bold = workbook.add_format({'bold': True})
+    for sheet_name, df_table in d_tables.items():
+        write_sheet(workbook.add_worksheet(sheet_name), df_table, bold)
+    workbook.close()
+
+
+# Header rows (one per level of the columns, repeated labels are left empty like merged cells), followed by
+# one row per row of the table with the index in the first column(s)
+def write_sheet(worksheet, df_table, header_format):
+    n_index_levels = df_table.index.nlevels
+    n_header_rows = df_table.columns.nlevels
+    for level in range(n_header_rows):
+        if level == n_header_rows - 1:
+            l_index_names = ['' if name is None else str(name) for name in df_table.index.names]
+        else:
+            l_index_names = [''] * n_index_levels
+        worksheet.write_row(level, 0, l_index_names, header_format)
+        l_labels = df_table.columns.get_level_values(level)
+        for j, label in enumerate(l_labels):
+            if j == 0 or label != l_labels[j - 1] or level == n_header_rows - 1:
+                worksheet.write(level, n_index_levels + j, get_cell_value(label), header_format)
+
+    for i, (index, row) in enumerate(zip(df_table.index, df_table.itertuples(index=False, name=None))):
+        if n_index_levels == 1:
+            index = (index, )
+        worksheet.write_row(n_header_rows + i, 0, [get_cell_value(value) for value in index + row])
+
+
+# Helper function to convert a value to a type that Excel knows
+def get_cell_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        if isinstance(value, float) and np.isnan(value):
+            return None
+        return value
+    # e.g. the confidence intervals of pingouin, which are arrays
+    return str(value)
+
+
+# 2.3 .csv, .parquet & .json only know one level of column names: levels are joined with ' - ' and the index
+#     becomes a regular column
+def get_flat_table(df_table):
+    df_flat = df_table.reset_index()
+    if isinstance(df_flat.columns, pd.MultiIndex):
+        df_flat.columns = [' - '.join(str(label) for label in labels if str(label).strip() != '') for labels in df_flat.columns]
+    else:
+        df_flat.columns = [str(label) for label in df_flat.columns]
+    # Arrays (e.g. confidence intervals) are stored as text
+    for col in df_flat.columns[df_flat.dtypes == object]:
+        df_flat[col] = [value if isinstance(value, (str, bool, int, float, type(None))) else str(value) for value in df_flat[col]]
+    return df_flat
+
+
+# Several tables in one download: a .zip archive with one file per table
+def write_zip(d_tables, target, file_format):
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for sheet_name, df_table in d_tables.items():
+            buffer = io.BytesIO()
+            if file_format == 'csv':
+                get_flat_table(df_table).to_csv(buffer, index=False)
+            else:
+                get_flat_table(df_table).to_parquet(buffer, index=False)
+            archive.writestr('{}.{}'.format(sheet_name, file_format), buffer.getvalue())
+
+
+def write_json(d_tables, target):
+    content = json.dumps({sheet_name: json.loads(get_flat_table(df_table).to_json(orient='records'))
+                          for sheet_name, df_table in d_tables.items()}, indent=1)
+    target.write(content.encode())
+
+
+# 2.4 Serialize all tables in the selected format. Paths as target are opened here.
+def write_tables(d_tables, file_format='xlsx', target=None):
+    if file_format not in TABLE_FORMATS:
+        raise ValueError('Unsupported format "{}". Please use one of: {}'.format(file_format, ', '.join(TABLE_FORMATS)))
+    if isinstance(target, str) and file_format == 'json':
+        with open(target, 'wb') as json_file:
+            write_json(d_tables, json_file)
+        return target
+
+    with stage('write_tables'):
+        if file_format == 'xlsx':
+            return write_to_target(lambda buffer: write_xlsx(d_tables, buffer), target)
+        elif file_format == 'json':
+            return write_to_target(lambda buffer: write_json(d_tables, buffer), target)
+        else:
+            return write_to_target(lambda buffer: write_zip(d_tables, buffer, file_format), target)
+
+###################################################################
+
+
+###################################################################
+# 3 Serialize figures
+FIGURE_FORMATS = ('png', 'svg', 'pdf')
+VECTOR_FORMATS = ('svg', 'pdf')
+
+
+# 3.1 A single format & resolution:
+def write_figure(fig, file_format='png', dpi=300, target=None):
+    if file_format not in FIGURE_FORMATS:
+        raise ValueError('Unsupported format "{}". Please use one of: {}'.format(file_format, ', '.join(FIGURE_FORMATS)))
+    with stage('write_figure'):
+        return write_to_target(lambda buffer: fig.savefig(buffer, format=file_format, dpi=dpi), target)
+
+
+# Helper function that accepts a single value or several values, e.g. dpi=300 or dpi=[150, 300, 600]
+def as_tuple(values):
+    if isinstance(values, (str, int, float)):
+        return (values, )
+    return tuple(values)
+
+
+# 3.2 Several formats & resolutions of the same figure. Returns {filename: content}. The resolution is added to the
+#     filenames of .png files if there is more than one (e.g. customized_plot_600dpi.png). Vector formats are only
+#     written once, at the highest resolution (which only matters for rasterized elements, e.g. large stripplots).
+def write_figures(fig, figure_formats='png', dpi=300, figure_name='customized_plot'):
+    l_dpis = sorted(set(as_tuple(dpi)))
+    d_figures = {}
+    for file_format in as_tuple(figure_formats):
+        if file_format in VECTOR_FORMATS:
+            d_figures['{}.{}'.format(figure_name, file_format)] = write_figure(fig, file_format, l_dpis[-1])
+        elif len(l_dpis) == 1:
+            d_figures['{}.{}'.format(figure_name, file_format)] = write_figure(fig, file_format, l_dpis[0])
+        else:
+            for elem in l_dpis:
+                d_figures['{}_{}dpi.{}'.format(figure_name, elem, file_format)] = write_figure(fig, file_format, elem)
+    return d_figures
+
+
+# 3.3 Rendering in the background: the current state of the figure is pickled, so that later changes of the
+#     figure (e.g. by refreshing the plot) do not affect files that are still being written. The copy is rendered
+#     with the Agg backend, which is independent of pyplot and of the backend of the notebook.
+def snapshot_figure(fig):
+    return pickle.dumps(fig)
+
+
+def write_figures_from_snapshot(snapshot, figure_formats='png', dpi=300, figure_name='customized_plot'):
+    fig = pickle.loads(snapshot)
+    backend_agg.FigureCanvasAgg(fig)
+    return write_figures(fig, figure_formats, dpi, figure_name)
+
+
+# Returns a concurrent.futures.Future of {filename: content}. With a thread (default), the notebook stays
+# responsive while the files are written; a process additionally avoids competing for the GIL.
+# If specified, callback(future) is called as soon as all files were written (or rendering failed).
+def write_figures_in_background(fig, figure_formats='png', dpi=300, figure_name='customized_plot', use_process=False,
+                                callback=None):
+    executor = ProcessPoolExecutor(max_workers=1) if use_process else ThreadPoolExecutor(max_workers=1)
+    if use_process:
+        future = executor.submit(write_figures_from_snapshot, snapshot_figure(fig), figure_formats, dpi, figure_name)
+    else:
+        # Within a copy of the current context, so that the stages are recorded if the download is profiled
+        future = executor.submit(contextvars.copy_context().run, write_figures_from_snapshot, snapshot_figure(fig),
+                                 figure_formats, dpi, figure_name)
+    if callback is not None:
+        future.add_done_callback(callback)
+    executor.shutdown(wait=False)
+    return future
+
+###################################################################
+
+
+###################################################################
+# 4 Downloads
+# File extensions & MIME types of all formats (tables in .csv or .parquet format are zipped)
+FILE_EXTENSIONS = {'xlsx': '.xlsx', 'csv': '.zip', 'parquet': '.zip', 'json': '.json', 'png': '.png', 'svg': '.svg', 'pdf': '.pdf'}
+MIME_TYPES = {'.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+              '.zip': 'application/zip',
+              '.json': 'application/json',
+              '.png': 'image/png',
+              '.svg': 'image/svg+xml',
+              '.pdf': 'application/pdf'}
+
+
+# 4.1 Serialize the results and / or the figure. Returns {filename: content}, e.g. {'statistic_results.xlsx': b'...'}
+#     figure_format and dpi also accept several values (see write_figures).
+def export_results(results=None, fig=None, table_format='xlsx', figure_format='png', dpi=300, d_tables=None,
+                   tables_name='statistic_results', figure_name='customized_plot'):
+    d_exports = {}
+    if results is not None or d_tables is not None:
+        if d_tables is None:
+            d_tables = get_result_tables(results)
+        d_exports[tables_name + FILE_EXTENSIONS[table_format]] = write_tables(d_tables, table_format)
+    if fig is not None:
+        d_exports.update(write_figures(fig, figure_format, dpi, figure_name))
+    return d_exports
+
+
+# 4.2 HTML link that lets the browser download the content directly (e.g. from a Jupyter notebook) as a data URI
+def get_download_link(content, filename):
+    extension = filename[filename.rfind('.'):]
+    data_uri = 'data:{};base64,{}'.format(MIME_TYPES.get(extension, 'application/octet-stream'), base64.b64encode(content).decode())
+    return '<a download="{0}" href="{1}" target="_blank">Download {0}</a>'.format(html.escape(filename), data_uri)
@@ -0,0 +1,184 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import io
+import os
+import pandas as pd
+
+from .engine import resolve_column_roles
+from .profiling import stage
+
+###################################################################
+#Overview:
+
+    # 1 Detect the file format
+    # 2 Read the data from memory or from disk
+    # 3 Fast path: read only the columns of the selected test with optimized dtypes
+
+# Uploaded files are parsed directly from the bytes that the widget received,
+# without writing them to the working directory first. Besides .csv and .xlsx,
+# the columnar formats Parquet and Feather are supported (requires pyarrow).
+
+###################################################################
+
+
+###################################################################
+# 1 Detect the file format
+FILE_FORMATS = ('csv', 'xlsx', 'parquet', 'feather')
+FILE_EXTENSIONS = {'.csv': 'csv', '.xlsx': 'xlsx', '.parquet': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+
+# Magic bytes at the start of the respective files (.xlsx files are zip archives)
+MAGIC_BYTES = [(b'PK\x03\x04', 'xlsx'),
+               (b'PAR1', 'parquet'),
+               (b'ARROW1', 'feather'),
+               (b'FEA1', 'feather')]
+
+
+# The content decides wherever possible, so that e.g. a .csv that was saved
+# from Excel as .xlsx is still read correctly. Text files have no magic bytes,
+# so everything else is treated as csv unless the file name says otherwise.
+def sniff_format(content, filename=None):
+    head = bytes(content[:8])
+    for magic_bytes, file_format in MAGIC_BYTES:
+        if head.startswith(magic_bytes):
+            return file_format
+    if filename is not None:
+        extension = os.path.splitext(filename)[1].lower()
+        if FILE_EXTENSIONS.get(extension, 'csv') != 'csv':
+            raise ValueError('{} does not look like a valid {} file.'.format(filename, extension))
+    return 'csv'
+
+###################################################################
+
+
+###################################################################
+# 2 Read the data from memory or from disk
+# 2.1 Parse a file-like object or path with the reader of the respective format.
+#     As in the widget, the first column of .csv / .xlsx files holds the index.
+#     Additional keyword arguments are passed on to the pandas reader.
+def read_buffer(buffer, file_format, **kwargs):
+    if file_format not in FILE_FORMATS:
+        raise ValueError('Unsupported file format "{}". Please use one of: {}'.format(file_format, ', '.join(FILE_FORMATS)))
+    with stage('read_file'):
+        if file_format == 'csv':
+            return pd.read_csv(buffer, **{'index_col': 0, **kwargs})
+        elif file_format == 'xlsx':
+            return pd.read_excel(buffer, **{'index_col': 0, **kwargs})
+        elif file_format == 'parquet':
+            return pd.read_parquet(buffer, **kwargs)
+        else:
+            return pd.read_feather(buffer, **kwargs)
+
+
+# 2.2 Read the data from bytes, bytearray, or memoryview without touching the disk:
+def read_bytes(content, filename=None, file_format=None):
+    if file_format is None:
+        file_format = sniff_format(content, filename)
+    return read_buffer(io.BytesIO(content), file_format)
+
+
+# 2.3 Read the data from a file on disk:
+def read_file(path, file_format=None):
+    if file_format is None:
+        with open(path, 'rb') as data_file:
+            file_format = sniff_format(data_file.read(8), path)
+    return read_buffer(path, file_format)
+
+
+# 2.4 Read the file that was uploaded via the widget. ipywidgets 7 stores the
+#     uploads as {filename: {'content': bytes, ...}}, ipywidgets 8 as a tuple of
+#     dicts with 'name' and 'content' (a memoryview).
+#     If a test is specified, only its columns are loaded (see load_table).
+def read_upload(uploader_value, test=None, **kwargs):
+    if isinstance(uploader_value, dict):
+        filename = list(uploader_value.keys())[0]
+        content = uploader_value[filename]['content']
+    else:
+        filename = uploader_value[0]['name']
+        content = uploader_value[0]['content']
+    if test is None:
+        return filename, read_bytes(content, filename)
+    return filename, load_table(content, test, filename=filename, **kwargs)
+
+###################################################################
+
+
+###################################################################
+# 3 Fast path: read only the columns of the selected test with optimized dtypes
+# Columns that define the group (x session) cells and subjects. They are loaded as categoricals,
+# so that the partitioning into cells runs on integer codes instead of strings.
+GROUPING_ROLES = ('group_col', 'subject_col', 'session_col')
+
+
+# 3.1 Get the names of all columns without reading the data. For .csv / .xlsx, the first name is the index.
+def read_column_names(source, file_format):
+    if file_format in ['csv', 'xlsx']:
+        return list(read_buffer(source, file_format, nrows=0, index_col=None).columns)
+    import pyarrow.parquet
+    import pyarrow.feather
+    if file_format == 'parquet':
+        l_names = pyarrow.parquet.read_schema(source).names
+    else:
+        l_names = pyarrow.feather.read_table(source, memory_map=True).schema.names
+    # Skip the index columns that pandas stores in these files
+    return [name for name in l_names if not name.startswith('__index_level_')]
+
+
+# 3.2 Helper function to re-open the source (path, bytes, bytearray, or memoryview) for every read
+def get_source_opener(source, filename=None, file_format=None):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if file_format is None:
+            file_format = sniff_format(source, filename)
+        return (lambda: io.BytesIO(source)), file_format
+    if file_format is None:
+        with open(source, 'rb') as data_file:
+            file_format = sniff_format(data_file.read(8), source)
+    return (lambda: source), file_format
+
+
+# 3.3 Determine which columns to read and with which dtypes. Returns the name of the index column
+#     (None for Parquet / Feather), the columns in file order, the dtypes, and the resolved column roles.
+def get_columns_to_load(open_source, file_format, test, categorical=True, float32=False, **column_roles):
+    l_names = read_column_names(open_source(), file_format)
+    index_name = None
+    if file_format in ['csv', 'xlsx']:
+        index_name, l_names = l_names[0], l_names[1:]
+    d_column_roles = resolve_column_roles(pd.DataFrame(columns=l_names), test, **column_roles)
+
+    d_dtypes = {}
+    if categorical:
+        d_dtypes.update({col: 'category' for role, col in d_column_roles.items() if role in GROUPING_ROLES})
+    if float32:
+        d_dtypes[d_column_roles['data_col']] = 'float32'
+    l_cols = [col for col in l_names if col in d_column_roles.values()]
+    return index_name, l_cols, d_dtypes, d_column_roles
+
+
+# 3.4 Load only the columns of the selected test (source: path, bytes, bytearray, or memoryview).
+#     Columns can be specified by their roles (e.g. data_col='speed'), otherwise the widget´s
+#     positional convention applies. Options:
+#       - categorical: load the grouping columns as categoricals
+#       - float32: load the data column as float32 to halve its memory footprint
+#       - engine: e.g. 'pyarrow' to parse .csv files with multiple threads
+def load_table(source, test, filename=None, file_format=None, categorical=True, float32=False, engine=None, **column_roles):
+    open_source, file_format = get_source_opener(source, filename, file_format)
+    index_name, l_cols, d_dtypes, d_column_roles = get_columns_to_load(open_source, file_format, test, categorical, float32, **column_roles)
+    # The grouping columns are parsed with their normal dtypes first and converted to categoricals afterwards.
+    # Parsed as 'category' directly, numeric IDs would become strings (sorted as '1', '10', '2').
+    d_read_dtypes = {col: dtype for col, dtype in d_dtypes.items() if dtype != 'category'}
+
+    if file_format == 'csv':
+        d_kwargs = {'dtype': d_read_dtypes}
+        if engine is not None:
+            d_kwargs['engine'] = engine
+            if engine == 'pyarrow' and index_name.startswith('Unnamed: '):
+                # pyarrow does not rename the unnamed index column
+                index_name = ''
+        df = read_buffer(open_source(), 'csv', usecols=[index_name] + l_cols, **d_kwargs)
+    elif file_format == 'xlsx':
+        df = read_buffer(open_source(), 'xlsx', usecols=[index_name] + l_cols, dtype=d_read_dtypes)
+    else:
+        df = read_buffer(open_source(), file_format, columns=l_cols)
+
+    return df[l_cols].astype(d_dtypes)
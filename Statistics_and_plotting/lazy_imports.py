@@ -0,0 +1,58 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import importlib
+import threading
+
+###################################################################
+#Overview:
+
+    # 1 Import heavy dependencies only when they are used for the first time
+
+# pingouin (with scipy & statsmodels), seaborn, matplotlib and ipywidgets take
+# several seconds to import. Modules of this package therefore refer to them via
+# a placeholder, e.g.:
+#
+#   pg = lazy_import('pingouin')
+#
+# which imports the actual module on the first access of any of its attributes
+# (e.g. pg.anova), so that importing the package itself stays fast.
+
+###################################################################
+
+
+###################################################################
+# 1 Import heavy dependencies only when they are used for the first time
+class LazyModule:
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    # Only called for attributes that are not found otherwise, i.e. everything except the three above
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        status = 'imported' if self._module is not None else 'not imported yet'
+        return '<lazy module {} ({})>'.format(self._name, status)
+
+    # The import runs only once, also if several threads (e.g. the background jobs of the widget) need the module at once
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self.__dict__['_module'] = importlib.import_module(self._name)
+        return self._module
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -0,0 +1,196 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import warnings
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+from .lazy_imports import lazy_import
+from .profiling import stage
+
+# Imported when the first statistics are computed (see lazy_imports.py)
+stats = lazy_import('scipy.stats')
+
+###################################################################
+#Overview:
+
+    # 1 Subject x session matrix
+    # 2 Sphericity
+    # 3 Mixed-model ANOVA
+
+# The long table is arranged only once in a matrix with one row per subject
+# and one column per session. All sums of squares of the mixed-model ANOVA
+# (and the pairwise comparisons, see comparisons.py) are computed from this
+# matrix. The ANOVA table is the same as the one of pingouin.mixed_anova,
+# including eps and the sphericity correction of the session.
+
+###################################################################
+
+
+###################################################################
+# 1 Subject x session matrix
+# values: (subjects, sessions), group_codes: index of the group of each subject in l_groups,
+# n_excluded: number of subjects without data in every session
+@dataclass(frozen=True)
+class SubjectMatrix:
+    values: np.ndarray
+    subject_ids: np.ndarray
+    group_ids: np.ndarray
+    group_codes: np.ndarray
+    l_groups: tuple
+    l_sessions: tuple
+    n_excluded: int = 0
+
+
+# Like pingouin, several values of a subject in one session are averaged and subjects with missing sessions
+# are excluded (listwise deletion). Subjects, groups and sessions are sorted (categoricals in the order of
+# their categories). The data are checked before anything is computed.
+def get_subject_matrix(df, data_col, group_col, subject_col, session_col):
+    with stage('subject_matrix'):
+        valid = df[[group_col, subject_col, session_col]].notna().all(axis=1).to_numpy()
+        subject_codes, subject_ids = pd.factorize(df[subject_col][valid], sort=True)
+        group_codes, l_groups = pd.factorize(df[group_col][valid], sort=True)
+        session_codes, l_sessions = pd.factorize(df[session_col][valid], sort=True)
+        n_subjects, n_groups, n_sessions = len(subject_ids), len(l_groups), len(l_sessions)
+        if n_sessions < 2:
+            raise ValueError('The session_id column has to contain at least two different session_ids for a mixed-model ANOVA.')
+
+        subject_group_codes = np.empty(n_subjects, dtype=np.int64)
+        subject_group_codes[subject_codes] = group_codes
+        if np.any(subject_group_codes[subject_codes] != group_codes):
+            raise ValueError('Subject IDs cannot overlap between groups: each group_id needs its own set of subject_ids, '
+                             'e.g. group1 = [1, 2, 3, ..., 10] and group2 = [11, 12, 13, ..., 20].')
+
+        values = df[data_col].to_numpy(dtype=np.float64)[valid]
+        measured = ~np.isnan(values)
+        matrix_indices = (subject_codes * n_sessions + session_codes)[measured]
+        sums = np.bincount(matrix_indices, weights=values[measured], minlength=n_subjects * n_sessions)
+        counts = np.bincount(matrix_indices, minlength=n_subjects * n_sessions)
+        with np.errstate(invalid='ignore'):
+            matrix = (sums / counts).reshape(n_subjects, n_sessions)
+
+        complete = (counts.reshape(n_subjects, n_sessions) > 0).all(axis=1)
+        subject_group_codes = subject_group_codes[complete]
+        group_sizes = np.bincount(subject_group_codes, minlength=n_groups)
+        for group_id, group_size in zip(l_groups, group_sizes):
+            if group_size == 0:
+                raise ValueError('There are no subjects of group_id "{}" with data in every session_id.'.format(group_id))
+        if complete.sum() <= n_groups:
+            raise ValueError('A mixed-model ANOVA requires more subjects with data in every session_id than group_ids.')
+        n_excluded = int(n_subjects - complete.sum())
+        if n_excluded > 0:
+            warnings.warn('{} of {} subjects do not have data in every session_id and are excluded from the mixed-model ANOVA '
+                          'and the pairwise comparisons.'.format(n_excluded, n_subjects))
+
+        return SubjectMatrix(values=matrix[complete], subject_ids=np.asarray(subject_ids)[complete],
+                             group_ids=np.asarray(l_groups, dtype=object)[subject_group_codes],
+                             group_codes=subject_group_codes, l_groups=tuple(l_groups), l_sessions=tuple(l_sessions),
+                             n_excluded=n_excluded)
+
+###################################################################
+
+
+###################################################################
+# 2 Sphericity of the sessions, from the covariance matrix of the sessions (as in pingouin)
+# 2.1 Greenhouse-Geisser epsilon (always 1 with only two sessions)
+def get_epsilon(values):
+    n_sessions = values.shape[1]
+    if n_sessions <= 2:
+        return 1.0
+    cov = np.cov(values, rowvar=False)
+    cov_mean = cov.mean()
+    numerator = (n_sessions * (np.diag(cov).mean() - cov_mean)) ** 2
+    denominator = (n_sessions - 1) * ((cov ** 2).sum() - 2 * n_sessions * (cov.mean(axis=1) ** 2).sum()
+                                      + n_sessions ** 2 * cov_mean ** 2)
+    return min(numerator / denominator, 1)
+
+
+# 2.2 Mauchly´s test. Returns (sphericity, W, p-value); sphericity is always met with only two sessions.
+def mauchly_test(values, alpha=0.05):
+    n_subjects, n_sessions = values.shape
+    if n_sessions <= 2:
+        return True, np.nan, 1.0
+    d = n_sessions - 1
+    dof = max(d * (d + 1) / 2 - 1, 1)
+    # Eigenvalues of the double-centered covariance matrix
+    cov = np.cov(values, rowvar=False)
+    cov_centered = cov - cov.mean(axis=0)[:, None] - cov.mean(axis=1)[None, :] + cov.mean()
+    eigenvalues = np.linalg.eigvalsh(cov_centered)[1:]
+    eigenvalues = eigenvalues[eigenvalues > 0.001]
+    w_stat = np.prod(eigenvalues) / (eigenvalues.sum() / d) ** d
+    # Chi-square approximation (as in the ezANOVA R package)
+    f = 1 - (2 * d ** 2 + d + 2) / (6 * d * (n_subjects - 1))
+    w2 = (d + 2) * (d - 1) * (d - 2) * (2 * d ** 3 + 6 * d ** 2 + 3 * n_sessions + 2) / (288 * ((n_subjects - 1) * d * f) ** 2)
+    chi_sq = -(n_subjects - 1) * f * np.log(w_stat)
+    p1, p2 = stats.chi2.sf(chi_sq, dof), stats.chi2.sf(chi_sq, dof + 4)
+    pval = p1 + w2 * (p2 - p1)
+    return pval > alpha, w_stat, pval
+
+###################################################################
+
+
+###################################################################
+# 3 Mixed-model ANOVA: between-subject factor group_id, within-subject factor session_id
+def compute_mixed_anova(matrix, group_col, session_col):
+    with stage('mixed_anova'):
+        values, group_codes = matrix.values, matrix.group_codes
+        n_subjects, n_sessions = values.shape
+        n_groups = len(matrix.l_groups)
+        group_sizes = np.bincount(group_codes, minlength=n_groups)
+
+        grand_mean = values.mean()
+        session_means = values.mean(axis=0)
+        subject_means = values.mean(axis=1)
+        # (groups, sessions) means of each group x session cell
+        cell_means = np.eye(n_groups)[group_codes].T @ values / group_sizes[:, None]
+        group_means = cell_means.mean(axis=1)
+
+        # 3.1 Sums of squares
+        ss_total = np.sum((values - grand_mean) ** 2)
+        ss_session = n_subjects * np.sum((session_means - grand_mean) ** 2)
+        ss_group = n_sessions * np.sum(group_sizes * (group_means - grand_mean) ** 2)
+        ss_cells = np.sum((values - cell_means[group_codes]) ** 2)
+        ss_interaction = ss_total - (ss_cells + ss_session + ss_group)
+        # Error of the session without groups (one-way repeated-measures ANOVA), which is split into the interaction
+        # and the error of the within-subject effects
+        ss_error_sessions = np.sum((values - session_means) ** 2) - n_sessions * np.sum((subject_means - grand_mean) ** 2)
+        ss_error_within = ss_error_sessions - ss_interaction
+        ss_error_between = ss_total - (ss_session + ss_group + ss_error_within + ss_interaction)
+
+        # 3.2 Degrees of freedom, F & p-values
+        df_group, df_session = n_groups - 1, n_sessions - 1
+        df_interaction = df_session * df_group
+        df_error_between = n_subjects - n_groups
+        df_error_within = df_session * df_error_between
+        ms_group, ms_session, ms_interaction = ss_group / df_group, ss_session / df_session, ss_interaction / df_interaction
+        ms_error_between, ms_error_within = ss_error_between / df_error_between, ss_error_within / df_error_within
+        f_group, f_session, f_interaction = ms_group / ms_error_between, ms_session / ms_error_within, ms_interaction / ms_error_within
+
+        df_aov = pd.DataFrame({'Source': [group_col, session_col, 'Interaction'],
+                               'SS': [ss_group, ss_session, ss_interaction],
+                               'DF1': [df_group, df_session, df_interaction],
+                               'DF2': [df_error_between, df_error_within, df_error_within],
+                               'MS': [ms_group, ms_session, ms_interaction],
+                               'F': [f_group, f_session, f_interaction],
+                               'p-unc': [stats.f.sf(f_group, df_group, df_error_between),
+                                         stats.f.sf(f_session, df_session, df_error_within),
+                                         stats.f.sf(f_interaction, df_interaction, df_error_within)],
+                               'np2': [ss_group / (ss_group + ss_error_between), ss_session / (ss_session + ss_error_within),
+                                       ss_interaction / (ss_interaction + ss_error_within)],
+                               'eps': [np.nan, get_epsilon(values), np.nan]})
+
+        # 3.3 If Mauchly´s test rejects sphericity, the Greenhouse-Geisser corrected p-value of the session is added.
+        #     As in pingouin, it is the one of the F value without groups (one-way repeated-measures ANOVA).
+        sphericity, w_stat, p_sphericity = mauchly_test(values)
+        if not sphericity:
+            eps = df_aov.at[1, 'eps']
+            df_error_sessions = df_session * (n_subjects - 1)
+            f_sessions = ms_session / (ss_error_sessions / df_error_sessions)
+            df_aov.insert(7, 'p-GG-corr', [np.nan, stats.f.sf(f_sessions, max(df_session * eps, 1), max(df_error_sessions * eps, 1)),
+                                           np.nan])
+            df_aov['sphericity'] = [np.nan, False, np.nan]
+            df_aov['W-spher'] = [np.nan, w_stat, np.nan]
+            df_aov['p-spher'] = [np.nan, p_sphericity, np.nan]
+        return df_aov
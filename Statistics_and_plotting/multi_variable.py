@@ -0,0 +1,117 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import pandas as pd
+
+from .correction import correct_pvals, get_stars
+from .engine import compute_stats, get_cell_indices, resolve_column_roles
+from .parallel import compute_stats_parallel
+
+###################################################################
+#Overview:
+
+    # 1 Run the selected test for several dependent variables
+    # 2 Consolidate the results of all variables in one long-format table
+
+# Instead of one file per measured variable, all (or a chosen subset of the)
+# numeric columns of one DataFrame are analyzed with the same test and the
+# same group_id / subject_id / session_id columns.
+
+###################################################################
+
+
+###################################################################
+# 1 Run the selected test for several dependent variables
+# By default, all numeric columns that do not have another role (e.g. a numeric
+# subject_id or the fixed value of a one-sample test) are analyzed.
+def get_data_cols(df, d_column_roles):
+    l_other_cols = [col for role, col in d_column_roles.items() if role != 'data_col']
+    return [col for col in df.select_dtypes('number').columns if col not in l_other_cols]
+
+
+# Returns a dict with one StatsResults per data column (in the order of data_cols).
+# With n_workers other than 1, the variables are distributed across worker processes.
+# The same comparison plan (see comparisons.py) is used for all variables.
+def compute_stats_multi(df, test, data_cols=None, n_workers=1, plan=None, **column_roles):
+    d_column_roles = resolve_column_roles(df, test, **column_roles)
+    if data_cols is None:
+        data_cols = get_data_cols(df, d_column_roles)
+    if len(data_cols) == 0:
+        raise ValueError('There are no numeric columns to analyze.')
+
+    l_column_roles = [{**d_column_roles, 'data_col': data_col} for data_col in data_cols]
+
+    if n_workers == 1:
+        # The partitioning into group (x session) cells is the same for all variables
+        l_cell_cols = [d_column_roles['group_col']]
+        if test == 'mixed_model_ANOVA':
+            l_cell_cols.append(d_column_roles['session_col'])
+        d_cell_indices = get_cell_indices(df, l_cell_cols)
+        l_results = [compute_stats(df, test, plan, d_cell_indices=d_cell_indices, **d_roles) for d_roles in l_column_roles]
+    else:
+        l_results = compute_stats_parallel(df, test, l_column_roles, n_workers, plan)
+
+    return dict(zip(data_cols, l_results))
+
+###################################################################
+
+
+###################################################################
+# 2 Consolidate the results of all variables in one long-format table
+# Helper function to get the uncorrected p-value of each row. The correction across variables starts from these,
+# since correcting the p-values that were already corrected within each variable would correct them twice.
+def get_pvals(df_tmp):
+    for col in ['p-unc', 'p-val']:
+        if col in df_tmp.columns:
+            return df_tmp[col]
+
+
+# Helper function to get the family of each row, in which the p-values are corrected across variables:
+# the group level tests form one family, the pairwise comparisons one family per contrast (e.g. all
+# comparisons of groups of all variables, but separately from the comparisons of sessions).
+def get_families(df_tmp, level):
+    if level == 'pairwise' and 'Contrast' in df_tmp.columns:
+        return 'pairwise: ' + df_tmp['Contrast'].astype(str)
+    return level
+
+
+# One row per group-level test and per pairwise comparison of each variable, with the uncorrected p-value.
+# Optionally, the p-values are corrected across all variables, within each correction family
+# (fdr_method: e.g. 'fdr_bh' or 'fdr_by', see correction.py)
+def get_consolidated_results(d_results, fdr_method=None):
+    l_dfs = []
+    for data_col, results in d_results.items():
+        d_summary = results.d_main['summary']
+        l_levels = [('pairwise', d_summary['pairwise_comparisons'])]
+        if 'group_level_statistic' in d_summary:
+            l_levels.insert(0, ('group level', d_summary['group_level_statistic']))
+        for level, df_tmp in l_levels:
+            df_tmp = df_tmp.copy()
+            df_tmp['p-value'] = get_pvals(df_tmp)
+            df_tmp['correction family'] = get_families(df_tmp, level)
+            df_tmp.insert(0, 'Level', level)
+            df_tmp.insert(0, 'Parametric test', results.parametric)
+            df_tmp.insert(0, 'Performed test', results.performed_test)
+            df_tmp.insert(0, 'Variable', data_col)
+            l_dfs.append(df_tmp.reset_index(drop=True))
+
+    df_consolidated = pd.concat(l_dfs, ignore_index=True)
+
+    if fdr_method is not None:
+        df_consolidated = correct_across_variables(df_consolidated, fdr_method)
+
+    return df_consolidated
+
+
+# Helper function to (re-)compute the correction across all variables of a consolidated table, e.g. to switch
+# the method without consolidating the results again. Returns a copy with the corrected p-values & their stars.
+# Each correction family (see get_families) is corrected on its own.
+def correct_across_variables(df_consolidated, method='fdr_bh'):
+    df_consolidated = df_consolidated.copy()
+    pvals_corrected = df_consolidated.groupby('correction family', sort=False)['p-value'].transform(
+        lambda pvals: correct_pvals(pvals.to_numpy(), method)).to_numpy()
+    df_consolidated['p-value (corrected across variables)'] = pvals_corrected
+    df_consolidated['stars (corrected across variables)'] = get_stars(pvals_corrected)
+    df_consolidated['correction across variables'] = method
+    return df_consolidated
@@ -0,0 +1,164 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import numpy as np
+import pandas as pd
+
+from .correction import correct_pvals
+from .lazy_imports import lazy_import
+from .profiling import stage
+
+# Imported when the first statistics are computed (see lazy_imports.py)
+stats = lazy_import('scipy.stats')
+
+###################################################################
+#Overview:
+
+    # 1 Sufficient statistics of each group
+    # 2 t-tests of many pairs at once
+    # 3 Mann-Whitney U tests of many pairs at once
+    # 4 Table of the pairwise comparisons
+
+# Pairwise comparisons of independent samples, computed from statistics that
+# are prepared once per group (n, mean, variance, sorted values) instead of
+# once per pair. T, dof, U, the p-values and Hedges´ g are the same as those
+# of pingouin.pairwise_ttests (t-test with correction='auto', Mann-Whitney U
+# with continuity correction), so is the table, except for the Bayes factors,
+# which are not computed.
+
+###################################################################
+
+
+###################################################################
+# 1 Sufficient statistics of each group. Missing values are removed (as in pingouin).
+#   The sorted values of all groups are also stored back to back in one array, together with the number of times
+#   that each value occurs within its group (for the tie correction).
+def get_group_summaries(d_cells, l_groups):
+    l_values = []
+    for group_id in l_groups:
+        values = np.asarray(d_cells[group_id], dtype=np.float64)
+        l_values.append(np.sort(values[~np.isnan(values)]))
+    n = np.array([values.shape[0] for values in l_values])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.array([values.mean() if values.shape[0] > 0 else np.nan for values in l_values])
+        var = np.array([values.var(ddof=1) if values.shape[0] > 1 else np.nan for values in l_values])
+
+    multiplicity = np.concatenate([np.searchsorted(values, values, side='right') - np.searchsorted(values, values, side='left')
+                                   for values in l_values])
+    # Index of the group of each value, to sum up per group
+    group_labels = np.repeat(np.arange(len(l_values)), n)
+    # Tie term of each group on its own: sum of (t**3 - t) over all distinct values that occur t times
+    tie_term = np.bincount(group_labels, weights=multiplicity ** 2 - 1.0, minlength=len(l_values))
+    return {'groups': list(l_groups), 'n': n, 'mean': mean, 'var': var, 'l_sorted_values': l_values,
+            'all_values': np.concatenate(l_values), 'multiplicity': multiplicity, 'group_labels': group_labels,
+            'tie_term': tie_term}
+
+###################################################################
+
+
+###################################################################
+# 2 t-tests of many pairs at once (ia, ib: indices of the groups of each pair). As with correction='auto'
+#   in pingouin, Student´s t-test is used if both groups have the same size and Welch´s t-test otherwise.
+def ttests(d_summaries, ia, ib):
+    n1, n2 = d_summaries['n'][ia].astype(np.float64), d_summaries['n'][ib].astype(np.float64)
+    var1, var2 = d_summaries['var'][ia], d_summaries['var'][ib]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Student
+        dof = n1 + n2 - 2
+        pooled_var = ((n1 - 1) * var1 + (n2 - 1) * var2) / dof
+        denominator = np.sqrt(pooled_var * (1 / n1 + 1 / n2))
+        # Welch
+        welch = n1 != n2
+        vn1, vn2 = var1 / n1, var2 / n2
+        welch_dof = (vn1 + vn2) ** 2 / (vn1 ** 2 / (n1 - 1) + vn2 ** 2 / (n2 - 1))
+        dof = np.where(welch, welch_dof, dof)
+        denominator = np.where(welch, np.sqrt(vn1 + vn2), denominator)
+
+        tvals = (d_summaries['mean'][ia] - d_summaries['mean'][ib]) / denominator
+    pvals = 2 * stats.t.sf(np.abs(tvals), dof)
+    return tvals, dof, pvals
+
+
+# Hedges´ g: Cohen´s d (with the pooled standard deviation) corrected for small samples
+def hedges_g(d_summaries, ia, ib):
+    n1, n2 = d_summaries['n'][ia].astype(np.float64), d_summaries['n'][ib].astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pooled_sd = np.sqrt(((n1 - 1) * d_summaries['var'][ia] + (n2 - 1) * d_summaries['var'][ib]) / (n1 + n2 - 2))
+        cohen_d = (d_summaries['mean'][ia] - d_summaries['mean'][ib]) / pooled_sd
+    return cohen_d * (1 - 3 / (4 * (n1 + n2) - 9))
+
+###################################################################
+
+
+###################################################################
+# 3 Mann-Whitney U tests of many pairs at once
+# 3.1 U of every group against the group ib, plus the tie term of both groups together. All values are looked up
+#     in the sorted values of ib at once: U counts the values of ib that are smaller (ties count half).
+#     Values that occur in both groups add 3 * (t_a**2 * t_b + t_a * t_b**2) to the tie term.
+def u_against_group(d_summaries, ib):
+    sorted_b = d_summaries['l_sorted_values'][ib]
+    all_values, group_labels = d_summaries['all_values'], d_summaries['group_labels']
+    n_groups = len(d_summaries['groups'])
+    n_smaller = np.searchsorted(sorted_b, all_values, side='left')
+    n_equal = np.searchsorted(sorted_b, all_values, side='right') - n_smaller
+    uvals = np.bincount(group_labels, weights=n_smaller + 0.5 * n_equal, minlength=n_groups)
+    shared_ties = 3 * np.bincount(group_labels, weights=d_summaries['multiplicity'] * n_equal + n_equal ** 2.0,
+                                  minlength=n_groups)
+    return uvals, d_summaries['tie_term'] + d_summaries['tie_term'][ib] + shared_ties
+
+
+# 3.2 U (of the first group of each pair) and the two-sided p-value with the normal approximation & continuity
+#     correction. Like scipy (method='auto'), small samples without ties (at most 8 values in one of the groups)
+#     get the exact p-value instead. Pairs with an empty group get NaN (like the t-tests).
+def mann_whitney_u(d_summaries, ia, ib):
+    uvals, tie_terms = np.empty(ia.shape[0]), np.empty(ia.shape[0])
+    for group_index in np.unique(ib):
+        pair_mask = ib == group_index
+        u_against, tie_term_against = u_against_group(d_summaries, group_index)
+        uvals[pair_mask], tie_terms[pair_mask] = u_against[ia[pair_mask]], tie_term_against[ia[pair_mask]]
+
+    n1, n2 = d_summaries['n'][ia].astype(np.float64), d_summaries['n'][ib].astype(np.float64)
+    n = n1 + n2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_terms / (n * (n - 1))))
+        z = (np.maximum(uvals, n1 * n2 - uvals) - n1 * n2 / 2 - 0.5) / s
+    pvals = np.clip(2 * stats.norm.sf(z), 0, 1)
+    empty = (n1 == 0) | (n2 == 0)
+    uvals[empty], pvals[empty] = np.nan, np.nan
+
+    exact = ((n1 <= 8) | (n2 <= 8)) & (tie_terms == 0) & ~empty
+    for i in np.flatnonzero(exact):
+        pvals[i] = stats.mannwhitneyu(d_summaries['l_sorted_values'][ia[i]], d_summaries['l_sorted_values'][ib[i]],
+                                      method='exact').pvalue
+    return uvals, pvals
+
+###################################################################
+
+
+###################################################################
+# 4 Table of the pairwise comparisons (l_pairs: (A, B) in the order of the table), Holm-corrected if there is
+#   more than one pair. Same columns as the table of pingouin.pairwise_ttests (without BF10).
+def pairwise_tests_independent(d_cells, l_groups, l_pairs, group_col, parametric):
+    with stage('pairwise_tests'):
+        d_summaries = get_group_summaries(d_cells, l_groups)
+        d_group_indices = {group_id: i for i, group_id in enumerate(l_groups)}
+        ia = np.array([d_group_indices[group1] for group1, group2 in l_pairs], dtype=np.int64)
+        ib = np.array([d_group_indices[group2] for group1, group2 in l_pairs], dtype=np.int64)
+
+        df_pairwise = pd.DataFrame({'Contrast': group_col,
+                                    'A': [group1 for group1, group2 in l_pairs],
+                                    'B': [group2 for group1, group2 in l_pairs],
+                                    'Paired': False,
+                                    'Parametric': parametric})
+        if parametric:
+            df_pairwise['T'], df_pairwise['dof'], pvals = ttests(d_summaries, ia, ib)
+        else:
+            df_pairwise['U-val'], pvals = mann_whitney_u(d_summaries, ia, ib)
+        df_pairwise['alternative'] = 'two-sided'
+        df_pairwise['p-unc'] = pvals
+        if len(l_pairs) > 1:
+            df_pairwise['p-corr'] = correct_pvals(pvals, method='holm')
+            df_pairwise['p-adjust'] = 'holm'
+        df_pairwise['hedges'] = hedges_g(d_summaries, ia, ib)
+        return df_pairwise
@@ -0,0 +1,142 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+from .engine import compute_stats, resolve_column_roles
+
+###################################################################
+#Overview:
+
+    # 1 Run independent tasks in a pool of worker processes
+    # 2 Share the columns of a DataFrame with the worker processes
+    # 3 Run many analyses of the same DataFrame in parallel
+
+# pingouin´s tests are single-threaded, so independent analyses (files, or
+# dependent variables of one file) are fanned out to worker processes.
+# Results are always returned in the order of the submitted tasks.
+
+###################################################################
+
+
+###################################################################
+# 1 Run independent tasks in a pool of worker processes
+def get_n_workers(n_workers=None):
+    if n_workers is None:
+        return os.cpu_count() or 1
+    if n_workers < 1:
+        raise ValueError('The number of workers has to be at least 1, not {}.'.format(n_workers))
+    return n_workers
+
+
+# Calls func(*args) for each tuple in l_args. callback(i, result) is called in the main process
+# as soon as a task is finished (e.g. to report progress), while the returned list keeps the
+# order of l_args. With n_workers=1, all tasks are run in the current process.
+def run_in_process_pool(func, l_args, n_workers=None, callback=None):
+    n_workers = get_n_workers(n_workers)
+    l_results = [None] * len(l_args)
+
+    if n_workers == 1 or len(l_args) <= 1:
+        for i, args in enumerate(l_args):
+            l_results[i] = func(*args)
+            if callback is not None:
+                callback(i, l_results[i])
+        return l_results
+
+    with ProcessPoolExecutor(max_workers=min(n_workers, len(l_args))) as executor:
+        d_futures = {executor.submit(func, *args): i for i, args in enumerate(l_args)}
+        for future in as_completed(d_futures):
+            i = d_futures[future]
+            l_results[i] = future.result()
+            if callback is not None:
+                callback(i, l_results[i])
+
+    return l_results
+
+###################################################################
+
+
+###################################################################
+# 2 Share the columns of a DataFrame with the worker processes
+# Each column is copied once into a shared memory block, so that the workers can attach to it
+# instead of receiving a pickled copy of the whole DataFrame with every task. Non-numeric
+# columns (e.g. group_ids) are shared as integer codes plus the (small) array of their values.
+# Categorical columns keep their categories (in their order) and whether they are ordered.
+def share_dataframe(df):
+    l_shms, l_spec = [], []
+    for col in df.columns:
+        values = df[col].to_numpy()
+        ordered = None
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            values, categories, ordered = df[col].cat.codes.to_numpy(), df[col].cat.categories.to_numpy(), df[col].cat.ordered
+        elif values.dtype.kind in 'biuf':
+            categories = None
+        else:
+            values, categories = pd.factorize(df[col], sort=False, use_na_sentinel=True)
+            categories = np.append(np.asarray(categories, dtype=object), np.nan)
+        values = np.ascontiguousarray(values)
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+        l_shms.append(shm)
+        l_spec.append((col, shm.name, values.dtype.str, values.shape, categories, ordered))
+    return l_shms, l_spec
+
+
+def release_shared_dataframe(l_shms):
+    for shm in l_shms:
+        shm.close()
+        shm.unlink()
+
+
+# Worker side: rebuild the DataFrame from the shared memory blocks, restricted to l_cols.
+# The columns are copied into the memory of the worker, so that the shared blocks can be
+# closed again right away.
+def attach_dataframe(l_spec, l_cols=None):
+    d_columns = {}
+    for col, shm_name, dtype, shape, categories, ordered in l_spec:
+        if l_cols is not None and col not in l_cols:
+            continue
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf).copy()
+        finally:
+            shm.close()
+        if ordered is not None:
+            values = pd.Categorical.from_codes(values, categories=categories, ordered=ordered)
+        elif categories is not None:
+            # Missing values have the code -1, which points to the NaN appended to the categories
+            values = categories[values]
+        d_columns[col] = values
+    return pd.DataFrame(d_columns)
+
+###################################################################
+
+
+###################################################################
+# 3 Run many analyses of the same DataFrame in parallel
+def compute_stats_from_shared_dataframe(l_spec, test, d_column_roles, plan=None):
+    df = attach_dataframe(l_spec, list(d_column_roles.values()))
+    return compute_stats(df, test, plan, **d_column_roles)
+
+
+# Runs compute_stats(df, test, plan, **d_column_roles) for every dict in l_column_roles,
+# e.g. [{'data_col': 'speed', 'group_col': 'group_id'}, {'data_col': 'freezing', 'group_col': 'group_id'}]
+def compute_stats_parallel(df, test, l_column_roles, n_workers=None, plan=None):
+    if get_n_workers(n_workers) == 1 or len(l_column_roles) <= 1:
+        return [compute_stats(df, test, plan, **d_column_roles) for d_column_roles in l_column_roles]
+
+    # Positional column roles only hold for the complete DataFrame, so they are resolved
+    # before the workers only attach to the columns that they actually need
+    l_column_roles = [resolve_column_roles(df, test, **d_column_roles) for d_column_roles in l_column_roles]
+    l_shms, l_spec = share_dataframe(df)
+    try:
+        return run_in_process_pool(compute_stats_from_shared_dataframe,
+                                   [(l_spec, test, d_column_roles, plan) for d_column_roles in l_column_roles],
+                                   n_workers)
+    finally:
+        release_shared_dataframe(l_shms)
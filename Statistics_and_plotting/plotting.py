@@ -0,0 +1,509 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import itertools
+import numpy as np
+from dataclasses import dataclass, fields
+
+from .engine import get_cell_indices
+from .lazy_imports import lazy_import
+from .profiling import stage
+
+# matplotlib & seaborn are only imported when the first plot is created (see lazy_imports.py)
+plt = lazy_import('matplotlib.pyplot')
+sns = lazy_import('seaborn')
+mpl_text = lazy_import('matplotlib.text')
+
+###################################################################
+#Overview:
+
+    # 1 Customization values of the plot
+    # 2 Annotate stats within the plots
+    # 3 Create the plots
+    # 4 Update existing plots
+
+# Like engine.py, this module does not depend on ipywidgets: the widget
+# collects the customization values from its elements into a PlotSettings
+# object, while batch mode reads them from a saved analysis configuration.
+
+###################################################################
+
+
+###################################################################
+# 1 Customization values of the plot
+# Plot types that are available for each test, in the order of the widget´s dropdown menu
+PLOT_TYPES = {'independent_samples': ['stripplot', 'boxplot', 'boxplot with scatterplot overlay', 'violinplot'],
+              'one_sample': ['stripplot', 'boxplot', 'boxplot with scatterplot overlay', 'violinplot', 'histogram'],
+              'mixed_model_ANOVA': ['pointplot', 'boxplot', 'boxplot with scatterplot overlay', 'violinplot']}
+
+
+# Defaults correspond to the initial values of the widget elements.
+# Orders that are left at None fall back to the order in which groups / sessions appear in the data,
+# ylims that are left at None use automatic scaling of the y-axis.
+# Groups with more than max_points_per_group observations (at least 2, None: no limit) are drawn in large-n mode (see 3.1).
+@dataclass(frozen=True)
+class PlotSettings:
+    plot_type: int = 0
+    distance_stars_to_brackets: float = 0.5
+    distance_brackets_to_data: float = 0.1
+    fontsize_stars: float = 10
+    stars_bold: bool = False
+    brackets: bool = True
+    linewidth_annotations: float = 1.5
+    l_xlabel_order: tuple = None
+    l_hue_order: tuple = None
+    color_palette: object = 'colorblind'
+    fig_width: float = 28
+    fig_height: float = 16
+    marker_size: float = 5
+    show_legend: bool = True
+    axes_linewidth: float = 1
+    axes_color: str = '#000000'
+    axes_tick_size: float = 10
+    yaxis_label_text: str = 'data'
+    yaxis_label_fontsize: float = 12
+    yaxis_label_color: str = '#000000'
+    xaxis_label_text: str = 'group_IDs'
+    xaxis_label_fontsize: float = 12
+    xaxis_label_color: str = '#000000'
+    ylims: tuple = None
+    max_points_per_group: int = 5000
+    large_n_mode: str = 'subsample'
+
+    def __post_init__(self):
+        # The subsample of a large cell always keeps its minimum and maximum (see 3.1)
+        if self.max_points_per_group is not None and self.max_points_per_group < 2:
+            raise ValueError('max_points_per_group has to be at least 2 (or None to always draw all observations), '
+                             'not {}.'.format(self.max_points_per_group))
+
+
+# Helper function to resolve a plot type that is given by its name (e.g. in a saved configuration)
+def get_plot_type_index(test, plot_type):
+    if isinstance(plot_type, str):
+        if plot_type not in PLOT_TYPES[test]:
+            raise ValueError('Plot type "{}" is not available for {}. Please select one of: {}'.format(plot_type, test, ', '.join(PLOT_TYPES[test])))
+        return PLOT_TYPES[test].index(plot_type)
+    return plot_type
+
+
+# Helper function to get the x-axis & hue orders, using the order of the data if not specified
+def get_orders(results, settings):
+    if results.test == 'mixed_model_ANOVA':
+        l_xlabel_order = list(settings.l_xlabel_order or results.l_sessions)
+        l_hue_order = list(settings.l_hue_order or results.l_groups)
+    else:
+        l_xlabel_order = list(settings.l_xlabel_order or results.l_groups)
+        l_hue_order = list(settings.l_hue_order or results.l_groups)
+    return l_xlabel_order, l_hue_order
+
+
+# List all comparisons that can be annotated (corresponds to "Annotate all" in the widget).
+# With a comparison plan (see comparisons.py), only the pairs that were compared are listed.
+def get_all_stats_to_annotate(results):
+    if results.test == 'one_sample':
+        return [(results.l_groups[0], results.fixed_val_col)]
+    elif results.test == 'independent_samples':
+        return [(group1, group2) for group1, group2 in itertools.combinations(results.l_groups, 2)
+                if (None, frozenset([group1, group2])) in results.d_pvals]
+    else:
+        return [(group1, group2, session_id) for session_id in results.l_sessions
+                for group1, group2 in itertools.combinations(results.l_groups, 2)
+                if (session_id, frozenset([group1, group2])) in results.d_pvals]
+
+###################################################################
+
+
+###################################################################
+# 2 Functions to annotate the results of the statistical tests in the respective plots:
+# 2.1 Get the 'stars' string for the respective pairwise comparison from the index of the results (see engine.py):
+def get_stars_str(results, group1, group2, session_id=None):
+    key = (session_id, frozenset([group1, group2]))
+    if key not in results.d_pvals:
+        print('There was an error with annotating the stats!')
+        return ''
+    return results.d_pvals[key][1]
+
+
+# 2.2 Annotate the stats in the respective plots
+# 2.2.1 Annotate stats in independent sample plots:
+def annotate_stats_independent_samples(ax, df, results, settings, l_stats_to_annotate):
+    if len(l_stats_to_annotate) > 0:
+        l_xlabel_order, l_hue_order = get_orders(results, settings)
+        fontweight_stars = 'bold' if settings.stars_bold else 'normal'
+
+        max_total = df[results.data_col].max()
+        y_shift_annotation_line = max_total * settings.distance_brackets_to_data
+        brackets_height = y_shift_annotation_line*0.5*settings.brackets
+        y_shift_annotation_text = brackets_height + y_shift_annotation_line*0.5*settings.distance_stars_to_brackets
+
+        # Set initial y
+        y = max_total + y_shift_annotation_line
+
+        # Add check whether group level ANOVA / Kruska-Wallis-ANOVA is significant
+        for group1, group2 in l_stats_to_annotate:
+
+            x1 = l_xlabel_order.index(group1)
+            x2 = l_xlabel_order.index(group2)
+
+            stars = get_stars_str(results, group1, group2)
+
+            ax.plot([x1, x1, x2, x2], [y, y+brackets_height, y+brackets_height, y], c='k', lw=settings.linewidth_annotations)
+            ax.text((x1+x2)*.5, y+y_shift_annotation_text, stars, ha='center', va='bottom', color='k',
+                    fontsize=settings.fontsize_stars, fontweight=fontweight_stars)
+
+            # With set_distance_stars_to_brackets being limited to 5, stars will always be closer than next annotation line
+            y = y+3*y_shift_annotation_line
+
+
+# 2.2.2 Annotate stats in one-sample tests (scatter-, box-, and violinplots):
+def annotate_stats_one_sample(ax, df, results, settings, l_stats_to_annotate):
+    if len(l_stats_to_annotate) > 0:
+        fontweight_stars = 'bold' if settings.stars_bold else 'normal'
+
+        max_total = df[results.data_col].max()
+        y_shift_annotation_line = max_total * settings.distance_brackets_to_data
+        y_shift_annotation_text = y_shift_annotation_line*0.5*settings.distance_stars_to_brackets
+
+        # Set initial y
+        y = max_total + y_shift_annotation_line
+
+        # Add check whether group level ANOVA / Kruska-Wallis-ANOVA is significant
+        stars = get_stars_str(results, results.l_groups[0], results.fixed_val_col)
+
+        ax.text(0, y+y_shift_annotation_text, stars, ha='center', va='bottom', color='k',
+                fontsize=settings.fontsize_stars, fontweight=fontweight_stars)
+
+
+# 2.2.3 Annotate stats in Mixed-model ANOVA plots:
+# 2.2.3.1 Means of all group x session cells (rows: group_ids, columns: session_ids) and the maximum of the data.
+#         The means were already computed with the statistics (df_cell_stats), so redrawing does not touch the data again:
+def get_mma_cell_means(results):
+    l_maxima = [cell_data.max() for cell_data in results.d_cells.values() if cell_data.shape[0] > 0]
+    return results.df_cell_stats['mean'].unstack(), max(l_maxima, default=float('nan'))
+
+
+# 2.2.3.2 Layout of the annotations, shared by point- and violinplot: annotations are ordered by session_id and,
+#         within each session_id, by the absolute difference of the group means (smallest first). Returns
+#         (group1, group2, session_id, mean_group1, mean_group2, n_previous_annotations_in_this_session_id)
+#         for each annotation.
+def plan_mma_annotations(l_stats_to_annotate, l_sessions, df_means):
+    d_means = df_means.to_dict()
+    d_to_annotate_by_session = {session_id: [] for session_id in l_sessions}
+    for group1, group2, session_id in l_stats_to_annotate:
+        if session_id in d_to_annotate_by_session:
+            y1 = d_means.get(session_id, {}).get(group1, float('nan'))
+            y2 = d_means.get(session_id, {}).get(group2, float('nan'))
+            d_to_annotate_by_session[session_id].append((group1, group2, session_id, y1, y2))
+
+    l_to_annotate_ordered = []
+    for session_id in l_sessions:
+        l_temp = sorted(d_to_annotate_by_session[session_id], key=get_abs_mean_difference)
+        l_to_annotate_ordered.extend(elem + (n_previous,) for n_previous, elem in enumerate(l_temp))
+    return l_to_annotate_ordered
+
+
+# Helper function to sort the annotations by the absolute difference of the group means
+def get_abs_mean_difference(elem):
+    return abs(elem[3] - elem[4])
+
+
+# 2.2.3.3 Annotate stats in Mixed-model ANOVA point plot:
+def annotate_stats_mma_pointplot(ax, df, results, settings, l_stats_to_annotate):
+    if len(l_stats_to_annotate) > 0:
+        l_xlabel_order, l_hue_order = get_orders(results, settings)
+        fontweight_stars = 'bold' if settings.stars_bold else 'normal'
+        distance_brackets_to_data = settings.distance_brackets_to_data
+
+        df_means, max_total = get_mma_cell_means(results)
+        d_xlabel_positions = {session_id: i for i, session_id in enumerate(l_xlabel_order)}
+
+        brackets_height = distance_brackets_to_data*0.5*settings.brackets
+        x_shift_annotation_text = brackets_height + distance_brackets_to_data*0.5*settings.distance_stars_to_brackets
+
+        for group1, group2, session_id, y1, y2, n_previous_annotations_in_this_session_id in plan_mma_annotations(l_stats_to_annotate, results.l_sessions, df_means):
+            x_shift_annotation_line = distance_brackets_to_data + distance_brackets_to_data * n_previous_annotations_in_this_session_id * 1.5
+            x = d_xlabel_positions[session_id] + x_shift_annotation_line
+
+            stars = get_stars_str(results, group1, group2, session_id)
+
+            ax.plot([x, x+brackets_height, x+brackets_height, x], [y1, y1, y2, y2], color='k', lw=settings.linewidth_annotations)
+            ax.text(x+x_shift_annotation_text, (y1+y2)/2, stars, rotation=-90, ha='center', va='center',
+                    fontsize=settings.fontsize_stars, fontweight=fontweight_stars)
+
+
+# 2.2.3.4 Annotate stats in Mixed-model ANOVA violin plot:
+def annotate_stats_mma_violinplot(ax, df, results, settings, l_stats_to_annotate):
+    if len(l_stats_to_annotate) > 0:
+        l_xlabel_order, l_hue_order = get_orders(results, settings)
+        fontweight_stars = 'bold' if settings.stars_bold else 'normal'
+
+        df_means, max_total = get_mma_cell_means(results)
+        d_xlabel_positions = {session_id: i for i, session_id in enumerate(l_xlabel_order)}
+        d_hue_positions = {group_id: i for i, group_id in enumerate(l_hue_order)}
+
+        y_shift_annotation_line = max_total * settings.distance_brackets_to_data
+        brackets_height = y_shift_annotation_line*0.5*settings.brackets
+        y_shift_annotation_text = brackets_height + y_shift_annotation_line*0.5*settings.distance_stars_to_brackets
+
+        width = 0.8
+        for group1, group2, session_id, y1, y2, n_previous_annotations_in_this_session_id in plan_mma_annotations(l_stats_to_annotate, results.l_sessions, df_means):
+            y = max_total + y_shift_annotation_line + y_shift_annotation_line*n_previous_annotations_in_this_session_id*3
+
+            x_base = d_xlabel_positions[session_id] - width/2 + width/(2*len(l_hue_order))
+            x1 = x_base + width/len(l_hue_order)*d_hue_positions[group1]
+            x2 = x_base + width/len(l_hue_order)*d_hue_positions[group2]
+
+            stars = get_stars_str(results, group1, group2, session_id)
+
+            ax.plot([x1, x1, x2, x2], [y, y+brackets_height, y+brackets_height, y], color='k', lw=settings.linewidth_annotations)
+            ax.text((x1+x2)/2, y+y_shift_annotation_text, stars, ha='center', va='bottom',
+                    fontsize=settings.fontsize_stars, fontweight=fontweight_stars)
+
+###################################################################
+
+
+###################################################################
+# 3 Create the plots
+# 3.1 Data of the strip layer: one marker per observation gets slow to render and bloats the saved figure for large groups.
+#     If any group (x session) cell has more than max_points_per_group observations, the markers are rasterized and,
+#     with large_n_mode 'subsample', each of these cells is represented by a random subsample of (at most) max_points_per_group
+#     observations (with a fixed seed, so that refreshing the plot does not change it). Boxes, violins, and the
+#     annotated statistics are always based on the complete data. large_n_mode 'rasterize' keeps all observations.
+LARGE_N_MODES = ('subsample', 'rasterize')
+
+
+def get_strip_data(df, results, settings):
+    l_cell_cols = [results.group_col]
+    if results.test == 'mixed_model_ANOVA':
+        l_cell_cols.append(results.session_col)
+    d_cell_indices = get_cell_indices(df, l_cell_cols)
+    max_points = settings.max_points_per_group
+    if max_points is None or all(indices.shape[0] <= max_points for indices in d_cell_indices.values()):
+        return df, False
+    if settings.large_n_mode not in LARGE_N_MODES:
+        raise ValueError('Unknown large_n_mode "{}". Please select one of: {}'.format(settings.large_n_mode, ', '.join(LARGE_N_MODES)))
+    if settings.large_n_mode == 'rasterize':
+        return df, True
+
+    rng = np.random.default_rng(0)
+    values = df[results.data_col].to_numpy()
+    l_indices = [subsample_cell(rng, indices, values, max_points) if indices.shape[0] > max_points else indices
+                 for indices in d_cell_indices.values()]
+    return df.iloc[np.sort(np.concatenate(l_indices))], True
+
+
+# The minimum and maximum of each cell are always kept, so that the subsample covers the full range of the data.
+# Missing values are not drawn anyway and are skipped (e.g. a group without measurements in one session).
+def subsample_cell(rng, indices, values, max_points):
+    indices = indices[np.isfinite(values[indices])]
+    if indices.shape[0] <= max_points:
+        return indices
+    extremes = indices[[np.argmin(values[indices]), np.argmax(values[indices])]]
+    return np.union1d(rng.choice(indices, max_points - 2, replace=False), extremes)
+
+
+# 3.2 Draw the data:
+def plot_data(ax, df, results, settings):
+    data_col, group_col, session_col = results.data_col, results.group_col, results.session_col
+    l_xlabel_order, l_hue_order = get_orders(results, settings)
+    color_palette = settings.color_palette
+    df_strip, rasterize_strip = get_strip_data(df, results, settings)
+
+    if results.test == 'independent_samples':
+        if settings.plot_type == 0:
+            sns.stripplot(data=df_strip, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        elif settings.plot_type == 1:
+            sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, ax=ax)
+        elif settings.plot_type == 2:
+            sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, showfliers=False, ax=ax)
+            sns.stripplot(data=df_strip, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        elif settings.plot_type == 3:
+            sns.violinplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, cut=0, ax=ax)
+            sns.stripplot(data=df_strip, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        else:
+            print("Function not implemented. Please go and annoy Dennis to finally do it")
+
+    elif results.test == 'one_sample':
+        if settings.plot_type == 0:
+            sns.stripplot(data=df_strip, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        elif settings.plot_type == 1:
+            sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, ax=ax)
+        elif settings.plot_type == 2:
+            sns.boxplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, showfliers=False, ax=ax)
+            sns.stripplot(data=df_strip, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        elif settings.plot_type == 3:
+            sns.violinplot(data=df, x=group_col, y=data_col, order=l_xlabel_order, palette=color_palette, cut=0, ax=ax)
+            sns.stripplot(data=df_strip, x=group_col, y=data_col, color='k', order=l_xlabel_order, size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        else:
+            print("Function not implemented. Please go and annoy Dennis to finally do it")
+        if settings.plot_type in [0, 1, 2, 3]:
+            ax.hlines(y=results.fixed_value, xmin=-0.5, xmax=0.5, color='gray', linestyle='dashed')
+
+    elif results.test == 'mixed_model_ANOVA':
+        if settings.plot_type == 0:
+            sns.pointplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
+                          palette=color_palette, dodge=True, ci='sd', err_style='bars', capsize=0, ax=ax)
+        elif settings.plot_type == 1:
+            sns.boxplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
+                        palette=color_palette, ax=ax)
+        elif settings.plot_type == 2:
+            sns.boxplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
+                        palette=color_palette, showfliers=False, ax=ax)
+            sns.stripplot(data=df_strip, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
+                          dodge=True, color='k', size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        elif settings.plot_type == 3:
+            sns.violinplot(data=df, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
+                           width=0.8, cut=0, palette=color_palette, ax=ax)
+            sns.stripplot(data=df_strip, x=session_col, y=data_col, order=l_xlabel_order, hue=group_col, hue_order=l_hue_order,
+                          dodge=True, color='k', size=settings.marker_size, rasterized=rasterize_strip, ax=ax)
+        else:
+            print("Function not implemented. Please go and annoy Dennis to finally do it")
+
+        if settings.show_legend == True:
+            if settings.plot_type == 0:
+                ax.legend(loc='center left', bbox_to_anchor=(1, 0.5), frameon=False)
+            elif settings.plot_type in [1, 2, 3]:
+                handles, labels = ax.get_legend_handles_labels()
+                new_handles = handles[:len(l_hue_order)]
+                new_labels = labels[:len(l_hue_order)]
+                ax.legend(new_handles, new_labels, loc='center left', bbox_to_anchor=(1, 0.5), frameon=False)
+        elif ax.get_legend() is not None:
+            ax.get_legend().remove()
+
+    else:
+        print("Function not implemented. Please go and annoy Dennis to finally do it")
+
+
+# 3.3 Annotate the stats:
+def annotate_stats(ax, df, results, settings, l_stats_to_annotate):
+    if results.test == 'independent_samples':
+        annotate_stats_independent_samples(ax, df, results, settings, l_stats_to_annotate)
+
+    elif results.test == 'one_sample':
+        if settings.plot_type in [0, 1, 2, 3]:
+            annotate_stats_one_sample(ax, df, results, settings, l_stats_to_annotate)
+        else:
+            print("Function not implemented. Please go and annoy Dennis to finally do it")
+
+    elif results.test == 'mixed_model_ANOVA':
+        if settings.plot_type == 0:
+            annotate_stats_mma_pointplot(ax, df, results, settings, l_stats_to_annotate)
+        elif settings.plot_type in [1, 2, 3]:
+            annotate_stats_mma_violinplot(ax, df, results, settings, l_stats_to_annotate)
+        else:
+            print("Function not implemented. Please go and annoy Dennis to finally do it")
+
+
+# 3.4 Create the whole figure:
+def create_plot(df, results, settings, l_stats_to_annotate):
+    return PlotSession(df, results, settings, l_stats_to_annotate).fig
+
+###################################################################
+
+
+###################################################################
+# 4 Update existing plots
+# A PlotSession keeps the figure and its artists alive, so that changing a setting only redraws what depends on it:
+#   - data layer: seaborn re-renders the data (and everything else) only if one of DATA_LAYER_SETTINGS changed
+#   - annotation layer: the brackets & stars are redrawn if the selected comparisons or their spacing changed
+#   - everything else (fonts, colors, linewidths, labels, limits, figure size) updates the existing artists in place
+DATA_LAYER_SETTINGS = {'plot_type', 'l_xlabel_order', 'l_hue_order', 'color_palette', 'marker_size', 'show_legend',
+                       'max_points_per_group', 'large_n_mode'}
+ANNOTATION_LAYER_SETTINGS = {'distance_stars_to_brackets', 'distance_brackets_to_data', 'brackets'}
+ANNOTATION_STYLE_SETTINGS = {'fontsize_stars', 'stars_bold', 'linewidth_annotations'}
+
+
+class PlotSession:
+
+    def __init__(self, df, results, settings, l_stats_to_annotate):
+        self.df = df
+        self.results = results
+        with stage('create_plot'):
+            self.fig = plt.figure(figsize=(settings.fig_width/2.54, settings.fig_height/2.54), facecolor='white')
+            self.draw(settings, l_stats_to_annotate)
+
+    # 4.1 Draw all layers from scratch (re-using the figure):
+    def draw(self, settings, l_stats_to_annotate):
+        self.fig.clear()
+        self.ax = self.fig.add_subplot()
+        for axis in ['top', 'right']:
+            self.ax.spines[axis].set_visible(False)
+
+        with stage('plot_data'):
+            plot_data(self.ax, self.df, self.results, settings)
+        # Extent of the data layer, to which the axes return whenever the annotations are redrawn
+        self.data_lim = self.ax.dataLim.frozen()
+        self.autoscale_y = self.ax.get_autoscaley_on()
+        self.l_annotation_artists = []
+
+        self.draw_annotations(settings, l_stats_to_annotate)
+        self.apply_style(settings)
+        self.settings = settings
+
+    # 4.2 Replace only the brackets & stars:
+    def draw_annotations(self, settings, l_stats_to_annotate):
+        for artist in self.l_annotation_artists:
+            artist.remove()
+        # Bbox.set shares the points of the other Bbox, so the extent of the data layer is set via a copy
+        self.ax.dataLim.set(self.data_lim.frozen())
+        self.ax.set_autoscaley_on(self.autoscale_y)
+
+        set_previous_artists = set(self.ax.lines) | set(self.ax.texts)
+        with stage('annotate_stats'):
+            annotate_stats(self.ax, self.df, self.results, settings, l_stats_to_annotate)
+        self.l_annotation_artists = [artist for artist in self.ax.lines + self.ax.texts if artist not in set_previous_artists]
+        self.l_stats_to_annotate = list(l_stats_to_annotate)
+
+    # 4.3 Update the style of the existing brackets & stars:
+    def restyle_annotations(self, settings):
+        for artist in self.l_annotation_artists:
+            if isinstance(artist, mpl_text.Text):
+                artist.set_fontsize(settings.fontsize_stars)
+                artist.set_fontweight('bold' if settings.stars_bold else 'normal')
+            else:
+                artist.set_linewidth(settings.linewidth_annotations)
+
+    # 4.4 Update axes, labels, limits, and figure size in place:
+    def apply_style(self, settings):
+        with stage('apply_style'):
+            ax = self.ax
+            self.fig.set_size_inches(settings.fig_width/2.54, settings.fig_height/2.54)
+
+            for axis in ['bottom','left']:
+                ax.spines[axis].set_linewidth(settings.axes_linewidth)
+                ax.spines[axis].set_color(settings.axes_color)
+
+            ax.tick_params(labelsize=settings.axes_tick_size, colors=settings.axes_color)
+
+            ax.set_ylabel(settings.yaxis_label_text, fontsize=settings.yaxis_label_fontsize, color=settings.yaxis_label_color)
+            ax.set_xlabel(settings.xaxis_label_text, fontsize=settings.xaxis_label_fontsize, color=settings.xaxis_label_color)
+
+            if settings.ylims is not None:
+                ax.set_ylim(*settings.ylims)
+            else:
+                # Automatic scaling, which also has to be restored after manual limits had been set
+                ax.set_autoscaley_on(self.autoscale_y)
+                ax.autoscale_view(scalex=False)
+
+            # The result of tight_layout depends on the current position of the axes, so it always starts from the default position
+            self.fig.subplots_adjust(**{key: plt.rcParams['figure.subplot.' + key] for key in ['left', 'right', 'bottom', 'top', 'wspace', 'hspace']})
+            self.fig.tight_layout()
+
+    # 4.5 Apply new settings and / or comparisons to annotate and return the (same) figure:
+    def update(self, settings, l_stats_to_annotate):
+        with stage('update_plot'):
+            set_changed = {elem.name for elem in fields(PlotSettings) if getattr(settings, elem.name) != getattr(self.settings, elem.name)}
+            if len(set_changed) == 0 and list(l_stats_to_annotate) == self.l_stats_to_annotate:
+                return self.fig
+            if len(set_changed & DATA_LAYER_SETTINGS) > 0:
+                self.draw(settings, l_stats_to_annotate)
+                return self.fig
+
+            if len(set_changed & ANNOTATION_LAYER_SETTINGS) > 0 or list(l_stats_to_annotate) != self.l_stats_to_annotate:
+                self.draw_annotations(settings, l_stats_to_annotate)
+            elif len(set_changed & ANNOTATION_STYLE_SETTINGS) > 0:
+                self.restyle_annotations(settings)
+            self.apply_style(settings)
+            self.settings = settings
+            return self.fig
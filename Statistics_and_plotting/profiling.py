@@ -0,0 +1,197 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+###################################################################
+#Overview:
+
+    # 1 Timing report of one analysis
+    # 2 Record stages
+    # 3 Output of the report
+
+# The stats, plot and download flows are divided into stages (e.g. reading the
+# file, normality tests, mixed_anova, pairwise_tests, rendering, annotation,
+# writing the .xlsx). Stages are only recorded within a profiling() block, e.g.:
+#
+#   with profiling('my analysis', cprofile=True, memory=True) as profile:
+#       results = compute_stats(df, 'mixed_model_ANOVA')
+#   print(format_report(profile.get_report()))
+#
+# Outside of such a block, stage() does nothing but a single lookup. The active
+# profile is stored in a context variable, so that several analyses (e.g. in
+# threads or asyncio tasks) can be profiled at the same time without mixing up
+# their reports. Work that is handed over to another thread has to be run in a
+# copy of the context (contextvars.copy_context().run) to be recorded.
+
+###################################################################
+
+
+###################################################################
+# 1 Timing report of one analysis
+current_profile = ContextVar('current_profile', default=None)
+# Names of the enclosing stages, e.g. ('compute_stats', 'mixed_anova')
+current_stages = ContextVar('current_stages', default=())
+
+
+class Profile:
+
+    def __init__(self, name, cprofile=False, memory=False):
+        self.name = name
+        self.l_records = []
+        self.cprofiler = cProfile.Profile() if cprofile else None
+        self.memory = memory
+        self.duration = None
+
+    # Records are added when their stage starts and completed when it ends, so that they are in the order of
+    # their start (the enclosing stage before the nested ones)
+    def add_record(self, l_stages):
+        d_record = {'stage': '/'.join(l_stages), 'depth': len(l_stages) - 1, 'duration': None, 'memory_peak': None}
+        self.l_records.append(d_record)
+        return d_record
+
+    # Stages that ran several times (e.g. the annotations of every refresh) are summed up, in the order of
+    # their first occurrence. memory_peak: largest increase of the traced memory within the stage (in bytes).
+    # Stages that are still running are not included.
+    def get_report(self, n_functions=25):
+        d_stages = {}
+        for d_record in self.l_records:
+            if d_record['duration'] is None:
+                continue
+            if d_record['stage'] not in d_stages:
+                d_stages[d_record['stage']] = {'stage': d_record['stage'], 'depth': d_record['depth'], 'calls': 0,
+                                               'duration': 0.0, 'memory_peak': None}
+            d_stage = d_stages[d_record['stage']]
+            d_stage['calls'] += 1
+            d_stage['duration'] += d_record['duration']
+            if d_record['memory_peak'] is not None:
+                d_stage['memory_peak'] = max(d_stage['memory_peak'] or 0, d_record['memory_peak'])
+        d_report = {'name': self.name, 'duration': self.duration, 'stages': list(d_stages.values())}
+        if self.cprofiler is not None:
+            d_report['functions'] = get_cprofile_functions(self.cprofiler, n_functions)
+        return d_report
+
+
+# Functions with the highest cumulative time, from the statistics of cProfile
+def get_cprofile_functions(cprofiler, n_functions):
+    stats = pstats.Stats(cprofiler, stream=io.StringIO())
+    l_functions = []
+    for (filename, line, function), (cc, ncalls, tottime, cumtime, callers) in stats.stats.items():
+        l_functions.append({'function': '{}:{}({})'.format(filename, line, function), 'calls': ncalls,
+                            'own_time': tottime, 'cumulative_time': cumtime})
+    return sorted(l_functions, key=lambda d_function: d_function['cumulative_time'], reverse=True)[:n_functions]
+
+###################################################################
+
+
+###################################################################
+# 2 Record stages
+# 2.1 Profile everything within the block. cprofile: additionally record the time spent in each function
+#     (only of the thread that runs the outermost stage); memory: record the memory peak of each stage
+#     with tracemalloc (which slows down the analysis considerably).
+@contextmanager
+def profiling(name='analysis', cprofile=False, memory=False):
+    profile = Profile(name, cprofile, memory)
+    profile_token, stages_token = current_profile.set(profile), current_stages.set(())
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.duration = time.perf_counter() - start
+        if started_tracing:
+            tracemalloc.stop()
+        current_profile.reset(profile_token)
+        current_stages.reset(stages_token)
+
+
+# 2.2 Record the duration (and memory peak) of one stage. Stages can be nested.
+@contextmanager
+def stage(name):
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    l_stages = current_stages.get() + (name, )
+    token = current_stages.set(l_stages)
+    outermost = len(l_stages) == 1
+    if profile.cprofiler is not None and outermost:
+        profile.cprofiler.enable()
+    d_record = profile.add_record(l_stages)
+    memory_frame = start_memory_frame() if profile.memory else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        d_record['memory_peak'] = end_memory_frame(memory_frame) if memory_frame is not None else None
+        if profile.cprofiler is not None and outermost:
+            profile.cprofiler.disable()
+        current_stages.reset(token)
+        d_record['duration'] = duration
+
+
+# 2.3 tracemalloc only knows one peak, which is reset at the start of every stage. The peaks of the enclosing
+#     stages are therefore carried along in a stack of frames [memory at the start, highest peak so far].
+memory_frames = ContextVar('memory_frames', default=())
+
+
+def start_memory_frame():
+    current, peak = tracemalloc.get_traced_memory()
+    l_frames = memory_frames.get()
+    if len(l_frames) > 0:
+        l_frames[-1][1] = max(l_frames[-1][1], peak)
+    tracemalloc.reset_peak()
+    frame = [current, current]
+    memory_frames.set(l_frames + (frame, ))
+    return frame
+
+
+def end_memory_frame(frame):
+    peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+    l_frames = memory_frames.get()[:-1]
+    memory_frames.set(l_frames)
+    tracemalloc.reset_peak()
+    if len(l_frames) > 0:
+        l_frames[-1][1] = max(l_frames[-1][1], peak)
+    return peak - frame[0]
+
+###################################################################
+
+
+###################################################################
+# 3 Output of the report
+# 3.1 Human-readable table, e.g. for the widget:
+def format_report(d_report):
+    l_lines = ['Timing report: {} ({:.3f} s in total)'.format(d_report['name'], d_report['duration'] or 0.0)]
+    for d_stage in d_report['stages']:
+        line = '{:<50} {:>4}x {:>9.3f} s'.format('  ' * d_stage['depth'] + d_stage['stage'].split('/')[-1],
+                                                 d_stage['calls'], d_stage['duration'])
+        if d_stage['memory_peak'] is not None:
+            line += ' {:>10.1f} MB'.format(d_stage['memory_peak'] / 1e6)
+        l_lines.append(line)
+    if 'functions' in d_report:
+        l_lines.append('')
+        l_lines.append('{:>10} {:>10} {:>10}  function'.format('calls', 'own [s]', 'cum. [s]'))
+        for d_function in d_report['functions']:
+            l_lines.append('{:>10} {:>10.3f} {:>10.3f}  {}'.format(d_function['calls'], d_function['own_time'],
+                                                                   d_function['cumulative_time'], d_function['function']))
+    return '\n'.join(l_lines)
+
+
+# 3.2 JSON, e.g. for batch mode:
+def write_report(d_report, path):
+    with open(path, 'w') as report_file:
+        json.dump(d_report, report_file, indent=1)
+    return path
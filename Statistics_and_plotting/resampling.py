@@ -0,0 +1,299 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import itertools
+import numpy as np
+import pandas as pd
+
+from .correction import correct_pvals
+from .parallel import run_in_process_pool
+
+###################################################################
+#Overview:
+
+    # 1 Generate resamples in chunks
+    # 2 Test statistics, vectorized across resamples
+    # 3 Run many resampling jobs (optionally in parallel)
+    # 4 Permutation tests & bootstrap confidence intervals
+
+# Distribution-free alternatives to the tests in engine.py, which make no
+# assumption about normality or equal variances. All resamples of a chunk are
+# drawn at once as an index matrix (one row per resample), so the statistics
+# are computed with a few NumPy operations instead of a Python loop. Every job
+# and every chunk gets its own child of np.random.SeedSequence(seed), so that a
+# given seed yields the same results for any number of worker processes.
+#
+#   from Statistics_and_plotting.resampling import permutation_test_pairwise
+#   df_permutation = permutation_test_pairwise(results, n_resamples=10000, seed=42)
+
+###################################################################
+
+
+###################################################################
+# 1 Generate resamples in chunks
+# Chunks are sized such that the resampled data of one chunk have at most MAX_CHUNK_ELEMENTS values (~32 MB)
+MAX_CHUNK_ELEMENTS = 2**22
+
+
+def get_chunksize(n_values, chunksize=None):
+    if chunksize is None:
+        chunksize = max(1, MAX_CHUNK_ELEMENTS // max(n_values, 1))
+    return chunksize
+
+
+def get_chunk_sizes(n_resamples, chunksize):
+    n_chunks, remainder = divmod(n_resamples, chunksize)
+    return [chunksize] * n_chunks + ([remainder] if remainder > 0 else [])
+
+
+# One random permutation of range(n) per row:
+def get_permutation_indices(rng, n_resamples, n):
+    return np.argsort(rng.random((n_resamples, n)), axis=1)
+
+
+# n random draws with replacement from range(n) per row:
+def get_bootstrap_indices(rng, n_resamples, n):
+    return rng.integers(0, n, size=(n_resamples, n))
+
+###################################################################
+
+
+###################################################################
+# 2 Test statistics, vectorized across resamples (one resample per row)
+# 2.1 Mean difference & Hedges´ g of two independent samples:
+def get_hedges_g(x, y):
+    nx, ny = x.shape[-1], y.shape[-1]
+    pooled_var = ((nx - 1) * x.var(axis=-1, ddof=1) + (ny - 1) * y.var(axis=-1, ddof=1)) / (nx + ny - 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cohen_d = (x.mean(axis=-1) - y.mean(axis=-1)) / np.sqrt(pooled_var)
+    return cohen_d * (1 - 3 / (4 * (nx + ny) - 9))
+
+
+# 2.2 F statistic of a one-way ANOVA. The group labels stay fixed, while the rows of values are permuted:
+#     group sums are one matrix product with the one-hot encoded labels.
+def get_f_statistic(values, one_hot):
+    n_obs, n_groups = one_hot.shape
+    counts = one_hot.sum(axis=0)
+    group_sums = values @ one_hot
+    grand_mean = values.mean(axis=-1, keepdims=True)
+    ss_between = np.sum(counts * (group_sums / counts - grand_mean)**2, axis=-1)
+    ss_within = np.sum(values**2, axis=-1) - np.sum(group_sums**2 / counts, axis=-1)
+    return (ss_between / (n_groups - 1)) / (ss_within / (n_obs - n_groups))
+
+
+# 2.3 F statistic of the within-subject factor (session) of a mixed-model ANOVA for a (..., subjects, sessions)
+#     array of balanced data, using the within-subject error term (like pingouin.mixed_anova without sphericity correction).
+def get_within_f_statistic(values, one_hot):
+    n_subjects, n_sessions = values.shape[-2:]
+    n_groups = one_hot.shape[1]
+    counts = one_hot.sum(axis=0)
+    subject_means = values.mean(axis=-1, keepdims=True)
+    grand_mean = values.mean(axis=(-2, -1), keepdims=True)
+    session_means = values.mean(axis=-2, keepdims=True)
+    # (..., groups, sessions) means of each group x session cell
+    cell_means = np.einsum('...ns,ng->...gs', values, one_hot) / counts[:, None]
+    group_means = cell_means.mean(axis=-1, keepdims=True)
+
+    ss_session = n_subjects * np.sum((session_means - grand_mean)**2, axis=(-2, -1))
+    ss_interaction = np.sum(counts[:, None] * (cell_means - group_means - session_means + grand_mean)**2, axis=(-2, -1))
+    ss_within_subjects = np.sum((values - subject_means)**2, axis=(-2, -1))
+    ss_error = ss_within_subjects - ss_session - ss_interaction
+    df_error = (n_subjects - n_groups) * (n_sessions - 1)
+    return (ss_session / (n_sessions - 1)) / (ss_error / df_error)
+
+###################################################################
+
+
+###################################################################
+# 3 Run many resampling jobs (optionally in parallel)
+# 3.1 Functions that compute the statistics of n_resamples resamples of one chunk (in the current or in a worker process):
+def permute_mean_difference(seed_seq, n_resamples, x, y):
+    rng = np.random.default_rng(seed_seq)
+    pooled = np.concatenate([x, y])
+    sums_x = pooled[get_permutation_indices(rng, n_resamples, pooled.shape[0])[:, :x.shape[0]]].sum(axis=1)
+    return sums_x / x.shape[0] - (pooled.sum() - sums_x) / y.shape[0]
+
+
+# Under the null hypothesis of a one-sample test, the differences to the fixed value are symmetric around 0
+def flip_signs_mean(seed_seq, n_resamples, differences):
+    rng = np.random.default_rng(seed_seq)
+    signs = rng.integers(0, 2, size=(n_resamples, differences.shape[0])) * 2 - 1
+    return (signs * differences).mean(axis=1)
+
+
+def bootstrap_effect_sizes(seed_seq, n_resamples, x, y):
+    rng = np.random.default_rng(seed_seq)
+    x_resampled = x[get_bootstrap_indices(rng, n_resamples, x.shape[0])]
+    if y is None:
+        return np.column_stack([x_resampled.mean(axis=1), np.full(n_resamples, np.nan)])
+    y_resampled = y[get_bootstrap_indices(rng, n_resamples, y.shape[0])]
+    return np.column_stack([x_resampled.mean(axis=1) - y_resampled.mean(axis=1), get_hedges_g(x_resampled, y_resampled)])
+
+
+def permute_f_statistic(seed_seq, n_resamples, values, one_hot):
+    rng = np.random.default_rng(seed_seq)
+    return get_f_statistic(values[get_permutation_indices(rng, n_resamples, values.shape[0])], one_hot)
+
+
+# Sessions are permuted within each subject (null hypothesis: no effect of the session)
+def permute_within_f_statistic(seed_seq, n_resamples, values, one_hot):
+    rng = np.random.default_rng(seed_seq)
+    n_subjects, n_sessions = values.shape
+    indices = np.argsort(rng.random((n_resamples, n_subjects, n_sessions)), axis=2)
+    return get_within_f_statistic(np.take_along_axis(values[None, :, :], indices, axis=2), one_hot)
+
+
+# 3.2 Run all jobs, each a tuple of (function, arguments, number of values per resample), split into chunks.
+#     Returns one array with the statistics of all n_resamples resamples per job.
+def run_resampling_jobs(l_jobs, n_resamples, seed=None, chunksize=None, n_workers=1):
+    l_job_seeds = np.random.SeedSequence(seed).spawn(len(l_jobs))
+    l_tasks, l_task_jobs = [], []
+    for i, (func, args, n_values) in enumerate(l_jobs):
+        l_chunk_sizes = get_chunk_sizes(n_resamples, get_chunksize(n_values, chunksize))
+        for seed_seq, size in zip(l_job_seeds[i].spawn(len(l_chunk_sizes)), l_chunk_sizes):
+            l_tasks.append((func, seed_seq, size) + tuple(args))
+            l_task_jobs.append(i)
+
+    l_chunk_results = run_in_process_pool(run_chunk, [(task, ) for task in l_tasks], n_workers)
+
+    l_results = [[] for _ in l_jobs]
+    for i, chunk_results in zip(l_task_jobs, l_chunk_results):
+        l_results[i].append(chunk_results)
+    return [np.concatenate(l_job_results) for l_job_results in l_results]
+
+
+def run_chunk(task):
+    func, args = task[0], task[1:]
+    return func(*args)
+
+
+# 3.3 p-value of a permutation test: proportion of resamples with a statistic at least as extreme as the
+#     observed one, counting the observed data as one of the resamples (so that p is never 0)
+def get_permutation_pval(observed, resampled, alternative='two-sided'):
+    # Tolerance for statistics that are identical to the observed one but differ due to floating point errors
+    tolerance = 1e-12 * max(abs(observed), 1)
+    if alternative == 'two-sided':
+        n_extreme = np.sum(np.abs(resampled) >= abs(observed) - tolerance)
+    else:
+        n_extreme = np.sum(resampled >= observed - tolerance)
+    return (n_extreme + 1) / (resampled.shape[0] + 1)
+
+###################################################################
+
+
+###################################################################
+# 4 Permutation tests & bootstrap confidence intervals
+# 4.1 All pairwise comparisons of a StatsResults object (only the planned ones if a comparison plan was used,
+#     see comparisons.py) as (label, x, y) with y=None for one-sample tests.
+#     Labels are (A, B) or, for mixed-model ANOVAs, (session_id, A, B) with the groups compared within each session.
+def get_pairs(results):
+    if results.test == 'one_sample':
+        x = np.asarray(results.d_cells[results.l_groups[0]], dtype=float)
+        return [((results.l_groups[0], results.fixed_val_col), x - results.fixed_value, None)]
+    elif results.test == 'independent_samples':
+        return [((group1, group2), get_cell(results, group1), get_cell(results, group2))
+                for group1, group2 in itertools.combinations(results.l_groups, 2)
+                if (None, frozenset([group1, group2])) in results.d_pvals]
+    else:
+        return [((session_id, group1, group2), get_cell(results, (group1, session_id)), get_cell(results, (group2, session_id)))
+                for session_id in results.l_sessions for group1, group2 in itertools.combinations(results.l_groups, 2)
+                if (session_id, frozenset([group1, group2])) in results.d_pvals]
+
+
+# Missing values are not resampled
+def get_cell(results, key):
+    cell_data = np.asarray(results.d_cells[key], dtype=float)
+    return cell_data[~np.isnan(cell_data)]
+
+
+def get_pair_columns(results):
+    if results.test == 'mixed_model_ANOVA':
+        return [results.session_col, 'A', 'B']
+    return ['A', 'B']
+
+
+# 4.2 Permutation tests of all pairwise comparisons (difference of the means; for one-sample tests:
+#     sign-flip test of the mean difference to the fixed value). p-values are Holm-corrected like the pairwise
+#     comparisons of the engine (for mixed-model ANOVAs across the comparisons of all sessions, like the interaction
+#     block of comparisons.planned_pairwise_tests_mixed).
+def permutation_test_pairwise(results, n_resamples=10000, seed=None, chunksize=None, n_workers=1):
+    l_pairs = get_pairs(results)
+    l_jobs = []
+    for label, x, y in l_pairs:
+        if y is None:
+            l_jobs.append((flip_signs_mean, (x, ), x.shape[0]))
+        else:
+            l_jobs.append((permute_mean_difference, (x, y), x.shape[0] + y.shape[0]))
+    l_resampled = run_resampling_jobs(l_jobs, n_resamples, seed, chunksize, n_workers)
+
+    l_rows = []
+    for (label, x, y), resampled in zip(l_pairs, l_resampled):
+        observed = x.mean() if y is None else x.mean() - y.mean()
+        l_rows.append(list(label) + [observed, get_permutation_pval(observed, resampled)])
+    df_permutation = pd.DataFrame(l_rows, columns=get_pair_columns(results) + ['mean(A)-mean(B)', 'p-perm'])
+
+    df_permutation['p-perm-corr'] = correct_pvals(df_permutation['p-perm'], method='holm')
+    df_permutation['p-adjust'] = 'holm'
+    df_permutation['n_resamples'] = n_resamples
+    return df_permutation
+
+
+# 4.3 Percentile bootstrap confidence intervals of the mean difference and of Hedges´ g for all pairwise comparisons
+#     (for one-sample tests: of the mean difference to the fixed value).
+def bootstrap_ci_pairwise(results, n_resamples=10000, confidence=0.95, seed=None, chunksize=None, n_workers=1):
+    l_pairs = get_pairs(results)
+    l_jobs = [(bootstrap_effect_sizes, (x, y), x.shape[0] + (0 if y is None else y.shape[0])) for label, x, y in l_pairs]
+    l_resampled = run_resampling_jobs(l_jobs, n_resamples, seed, chunksize, n_workers)
+
+    quantiles = [(1 - confidence) / 2, 1 - (1 - confidence) / 2]
+    ci_label = 'CI{}%'.format(round(confidence * 100))
+    l_rows = []
+    for (label, x, y), resampled in zip(l_pairs, l_resampled):
+        if y is None:
+            observed = [x.mean(), np.nan]
+        else:
+            observed = [x.mean() - y.mean(), get_hedges_g(x, y)]
+        # Resamples without variance (e.g. all values identical) have no defined Hedges´ g
+        ci_difference = np.quantile(resampled[:, 0], quantiles)
+        ci_hedges = np.nanquantile(resampled[:, 1], quantiles) if y is not None else [np.nan, np.nan]
+        l_rows.append(list(label) + [observed[0], ci_difference[0], ci_difference[1], observed[1], ci_hedges[0], ci_hedges[1]])
+    return pd.DataFrame(l_rows, columns=get_pair_columns(results) + ['mean(A)-mean(B)', ci_label + ' low', ci_label + ' high',
+                                                                     'hedges', 'hedges ' + ci_label + ' low', 'hedges ' + ci_label + ' high'])
+
+
+# 4.4 Permutation test of the group-level statistic: the F statistic of a one-way ANOVA across all groups for
+#     independent samples; for mixed-model ANOVAs, the between-subject factor (group_id, subjects are permuted
+#     between groups) and the within-subject factor (session_id, sessions are permuted within each subject).
+#     The latter requires balanced data (every subject in every session), which are taken from df.
+#     There is no exact permutation scheme for the interaction, which is therefore not tested.
+def permutation_test_group_level(df, results, n_resamples=10000, seed=None, chunksize=None, n_workers=1):
+    if results.test == 'one_sample':
+        raise ValueError('There is no group-level statistic for one-sample tests. Please use permutation_test_pairwise instead.')
+
+    if results.test == 'independent_samples':
+        values = np.concatenate([get_cell(results, group_id) for group_id in results.l_groups])
+        codes = np.repeat(np.arange(len(results.l_groups)), [get_cell(results, group_id).shape[0] for group_id in results.l_groups])
+        one_hot = np.eye(len(results.l_groups))[codes]
+        l_sources = [('group_id', get_f_statistic(values, one_hot), (permute_f_statistic, (values, one_hot), values.shape[0]))]
+    else:
+        df_wide = df.pivot_table(index=results.subject_col, columns=results.session_col, values=results.data_col, observed=True)
+        df_wide = df_wide[list(results.l_sessions)]
+        if df_wide.isna().any().any():
+            raise ValueError('The permutation test of a mixed-model ANOVA requires data of every subject in every session.')
+        df_groups = df.groupby(results.subject_col, observed=True)[results.group_col].first()
+        codes = pd.Categorical(df_groups.loc[df_wide.index], categories=list(results.l_groups)).codes
+        one_hot = np.eye(len(results.l_groups))[codes]
+        values = df_wide.to_numpy(dtype=float)
+        subject_means = values.mean(axis=1)
+        l_sources = [(results.group_col, get_f_statistic(subject_means, one_hot),
+                      (permute_f_statistic, (subject_means, one_hot), subject_means.shape[0])),
+                     (results.session_col, get_within_f_statistic(values, one_hot),
+                      (permute_within_f_statistic, (values, one_hot), values.size))]
+
+    l_resampled = run_resampling_jobs([job for source, observed, job in l_sources], n_resamples, seed, chunksize, n_workers)
+    return pd.DataFrame({'Source': [source for source, observed, job in l_sources],
+                         'F': [observed for source, observed, job in l_sources],
+                         'p-perm': [get_permutation_pval(observed, resampled, alternative='greater')
+                                    for (source, observed, job), resampled in zip(l_sources, l_resampled)],
+                         'n_resamples': n_resamples})
@@ -0,0 +1,196 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import numpy as np
+import pandas as pd
+
+from .engine import get_cell_indices, get_cell_stats_for_download
+from .ingestion import get_columns_to_load, get_source_opener
+
+###################################################################
+#Overview:
+
+    # 1 Running summaries of the data of one group (x session) cell
+    # 2 Read the columns of the selected test in chunks
+    # 3 Descriptive statistics of files that do not fit into memory
+
+# For very long recordings, the descriptive statistics of each cell (n, mean,
+# median, standard deviation & standard error) are computed chunk by chunk,
+# without ever loading the complete file. Means and variances are exact
+# (Welford / Chan et al.), the median is estimated from a quantile sketch that
+# is exact as long as a cell holds no more than max_centroids values.
+# The Shapiro-Wilk test needs all values at once and is therefore not available.
+
+###################################################################
+
+
+###################################################################
+# 1 Running summaries of the data of one group (x session) cell
+DEFAULT_CHUNKSIZE = 100000
+DEFAULT_MAX_CENTROIDS = 10000
+
+
+# 1.1 Quantile sketch: the values are kept as sorted centroids (value & weight). Whenever there are more
+#     than max_centroids, neighbouring centroids are merged pairwise into their weighted mean, so that the
+#     rank of any value is off by at most half of the largest weight (i.e. n / max_centroids).
+class QuantileSketch:
+
+    def __init__(self, max_centroids=DEFAULT_MAX_CENTROIDS):
+        self.max_centroids = max_centroids
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+
+    def add(self, values, weights=None):
+        if weights is None:
+            weights = np.ones(values.shape[0])
+        values = np.concatenate([self.values, values])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(values, kind='stable')
+        self.values, self.weights = values[order], weights[order]
+        while self.values.shape[0] > self.max_centroids:
+            self.compress()
+
+    def compress(self):
+        n_pairs = self.values.shape[0] // 2
+        first, second = slice(0, 2 * n_pairs, 2), slice(1, 2 * n_pairs, 2)
+        weights = self.weights[first] + self.weights[second]
+        values = (self.values[first] * self.weights[first] + self.values[second] * self.weights[second]) / weights
+        # With an odd number of centroids, the largest one is kept as it is
+        self.values = np.append(values, self.values[2 * n_pairs:])
+        self.weights = np.append(weights, self.weights[2 * n_pairs:])
+
+    def merge(self, other):
+        self.add(other.values, other.weights)
+
+    # Each centroid sits in the middle of the ranks that it covers. For unmerged centroids (weight 1),
+    # this gives the same result as np.quantile / np.median.
+    def quantile(self, q):
+        if self.values.shape[0] == 0:
+            return np.nan
+        positions = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(q * self.weights.sum(), positions, self.values)
+
+
+# 1.2 Count, mean, and sum of squared deviations (M2) of one cell. Chunks are combined with the
+#     parallel variant of Welford´s algorithm, which avoids the cancellation of sum(x**2) - n * mean**2.
+class CellSummary:
+
+    def __init__(self, max_centroids=DEFAULT_MAX_CENTROIDS):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.sketch = QuantileSketch(max_centroids)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        # Missing values are skipped
+        values = values[~np.isnan(values)]
+        if values.shape[0] == 0:
+            return
+        chunk_mean = values.mean()
+        self.combine(values.shape[0], chunk_mean, np.sum((values - chunk_mean)**2))
+        self.sketch.add(values)
+
+    def combine(self, n, mean, m2):
+        n_total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / n_total
+        self.m2 = self.m2 + m2 + delta**2 * self.n * n / n_total
+        self.n = n_total
+
+    def merge(self, other):
+        if other.n > 0:
+            self.combine(other.n, other.mean, other.m2)
+            self.sketch.merge(other.sketch)
+
+    # Population standard deviation (ddof=0), like the descriptive statistics of the engine
+    def get_std(self):
+        return np.sqrt(self.m2 / self.n) if self.n > 0 else np.nan
+
+###################################################################
+
+
+###################################################################
+# 2 Read the columns of the selected test in chunks
+# Yields DataFrames with (at most) chunksize rows. .csv files are parsed chunk by chunk, Parquet files
+# row group by row group, and Feather files record batch by record batch (memory-mapped).
+# .xlsx files can only be read as a whole.
+def iter_chunks(open_source, file_format, index_name, l_cols, d_dtypes, chunksize=DEFAULT_CHUNKSIZE):
+    if file_format == 'csv':
+        with pd.read_csv(open_source(), usecols=[index_name] + l_cols, index_col=0, dtype=d_dtypes, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk[l_cols]
+    elif file_format == 'parquet':
+        import pyarrow.parquet
+        parquet_file = pyarrow.parquet.ParquetFile(open_source())
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=l_cols):
+            yield batch.to_pandas().astype(d_dtypes)
+    elif file_format == 'feather':
+        import pyarrow
+        source = open_source()
+        if isinstance(source, str):
+            source = pyarrow.memory_map(source)
+        reader = pyarrow.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).select(l_cols).to_pandas().astype(d_dtypes)
+    else:
+        raise ValueError('{} files cannot be read in chunks. Please save the data as .csv or .parquet instead.'.format(file_format))
+
+###################################################################
+
+
+###################################################################
+# 3 Descriptive statistics of files that do not fit into memory
+# 3.1 Returns a table with the same columns and index as StatsResults.df_cell_stats
+#     (W, pval & normal are NaN, since the Shapiro-Wilk test requires the complete data).
+#     As in the engine, cells are (group, session) combinations for mixed-model ANOVAs and
+#     only the group is described for one-sample tests.
+def summarize_in_chunks(source, test, chunksize=DEFAULT_CHUNKSIZE, filename=None, file_format=None, float32=False,
+                        max_centroids=DEFAULT_MAX_CENTROIDS, **column_roles):
+    open_source, file_format = get_source_opener(source, filename, file_format)
+    index_name, l_cols, d_dtypes, d_column_roles = get_columns_to_load(open_source, file_format, test, categorical=False,
+                                                                       float32=float32, **column_roles)
+    l_cell_cols = [d_column_roles['group_col']]
+    if test == 'mixed_model_ANOVA':
+        l_cell_cols.append(d_column_roles['session_col'])
+
+    d_summaries = {}
+    for chunk in iter_chunks(open_source, file_format, index_name, l_cols, d_dtypes, chunksize):
+        values = chunk[d_column_roles['data_col']].to_numpy()
+        for key, indices in get_cell_indices(chunk, l_cell_cols).items():
+            if key not in d_summaries:
+                d_summaries[key] = CellSummary(max_centroids)
+            d_summaries[key].update(values[indices])
+
+    if len(d_summaries) == 0:
+        raise ValueError('There are no data to summarize.')
+
+    l_keys = list(d_summaries.keys())
+    if test == 'mixed_model_ANOVA':
+        # Same order as in the engine: all sessions of the first group, then all sessions of the second group, ...
+        l_groups = list(dict.fromkeys(key[0] for key in l_keys))
+        l_sessions = list(dict.fromkeys(key[1] for key in l_keys))
+        l_keys = [(group_id, session_id) for group_id in l_groups for session_id in l_sessions if (group_id, session_id) in d_summaries]
+        index = pd.MultiIndex.from_tuples(l_keys)
+    else:
+        if test == 'one_sample':
+            l_keys = l_keys[:1]
+        index = pd.Index(l_keys)
+
+    n_obs = np.array([d_summaries[key].n for key in l_keys])
+    stddevs = np.array([d_summaries[key].get_std() for key in l_keys])
+    return pd.DataFrame({'n': n_obs,
+                         'mean': [d_summaries[key].mean if d_summaries[key].n > 0 else np.nan for key in l_keys],
+                         'median': [d_summaries[key].sketch.quantile(0.5) for key in l_keys],
+                         'std': stddevs,
+                         'sem': stddevs / np.sqrt(n_obs),
+                         'W': np.nan,
+                         'pval': np.nan,
+                         'normal': np.nan}, index=index)
+
+
+# 3.2 Write the summaries in the layout of the "Individual group statistics" sheet of the widget:
+def write_streamed_stats_to_excel(df_cell_stats, path):
+    with pd.ExcelWriter(path) as writer:
+        get_cell_stats_for_download(df_cell_stats, normality_test='not available for streamed data').to_excel(writer, sheet_name='Individual group statistics')
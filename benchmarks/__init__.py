@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Statistics_and_plotting is not installed as a package: import it from the root of the repository
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
@@ -0,0 +1,54 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+# Dependencies that the package imports lazily are imported here, so that the first import is not part of the timings
+import pingouin  # noqa: F401
+import seaborn  # noqa: F401
+
+from Statistics_and_plotting.engine import TESTS, compute_stats
+from Statistics_and_plotting.export import get_result_tables, write_figure, write_tables
+from Statistics_and_plotting.plotting import PlotSettings, create_plot, get_all_stats_to_annotate
+
+from .synthetic_data import make_data
+
+matplotlib.use('Agg')
+
+###################################################################
+#Overview:
+
+    # 1 Wall time & memory peak of the downloads (.xlsx tables & .png figure)
+
+###################################################################
+
+
+###################################################################
+# 1 Wall time & memory peak of the downloads (.xlsx tables & .png figure)
+class Export:
+    params = (list(TESTS), [100, 10000])
+    param_names = ['test', 'n_rows']
+    timeout = 180
+
+    def setup(self, test, n_rows):
+        df = make_data(test, n_rows)
+        self.results = compute_stats(df, test)
+        np.random.seed(0)
+        self.fig = create_plot(df, self.results, PlotSettings(plot_type=3), get_all_stats_to_annotate(self.results))
+
+    def teardown(self, test, n_rows):
+        plt.close('all')
+
+    def time_write_xlsx(self, test, n_rows):
+        write_tables(get_result_tables(self.results), 'xlsx')
+
+    def peakmem_write_xlsx(self, test, n_rows):
+        write_tables(get_result_tables(self.results), 'xlsx')
+
+    def time_write_png(self, test, n_rows):
+        write_figure(self.fig, 'png', dpi=300)
+
+    def peakmem_write_png(self, test, n_rows):
+        write_figure(self.fig, 'png', dpi=300)
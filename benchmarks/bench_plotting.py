@@ -0,0 +1,64 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+# Dependencies that the package imports lazily are imported here, so that the first import is not part of the timings
+import pingouin  # noqa: F401
+import seaborn  # noqa: F401
+
+from Statistics_and_plotting.engine import TESTS, compute_stats
+from Statistics_and_plotting.plotting import PlotSession, PlotSettings, get_all_stats_to_annotate
+
+from .synthetic_data import make_data
+
+matplotlib.use('Agg')
+
+###################################################################
+#Overview:
+
+    # 1 Wall time & memory peak of plotting with all comparisons annotated
+
+# Plot types are given by their index (see plotting.PLOT_TYPES): 0 is the
+# stripplot (pointplot for mixed-model ANOVAs), 1 the boxplot, 2 the boxplot
+# with scatterplot overlay, and 3 the violinplot.
+
+###################################################################
+
+
+###################################################################
+# 1 Wall time & memory peak of plotting with all comparisons annotated
+class Plotting:
+    params = (list(TESTS), [0, 1, 2, 3], [100, 10000])
+    param_names = ['test', 'plot_type', 'n_rows']
+    timeout = 180
+
+    def setup(self, test, plot_type, n_rows):
+        self.df = make_data(test, n_rows)
+        self.results = compute_stats(self.df, test)
+        self.l_stats_to_annotate = get_all_stats_to_annotate(self.results)
+        self.settings = PlotSettings(plot_type=plot_type)
+        # The jitter of stripplots is random
+        np.random.seed(0)
+        self.session = PlotSession(self.df, self.results, self.settings, self.l_stats_to_annotate)
+
+    def teardown(self, test, plot_type, n_rows):
+        plt.close('all')
+
+    # Plot & annotate from scratch, as for the first click on the plotting button or in batch mode
+    def time_create_plot(self, test, plot_type, n_rows):
+        fig = PlotSession(self.df, self.results, self.settings, self.l_stats_to_annotate).fig
+        fig.canvas.draw()
+        plt.close(fig)
+
+    def peakmem_create_plot(self, test, plot_type, n_rows):
+        fig = PlotSession(self.df, self.results, self.settings, self.l_stats_to_annotate).fig
+        fig.canvas.draw()
+        plt.close(fig)
+
+    # Only the annotations are redrawn, e.g. after changing the distance of the brackets to the data
+    def time_update_annotations(self, test, plot_type, n_rows):
+        self.session.update(PlotSettings(plot_type=self.settings.plot_type, distance_brackets_to_data=0.2), self.l_stats_to_annotate)
+        self.session.update(self.settings, self.l_stats_to_annotate)
@@ -0,0 +1,63 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+# Dependencies that the engine imports lazily are imported here, so that the first import is not part of the timings
+import pingouin  # noqa: F401
+import scipy.stats  # noqa: F401
+
+from Statistics_and_plotting.engine import compute_stats
+
+from .synthetic_data import make_independent_samples, make_mixed_model_anova, make_one_sample
+
+###################################################################
+#Overview:
+
+    # 1 Wall time & memory peak of the statistics of each test
+
+###################################################################
+
+
+###################################################################
+# 1 Wall time & memory peak of the statistics of each test
+class IndependentSamples:
+    params = ([100, 1000, 10000, 100000], [2, 4, 8])
+    param_names = ['n_rows', 'n_groups']
+
+    def setup(self, n_rows, n_groups):
+        self.df = make_independent_samples(n_rows, n_groups)
+
+    def time_compute_stats(self, n_rows, n_groups):
+        compute_stats(self.df, 'independent_samples')
+
+    def peakmem_compute_stats(self, n_rows, n_groups):
+        compute_stats(self.df, 'independent_samples')
+
+
+class OneSample:
+    params = [100, 1000, 10000, 100000]
+    param_names = ['n_rows']
+
+    def setup(self, n_rows):
+        self.df = make_one_sample(n_rows)
+
+    def time_compute_stats(self, n_rows):
+        compute_stats(self.df, 'one_sample')
+
+    def peakmem_compute_stats(self, n_rows):
+        compute_stats(self.df, 'one_sample')
+
+
+class MixedModelANOVA:
+    params = ([10, 100, 1000], [2, 4], [2, 5])
+    param_names = ['n_subjects', 'n_groups', 'n_sessions']
+    timeout = 180
+
+    def setup(self, n_subjects, n_groups, n_sessions):
+        self.df = make_mixed_model_anova(n_subjects, n_groups, n_sessions)
+
+    def time_compute_stats(self, n_subjects, n_groups, n_sessions):
+        compute_stats(self.df, 'mixed_model_ANOVA')
+
+    def peakmem_compute_stats(self, n_subjects, n_groups, n_sessions):
+        compute_stats(self.df, 'mixed_model_ANOVA')
@@ -0,0 +1,85 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+###################################################################
+#Overview:
+
+    # 1 Measure the import time of each module in a fresh interpreter
+    # 2 Command line interface
+
+# Guards the lazy imports (see Statistics_and_plotting/lazy_imports.py) against
+# regressions: each module of the package is imported in a new Python process,
+# and the check fails if it takes longer than the allowed time or if it imports
+# any of the heavy dependencies right away. Run from the root of the repository:
+#
+#   python benchmarks/import_time.py --max-seconds 1.0
+
+###################################################################
+
+
+###################################################################
+# 1 Measure the import time of each module in a fresh interpreter
+MODULES = ('Statistics_and_plotting.engine',
+           'Statistics_and_plotting.plotting',
+           'Statistics_and_plotting.Statistics_and_plotting',
+           'Statistics_and_plotting.batch')
+
+# Must not be imported by "import <module>" alone
+HEAVY_DEPENDENCIES = ('pingouin', 'scipy.stats', 'statsmodels', 'seaborn', 'matplotlib.pyplot', 'ipywidgets')
+
+MEASUREMENT = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{'duration': duration, 'imported': [name for name in {heavy} if name in sys.modules]}}))
+'''
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module, n_repeats=5):
+    l_durations = []
+    for i in range(n_repeats):
+        completed = subprocess.run([sys.executable, '-c', MEASUREMENT.format(module=module, heavy=HEAVY_DEPENDENCIES)],
+                                   cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        d_measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+        l_durations.append(d_measurement['duration'])
+    return {'module': module, 'median': statistics.median(l_durations), 'min': min(l_durations),
+            'imported': d_measurement['imported']}
+
+###################################################################
+
+
+###################################################################
+# 2 Command line interface
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the import time of the modules of Statistics_and_plotting.')
+    parser.add_argument('--repeats', type=int, default=5, help='Number of fresh interpreters per module (default: 5)')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='Fail if the median import time of any module exceeds this value')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in MODULES:
+        d_result = measure_import(module, args.repeats)
+        print('{:<50} median {:.3f} s, min {:.3f} s'.format(module, d_result['median'], d_result['min']))
+        if len(d_result['imported']) > 0:
+            print('    imports heavy dependencies right away: {}'.format(', '.join(d_result['imported'])))
+            failed = True
+        if args.max_seconds is not None and d_result['median'] > args.max_seconds:
+            print('    slower than the allowed {:.3f} s'.format(args.max_seconds))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+### Authors:
+# Dennis Segebarth, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+# Konstantin Kobel, Institute of Clinical Neurobiology, University Hospital of Wuerzburg, Germany
+
+import numpy as np
+import pandas as pd
+
+###################################################################
+#Overview:
+
+    # 1 Synthetic data sets in the layout that the widget expects
+
+# All data sets are reproducible (fixed seed) and have the columns in the
+# order of the widget: data, group_id, subject_id / fixed value, session_id.
+# Groups differ by half a standard deviation per group (and, for mixed-model
+# ANOVAs, additionally per session), so that some comparisons are significant
+# and get annotated.
+
+###################################################################
+
+
+###################################################################
+# 1 Synthetic data sets in the layout that the widget expects
+def get_group_names(n_groups):
+    return ['group_{}'.format(i) for i in range(n_groups)]
+
+
+# 1.1 Independent samples: n_rows values split evenly across n_groups
+def make_independent_samples(n_rows, n_groups=3, seed=0):
+    rng = np.random.default_rng(seed)
+    group_indices = np.arange(n_rows) % n_groups
+    return pd.DataFrame({'data': rng.normal(size=n_rows) + 0.5 * group_indices,
+                         'group_id': np.array(get_group_names(n_groups))[group_indices]})
+
+
+# 1.2 One-sample test: n_rows values of a single group, compared against 0
+def make_one_sample(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'data': rng.normal(loc=0.3, size=n_rows),
+                         'group_id': 'group_0',
+                         'fixed_value': 0.0})
+
+
+# 1.3 Mixed-model ANOVA: n_subjects per group, each measured in all n_sessions (n_groups * n_subjects * n_sessions rows)
+def make_mixed_model_anova(n_subjects, n_groups=2, n_sessions=3, seed=0):
+    rng = np.random.default_rng(seed)
+    group_indices = np.repeat(np.arange(n_groups), n_subjects * n_sessions)
+    subject_indices = np.repeat(np.arange(n_groups * n_subjects), n_sessions)
+    session_indices = np.tile(np.arange(n_sessions), n_groups * n_subjects)
+    subject_offsets = rng.normal(scale=0.5, size=n_groups * n_subjects)
+    values = rng.normal(size=group_indices.shape[0]) + subject_offsets[subject_indices] + 0.5 * group_indices * session_indices
+    return pd.DataFrame({'data': values,
+                         'group_id': np.array(get_group_names(n_groups))[group_indices],
+                         'subject_id': ['subject_{}'.format(i) for i in subject_indices],
+                         'session_id': ['session_{}'.format(i) for i in session_indices]})
+
+
+# 1.4 Data set with (about) n_rows rows for any of the tests
+def make_data(test, n_rows, n_groups=3, n_sessions=3, seed=0):
+    if test == 'independent_samples':
+        return make_independent_samples(n_rows, n_groups, seed)
+    elif test == 'one_sample':
+        return make_one_sample(n_rows, seed)
+    elif test == 'mixed_model_ANOVA':
+        return make_mixed_model_anova(max(n_rows // (n_groups * n_sessions), 2), n_groups, n_sessions, seed)
+    raise ValueError('Unknown test "{}".'.format(test))
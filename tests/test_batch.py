@@ -0,0 +1,18 @@
+import os
+import pytest
+
+from Statistics_and_plotting.batch import get_output_prefixes
+
+
+def test_files_with_the_same_name_keep_their_extension_in_the_prefix():
+    l_paths = [os.path.join('data', 'ind.csv'), os.path.join('data', 'ind.parquet'), os.path.join('data', 'mma.csv')]
+    assert get_output_prefixes(l_paths) == [os.path.join('data', 'ind_csv'), os.path.join('data', 'ind_parquet'),
+                                            os.path.join('data', 'mma')]
+    assert get_output_prefixes(l_paths[2:], 'results') == [os.path.join('results', 'mma')]
+
+
+def test_same_file_name_in_different_directories_raises_with_one_output_dir():
+    l_paths = [os.path.join('day1', 'ind.csv'), os.path.join('day2', 'ind.csv')]
+    assert get_output_prefixes(l_paths) == [os.path.join('day1', 'ind'), os.path.join('day2', 'ind')]
+    with pytest.raises(ValueError, match='would overwrite each other'):
+        get_output_prefixes(l_paths, 'results')
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from Statistics_and_plotting import cache
+from Statistics_and_plotting.cache import ResultCache, get_cache_key
+from Statistics_and_plotting.comparisons import ComparisonPlan
+
+
+def make_table(seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'data': rng.normal(size=30), 'group_id': np.repeat(['a', 'b', 'c'], 10),
+                         'comment': 'unused'})
+
+
+def test_key_only_depends_on_the_analyzed_data():
+    df = make_table()
+    key = get_cache_key(df, 'independent_samples', data_col='data', group_col='group_id')
+    df_other = df.assign(comment='changed').set_index(np.arange(30) + 100)
+    assert get_cache_key(df_other, 'independent_samples', data_col='data', group_col='group_id') == key
+    assert get_cache_key(df, 'independent_samples', ComparisonPlan(), data_col='data', group_col='group_id') == key
+
+    df_changed = df.copy()
+    df_changed.loc[3, 'data'] += 1e-9
+    l_other_keys = [get_cache_key(df_changed, 'independent_samples', data_col='data', group_col='group_id'),
+                    get_cache_key(df.astype({'group_id': 'category'}), 'independent_samples', data_col='data', group_col='group_id'),
+                    get_cache_key(df, 'independent_samples', ComparisonPlan(groups='vs_control'), data_col='data', group_col='group_id'),
+                    get_cache_key(df, 'one_sample', data_col='data', group_col='group_id', fixed_val_col='data')]
+    assert key not in l_other_keys
+    assert len(set(l_other_keys)) == len(l_other_keys)
+
+
+def test_new_cache_version_invalidates_entries_on_disk(tmp_path, monkeypatch):
+    df = make_table()
+    key = get_cache_key(df, 'independent_samples', data_col='data', group_col='group_id')
+    ResultCache(cache_dir=str(tmp_path)).put(key, 'results')
+    assert ResultCache(cache_dir=str(tmp_path)).get(key) == 'results'
+
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + 1)
+    new_key = get_cache_key(df, 'independent_samples', data_col='data', group_col='group_id')
+    assert new_key != key
+    assert new_key not in ResultCache(cache_dir=str(tmp_path))
+
+
+def test_least_recently_used_entries_are_evicted_from_memory(tmp_path):
+    result_cache = ResultCache(max_entries=2, cache_dir=str(tmp_path))
+    result_cache.put('a', 1)
+    result_cache.put('b', 2)
+    assert result_cache.get('a') == 1
+    result_cache.put('c', 3)
+    assert list(result_cache.d_entries) == ['a', 'c']
+    # Evicted entries are read again from disk
+    assert result_cache.get('b') == 2
+    assert len(result_cache) == 2
+
+
+def test_unreadable_entries_are_treated_as_missing(tmp_path):
+    result_cache = ResultCache(cache_dir=str(tmp_path))
+    with open(result_cache.get_path('broken'), 'wb') as cache_file:
+        cache_file.write(b'not a pickle')
+    assert result_cache.get('broken', 'missing') == 'missing'
+
+    l_calls = []
+    for _ in range(2):
+        value = result_cache.get_or_compute('broken', lambda: l_calls.append(1) or 'recomputed')
+    assert value == 'recomputed' and len(l_calls) == 1
+    result_cache.clear()
+    assert 'broken' not in result_cache
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from Statistics_and_plotting.comparisons import (ComparisonPlan, get_planned_group_pairs, get_planned_pairs, plans_all_pairs,
+                                                 resolve_level)
+
+# Levels in the order of the data, and sorted (as in the tables of pingouin)
+L_LEVELS = ['ctrl', 'b', 'a', 'c']
+L_SORTED = ['a', 'b', 'c', 'ctrl']
+
+
+def test_all_pairs_are_combinations_of_the_sorted_levels():
+    assert get_planned_pairs('all', L_LEVELS, L_SORTED) == [('a', 'b'), ('a', 'c'), ('a', 'ctrl'), ('b', 'c'), ('b', 'ctrl'),
+                                                            ('c', 'ctrl')]
+    assert plans_all_pairs(None) and plans_all_pairs(ComparisonPlan())
+    assert not plans_all_pairs(ComparisonPlan(sessions='adjacent'))
+
+
+def test_vs_control_defaults_to_the_first_level_of_the_data():
+    assert get_planned_pairs('vs_control', L_LEVELS, L_SORTED) == [('a', 'ctrl'), ('b', 'ctrl'), ('c', 'ctrl')]
+    assert get_planned_pairs('vs_control', L_LEVELS, L_SORTED, control='b') == [('a', 'b'), ('b', 'c'), ('b', 'ctrl')]
+
+
+def test_adjacent_pairs_follow_the_order_of_the_data():
+    assert get_planned_pairs('adjacent', L_LEVELS, L_SORTED) == [('a', 'b'), ('a', 'c'), ('b', 'ctrl')]
+
+
+def test_explicit_pairs_are_oriented_like_the_table():
+    l_pairs = get_planned_pairs('explicit', L_LEVELS, L_SORTED, l_explicit_pairs=(('ctrl', 'a'), ('c', 'b')))
+    assert l_pairs == [('a', 'ctrl'), ('b', 'c')]
+
+
+@pytest.mark.parametrize('l_explicit_pairs, message', [((), 'at least one pair'),
+                                                        ((('a', 'a'), ), 'cannot be compared with itself'),
+                                                        ((('a', 'b', 'c'), ), 'Please specify the pairs'),
+                                                        ((('a', 'x'), ), 'does not occur in the data')])
+def test_invalid_explicit_pairs_raise(l_explicit_pairs, message):
+    with pytest.raises(ValueError, match=message):
+        get_planned_pairs('explicit', L_LEVELS, L_SORTED, l_explicit_pairs=l_explicit_pairs)
+
+
+def test_numeric_levels_can_be_given_as_text():
+    l_sessions = [1, 2, 10]
+    assert resolve_level('10', l_sessions, 'session_id') == 10
+    assert resolve_level(2, l_sessions, 'session_id') == 2
+    assert get_planned_pairs('vs_control', l_sessions, l_sessions, control='10') == [(1, 10), (2, 10)]
+    assert get_planned_pairs('explicit', l_sessions, l_sessions, l_explicit_pairs=(('10', '1'), )) == [(1, 10)]
+    with pytest.raises(ValueError, match='session_id "3" of the comparison plan'):
+        resolve_level('3', l_sessions, 'session_id')
+
+
+def test_categorical_levels_are_sorted_by_their_categories():
+    series = pd.Series(pd.Categorical(['c', 'b', 'a'], categories=['c', 'b', 'a']))
+    assert get_planned_group_pairs(None, series, ['a', 'b', 'c']) == [('c', 'b'), ('c', 'a'), ('b', 'a')]
+    plan = ComparisonPlan(groups='vs_control', control_group='a')
+    assert get_planned_group_pairs(plan, series, ['a', 'b', 'c']) == [('c', 'a'), ('b', 'a')]
+
+
+def test_unknown_plan_raises():
+    with pytest.raises(ValueError, match='Unknown comparison plan'):
+        ComparisonPlan(groups='neighbours')
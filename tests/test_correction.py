@@ -0,0 +1,45 @@
+import numpy as np
+import pingouin as pg
+import pytest
+
+from Statistics_and_plotting.correction import correct_pvals, get_stars
+
+# Names of the methods in pingouin.multicomp
+PINGOUIN_METHODS = {'holm': 'holm', 'bonferroni': 'bonf', 'fdr_bh': 'fdr_bh', 'fdr_by': 'fdr_by', 'none': 'none'}
+
+
+def make_pvals(n, n_missing=0, seed=0):
+    rng = np.random.default_rng(seed)
+    # Small p-values are more common than uniform ones, and some p-values occur twice (ties)
+    pvals = np.round(rng.beta(0.5, 2, n), 3)
+    pvals[rng.choice(n, n_missing, replace=False)] = np.nan
+    return pvals
+
+
+@pytest.mark.parametrize('n, n_missing', [(1, 0), (2, 0), (10, 0), (57, 0), (20, 4)])
+@pytest.mark.parametrize('method', list(PINGOUIN_METHODS))
+def test_correct_pvals_matches_pingouin(method, n, n_missing):
+    pvals = make_pvals(n, n_missing)
+    pvals_expected = pg.multicomp(pvals.copy(), method=PINGOUIN_METHODS[method])[1]
+    np.testing.assert_allclose(correct_pvals(pvals, method), pvals_expected, rtol=1e-12)
+
+
+def test_correct_pvals_keeps_the_shape():
+    pvals = make_pvals(12, 2).reshape(3, 4)
+    pvals_corrected = correct_pvals(pvals, 'holm')
+    assert pvals_corrected.shape == (3, 4)
+    np.testing.assert_allclose(pvals_corrected.ravel(), correct_pvals(pvals.ravel(), 'holm'))
+    assert np.isnan(correct_pvals([np.nan, np.nan], 'fdr_bh')).all()
+    with pytest.raises(ValueError, match='Unknown correction method'):
+        correct_pvals(pvals, 'sidak')
+
+
+def test_stars_bins_include_their_upper_threshold():
+    pvals = [0.0, 0.0005, 0.001, 0.0011, 0.01, 0.02, 0.05, 0.051, 1.0, np.nan]
+    assert list(get_stars(pvals)) == ['***', '***', '***', '**', '**', '*', '*', 'n.s.', 'n.s.', 'n.s.']
+    assert get_stars(0.01) == '**'
+    assert list(get_stars([0.04, 0.2], thresholds=(0.1, ), labels=('+', '-'))) == ['+', '-']
+    with pytest.raises(ValueError, match='one label more than thresholds'):
+        get_stars(0.01, thresholds=(0.01, 0.05), labels=('*', 'n.s.'))
+    with pytest.raises(ValueError, match='ascending order'):
+        get_stars(0.01, thresholds=(0.05, 0.01), labels=('*', '**', 'n.s.'))
@@ -0,0 +1,50 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from Statistics_and_plotting.engine import compute_stats
+
+
+# A missing value must not count as an observation of its cell
+def test_cell_stats_ignore_missing_values():
+    df = pd.DataFrame({'data': [1.0, 2.0, 3.0, 4.0, np.nan, 2.0, 4.0, 5.0, 7.0, 8.0],
+                       'group_id': ['a'] * 5 + ['b'] * 5})
+    results = compute_stats(df, 'independent_samples')
+    cell_stats = results.df_cell_stats.loc['a']
+    values = np.array([1.0, 2.0, 3.0, 4.0])
+
+    assert cell_stats['n'] == 4
+    assert cell_stats['mean'] == pytest.approx(2.5)
+    assert cell_stats['std'] == pytest.approx(values.std())
+    assert cell_stats['sem'] == pytest.approx(values.std() / 2)
+    assert cell_stats['W'] == pytest.approx(stats.shapiro(values).statistic)
+    assert not np.isnan(results.df_homoscedasticity['W'].iloc[0])
+    assert results.d_cells['a'].shape == (4, )
+
+
+# A group with only missing values is kept with n=0 and NaN statistics, without numpy RuntimeWarnings
+def test_empty_cells_get_nan_without_runtime_warnings():
+    df = pd.DataFrame({'data': [1.0, 2.0, 3.0, 4.0, np.nan, np.nan, np.nan, 5.0, 7.0, 8.0, 2.0, 4.0],
+                       'group_id': ['a'] * 4 + ['b'] * 3 + ['c'] * 5})
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        results = compute_stats(df, 'independent_samples')
+    cell_stats = results.df_cell_stats.loc['b']
+    assert cell_stats['n'] == 0
+    assert cell_stats[['mean', 'median', 'std', 'sem', 'W', 'pval']].isna().all()
+    # Levene´s test of the groups with data
+    assert results.df_homoscedasticity['W'].iloc[0] == pytest.approx(stats.levene(df['data'][:4], df['data'][7:]).statistic)
+
+
+@pytest.mark.parametrize('test, df, message', [
+    ('independent_samples', pd.DataFrame({'data': [1.0, 2.0, np.nan, np.nan], 'group_id': ['a', 'a', 'b', 'b']}),
+     'no data for group_id "b"'),
+    ('one_sample', pd.DataFrame({'data': [np.nan, np.nan], 'group_id': ['a', 'a'], 'fixed_value': [0.0, 0.0]}),
+     'no data for group_id "a"')])
+def test_missing_data_raise_a_clear_error(test, df, message):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        with pytest.raises(ValueError, match=message):
+            compute_stats(df, test)
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from Statistics_and_plotting.engine import compute_stats
+from Statistics_and_plotting.ingestion import load_table
+
+
+# Seeded long table of a mixed design with numeric session IDs (as they are often exported)
+def make_numeric_sessions(l_sessions=(1, 2, 10), n_subjects=6, seed=0):
+    rng = np.random.default_rng(seed)
+    l_rows = [(rng.normal(), 'ab'[subject % 2], subject, session) for subject in range(n_subjects) for session in l_sessions]
+    return pd.DataFrame(l_rows, columns=['data', 'group_id', 'subject', 'session_id'])
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'parquet'])
+def test_numeric_ids_keep_their_numeric_order(tmp_path, file_format):
+    df = make_numeric_sessions()
+    path = tmp_path / 'data.{}'.format(file_format)
+    if file_format == 'csv':
+        df.to_csv(path)
+    else:
+        pytest.importorskip('pyarrow')
+        df.to_parquet(path)
+
+    df_loaded = load_table(str(path), 'mixed_model_ANOVA')
+    assert isinstance(df_loaded['session_id'].dtype, pd.CategoricalDtype)
+    assert list(df_loaded['session_id'].cat.categories) == [1, 2, 10]
+    assert list(df_loaded['subject'].cat.categories) == list(range(6))
+
+    df_pairwise = compute_stats(df_loaded, 'mixed_model_ANOVA').d_main['summary']['pairwise_comparisons']
+    df_expected = compute_stats(df, 'mixed_model_ANOVA').d_main['summary']['pairwise_comparisons']
+    assert_frame_equal(df_pairwise.astype({'A': str, 'B': str}), df_expected.astype({'A': str, 'B': str}))
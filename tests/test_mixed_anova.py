@@ -0,0 +1,72 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pingouin as pg
+import pytest
+from pandas.testing import assert_frame_equal
+
+from Statistics_and_plotting.engine import compute_stats
+from Statistics_and_plotting.mixed_anova import compute_mixed_anova, get_subject_matrix
+
+
+# Seeded long table of a mixed design: d_sizes {group_id: number of subjects}. n_missing rows are dropped
+# (incomplete subjects), n_duplicates rows are measured twice; unequal_variance breaks sphericity.
+def make_mixed_design(d_sizes, n_sessions=3, n_missing=0, n_duplicates=0, unequal_variance=False, seed=1):
+    rng = np.random.default_rng(seed)
+    l_rows, subject_id = [], 0
+    for shift, (group_id, n_subjects) in enumerate(d_sizes.items()):
+        for _ in range(n_subjects):
+            subject_mean = rng.normal(shift, 1)
+            for session in range(n_sessions):
+                value = subject_mean + rng.normal(0.3 * session, 1)
+                if unequal_variance and session == n_sessions - 1:
+                    value += rng.normal(0, 4)
+                l_rows.append((value, group_id, 'sub{:03d}'.format(subject_id), 't{}'.format(session)))
+            subject_id += 1
+    df = pd.DataFrame(l_rows, columns=['data', 'group_id', 'subject', 'session_id'])
+    if n_missing > 0:
+        df = df.drop(df.sample(n_missing, random_state=seed).index)
+    if n_duplicates > 0:
+        df = pd.concat([df, df.sample(n_duplicates, random_state=seed).assign(data=lambda df_dup: df_dup['data'] + 1)])
+    return df.reset_index(drop=True)
+
+
+CASES = {'two_sessions': dict(d_sizes={'a': 10, 'b': 11}, n_sessions=2),
+         'unequal_groups': dict(d_sizes={'a': 8, 'b': 12, 'c': 9}, n_sessions=4),
+         'missing_sessions': dict(d_sizes={'a': 15, 'b': 12}, n_sessions=4, n_missing=5, n_duplicates=4),
+         'sphericity_rejected': dict(d_sizes={'a': 20, 'b': 20}, n_sessions=4, unequal_variance=True)}
+
+
+@pytest.mark.parametrize('case', list(CASES))
+def test_mixed_anova_matches_pingouin(case):
+    df = make_mixed_design(**CASES[case])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        matrix = get_subject_matrix(df, 'data', 'group_id', 'subject', 'session_id')
+    df_aov = compute_mixed_anova(matrix, 'group_id', 'session_id')
+    df_expected = pg.mixed_anova(data=df, dv='data', within='session_id', subject='subject', between='group_id')
+    assert_frame_equal(df_aov, df_expected, rtol=1e-9, check_dtype=False)
+    if case == 'sphericity_rejected':
+        assert 'p-GG-corr' in df_aov.columns
+
+
+@pytest.mark.parametrize('case', list(CASES))
+def test_mixed_pairwise_tests_match_pingouin(case):
+    df = make_mixed_design(**CASES[case])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = compute_stats(df, 'mixed_model_ANOVA')
+    df_pairwise = results.d_main['summary']['pairwise_comparisons']
+    df_expected = pg.pairwise_tests(data=df, dv='data', within='session_id', subject='subject', between='group_id',
+                                    padjust='holm')
+    # Missing entries of the text column p-adjust are None in one table and NaN in the other
+    assert_frame_equal(df_pairwise.astype({'p-adjust': str}), df_expected.astype({'p-adjust': str}), rtol=1e-9,
+                       check_dtype=False)
+
+
+def test_incomplete_subjects_are_excluded_with_a_warning():
+    df = make_mixed_design({'a': 10, 'b': 10}, n_missing=3)
+    with pytest.warns(UserWarning, match='do not have data in every session_id'):
+        matrix = get_subject_matrix(df, 'data', 'group_id', 'subject', 'session_id')
+    assert matrix.values.shape[0] + matrix.n_excluded == 20
+    assert not np.isnan(matrix.values).any()
@@ -0,0 +1,37 @@
+import warnings
+import numpy as np
+import pytest
+
+from Statistics_and_plotting.correction import correct_pvals, get_stars
+from Statistics_and_plotting.multi_variable import compute_stats_multi, correct_across_variables, get_consolidated_results
+
+from test_mixed_anova import make_mixed_design
+
+
+@pytest.fixture(scope='module')
+def d_results():
+    df = make_mixed_design({'a': 10, 'b': 9, 'c': 8}, n_sessions=3)
+    df['freezing'] = np.random.default_rng(5).normal(size=df.shape[0]) + df['data']
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return compute_stats_multi(df, 'mixed_model_ANOVA', data_cols=['data', 'freezing'], group_col='group_id',
+                                   subject_col='subject', session_col='session_id')
+
+
+def test_consolidated_table_holds_the_uncorrected_pvals_of_each_family(d_results):
+    df_consolidated = get_consolidated_results(d_results)
+    assert list(df_consolidated['Variable'].unique()) == ['data', 'freezing']
+    np.testing.assert_array_equal(df_consolidated['p-value'], df_consolidated['p-unc'])
+    assert list(df_consolidated['correction family'].unique()) == ['group level', 'pairwise: session_id', 'pairwise: group_id',
+                                                                   'pairwise: session_id * group_id']
+
+
+@pytest.mark.parametrize('method', ['fdr_bh', 'fdr_by', 'holm'])
+def test_correction_across_variables_within_each_family(d_results, method):
+    df_consolidated = get_consolidated_results(d_results, fdr_method=method)
+    assert df_consolidated.equals(correct_across_variables(get_consolidated_results(d_results), method))
+    for family, df_family in df_consolidated.groupby('correction family'):
+        pvals_expected = correct_pvals(df_family['p-value'], method)
+        np.testing.assert_allclose(df_family['p-value (corrected across variables)'], pvals_expected)
+        assert list(df_family['stars (corrected across variables)']) == list(get_stars(pvals_expected))
+    assert (df_consolidated['correction across variables'] == method).all()
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pingouin as pg
+import pytest
+from pandas.testing import assert_frame_equal
+
+from Statistics_and_plotting.comparisons import get_planned_group_pairs
+from Statistics_and_plotting.engine import partition_cells
+from Statistics_and_plotting.pairwise import pairwise_tests_independent
+
+
+# Seeded data of several groups: d_sizes {group_id: n}, decimals: rounding (which creates ties)
+def make_groups(d_sizes, decimals=None, n_missing=0, seed=0):
+    rng = np.random.default_rng(seed)
+    l_rows = []
+    for shift, (group_id, n) in enumerate(d_sizes.items()):
+        values = rng.normal(shift * 0.5, 1.5, n)
+        if decimals is not None:
+            values = np.round(values, decimals)
+        l_rows += [(value, group_id) for value in values]
+    df = pd.DataFrame(l_rows, columns=['data', 'group_id'])
+    if n_missing > 0:
+        df.loc[df.sample(n_missing, random_state=seed).index, 'data'] = np.nan
+    return df
+
+
+CASES = {'equal_n': ({'a': 10, 'b': 10, 'c': 10}, None, 0),
+         'unequal_n': ({'a': 10, 'b': 14, 'c': 7, 'd': 20}, None, 0),
+         'small_n_exact': ({'a': 5, 'b': 6, 'c': 8}, None, 0),
+         'ties': ({'a': 12, 'b': 9, 'c': 30}, 0, 0),
+         'small_n_ties': ({'a': 5, 'b': 6}, 0, 0),
+         'missing_values': ({'z': 10, 'b': 12, 'c': 15}, 1, 5)}
+
+
+@pytest.mark.parametrize('parametric', [True, False])
+@pytest.mark.parametrize('case', list(CASES))
+def test_pairwise_tests_match_pingouin(case, parametric):
+    d_sizes, decimals, n_missing = CASES[case]
+    df = make_groups(d_sizes, decimals, n_missing)
+    d_cells = partition_cells(df, 'data', ['group_id'])
+    l_groups = list(d_cells)
+    l_pairs = get_planned_group_pairs(None, df['group_id'], l_groups)
+
+    df_pairwise = pairwise_tests_independent(d_cells, l_groups, l_pairs, 'group_id', parametric)
+    df_expected = pg.pairwise_tests(data=df, dv='data', between='group_id', parametric=parametric, padjust='holm')
+    df_expected = df_expected.drop(columns=['BF10'], errors='ignore')
+    assert_frame_equal(df_pairwise, df_expected, rtol=1e-9, check_dtype=False)
+
+
+@pytest.mark.parametrize('parametric', [True, False])
+def test_pairs_with_an_empty_group_get_nan(parametric):
+    df = make_groups({'a': 10, 'b': 12, 'c': 9})
+    df.loc[df['group_id'] == 'b', 'data'] = np.nan
+    d_cells = partition_cells(df, 'data', ['group_id'])
+    l_groups = list(d_cells)
+    l_pairs = get_planned_group_pairs(None, df['group_id'], l_groups)
+
+    with np.errstate(all='raise'):
+        df_pairwise = pairwise_tests_independent(d_cells, l_groups, l_pairs, 'group_id', parametric)
+    with_empty_group = (df_pairwise['A'] == 'b') | (df_pairwise['B'] == 'b')
+    assert df_pairwise.loc[with_empty_group, ['p-unc', 'p-corr']].isna().all().all()
+    # The remaining pair is the only test of the Holm correction
+    df_expected = pg.pairwise_tests(data=df[df['group_id'] != 'b'], dv='data', between='group_id', parametric=parametric)
+    assert df_pairwise.loc[~with_empty_group, 'p-unc'].iloc[0] == pytest.approx(df_expected['p-unc'].iloc[0], rel=1e-9)
+    assert df_pairwise.loc[~with_empty_group, 'p-corr'].iloc[0] == pytest.approx(df_expected['p-unc'].iloc[0], rel=1e-9)
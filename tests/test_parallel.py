@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from Statistics_and_plotting.multi_variable import compute_stats_multi
+from Statistics_and_plotting.parallel import attach_dataframe, release_shared_dataframe, share_dataframe
+
+
+# Seeded table with two variables and a categorical group_id in a custom order
+def make_categorical_groups(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    group_ids = np.repeat(['a', 'b', 'c'], n)
+    return pd.DataFrame({'speed': rng.normal(size=3 * n), 'freezing': rng.normal(size=3 * n),
+                         'group_id': pd.Categorical(group_ids, categories=['c', 'b', 'a'])},
+                        index=np.arange(3 * n))
+
+
+def test_shared_dataframe_keeps_categorical_dtype():
+    df = make_categorical_groups().assign(ordered=lambda df: df['group_id'].cat.as_ordered())
+    l_shms, l_spec = share_dataframe(df)
+    try:
+        df_attached = attach_dataframe(l_spec)
+    finally:
+        release_shared_dataframe(l_shms)
+    assert_frame_equal(df_attached, df.reset_index(drop=True))
+
+
+def test_parallel_results_match_serial_results_for_categorical_groups():
+    df = make_categorical_groups()
+    d_serial = compute_stats_multi(df, 'independent_samples', data_cols=['speed', 'freezing'], n_workers=1, group_col='group_id')
+    d_parallel = compute_stats_multi(df, 'independent_samples', data_cols=['speed', 'freezing'], n_workers=2, group_col='group_id')
+    for data_col in ['speed', 'freezing']:
+        df_serial = d_serial[data_col].d_main['summary']['pairwise_comparisons']
+        assert list(df_serial['A'][:2]) == ['c', 'c']
+        assert_frame_equal(d_parallel[data_col].d_main['summary']['pairwise_comparisons'], df_serial)
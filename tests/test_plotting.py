@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from Statistics_and_plotting.plotting import PlotSettings, subsample_cell
+
+
+@pytest.mark.parametrize('max_points', [-1, 0, 1])
+def test_max_points_per_group_below_two_is_rejected(max_points):
+    with pytest.raises(ValueError, match='max_points_per_group has to be at least 2'):
+        PlotSettings(max_points_per_group=max_points)
+
+
+def test_smallest_subsample_keeps_the_extremes():
+    values = np.array([3.0, np.nan, -5.0, 1.0, 8.0, 2.0])
+    assert PlotSettings(max_points_per_group=None).max_points_per_group is None
+    np.testing.assert_array_equal(subsample_cell(np.random.default_rng(0), np.arange(6), values, 2), [2, 4])
@@ -0,0 +1,29 @@
+from Statistics_and_plotting.profiling import profiling, stage
+
+
+def test_nested_stages_are_reported_after_their_enclosing_stage():
+    with profiling('nested') as profile:
+        with stage('compute_stats'):
+            with stage('mixed_anova'):
+                pass
+            with stage('pairwise_tests'):
+                with stage('correction'):
+                    pass
+        with stage('compute_stats'):
+            with stage('mixed_anova'):
+                pass
+    l_stages = profile.get_report()['stages']
+    assert [d_stage['stage'] for d_stage in l_stages] == ['compute_stats', 'compute_stats/mixed_anova',
+                                                          'compute_stats/pairwise_tests',
+                                                          'compute_stats/pairwise_tests/correction']
+    assert [d_stage['depth'] for d_stage in l_stages] == [0, 1, 1, 2]
+    assert [d_stage['calls'] for d_stage in l_stages] == [2, 2, 1, 1]
+
+
+def test_running_stages_are_not_reported():
+    with profiling('running') as profile:
+        with stage('compute_stats'):
+            with stage('mixed_anova'):
+                pass
+            l_stages = profile.get_report()['stages']
+    assert [d_stage['stage'] for d_stage in l_stages] == ['compute_stats/mixed_anova']
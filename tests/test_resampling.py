@@ -0,0 +1,50 @@
+import warnings
+import numpy as np
+import pytest
+from pandas.testing import assert_frame_equal
+
+from Statistics_and_plotting.correction import correct_pvals
+from Statistics_and_plotting.engine import compute_stats
+from Statistics_and_plotting.resampling import bootstrap_ci_pairwise, permutation_test_group_level, permutation_test_pairwise
+
+from test_mixed_anova import make_mixed_design
+
+
+def get_results(df, test='mixed_model_ANOVA'):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return compute_stats(df, test)
+
+
+def test_mixed_permutation_tests_are_corrected_like_the_interaction_block():
+    results = get_results(make_mixed_design({'a': 8, 'b': 9, 'c': 7}, n_sessions=3))
+    df_permutation = permutation_test_pairwise(results, n_resamples=2000, seed=0)
+
+    df_pairwise = results.d_main['summary']['pairwise_comparisons']
+    df_interaction = df_pairwise[df_pairwise['Contrast'] == 'session_id * group_id']
+    # Same comparisons in the same order as the engine, corrected in one family across all sessions (as the engine)
+    assert df_permutation[['session_id', 'A', 'B']].values.tolist() == df_interaction[['session_id', 'A', 'B']].values.tolist()
+    np.testing.assert_allclose(df_interaction['p-corr'], correct_pvals(df_interaction['p-unc'], method='holm'))
+    np.testing.assert_allclose(df_permutation['p-perm-corr'], correct_pvals(df_permutation['p-perm'], method='holm'))
+    assert (df_permutation['p-perm-corr'] >= df_permutation.groupby('session_id')['p-perm'].transform(
+        lambda pvals: correct_pvals(pvals, method='holm'))).all()
+
+
+# The resamples are drawn from one seed sequence per job and chunk, so that the results only depend on the seed
+@pytest.mark.parametrize('chunksize', [None, 300])
+@pytest.mark.parametrize('resample', [permutation_test_pairwise, bootstrap_ci_pairwise])
+def test_pairwise_resampling_does_not_depend_on_the_number_of_workers(resample, chunksize):
+    results = get_results(make_mixed_design({'a': 8, 'b': 9}, n_sessions=2))
+    df_serial = resample(results, n_resamples=1000, seed=42, chunksize=chunksize, n_workers=1)
+    df_parallel = resample(results, n_resamples=1000, seed=42, chunksize=chunksize, n_workers=2)
+    assert_frame_equal(df_parallel, df_serial)
+
+
+def test_group_level_permutation_test_does_not_depend_on_the_number_of_workers():
+    df = make_mixed_design({'a': 8, 'b': 9, 'c': 6}, n_sessions=3)
+    results = get_results(df)
+    df_serial = permutation_test_group_level(df, results, n_resamples=500, seed=7, chunksize=200, n_workers=1)
+    df_parallel = permutation_test_group_level(df, results, n_resamples=500, seed=7, chunksize=200, n_workers=2)
+    assert_frame_equal(df_parallel, df_serial)
+    df_other_seed = permutation_test_group_level(df, results, n_resamples=500, seed=8, chunksize=200, n_workers=1)
+    assert not df_other_seed.equals(df_serial)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from Statistics_and_plotting.engine import get_cell_indices, get_cell_stats, partition_cells
+from Statistics_and_plotting.streaming import summarize_in_chunks
+
+L_DESCRIPTIVE_COLS = ['n', 'mean', 'median', 'std', 'sem']
+
+
+# Seeded long table with unequal cells and missing values
+def make_long_table(n_rows=500, n_missing=20, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'data': rng.normal(10, 3, n_rows),
+                       'group_id': rng.choice(['ctrl', 'drug', 'sham'], n_rows, p=[0.5, 0.3, 0.2]),
+                       'subject': rng.integers(0, 50, n_rows),
+                       'session_id': rng.choice(['t0', 't1', 't2'], n_rows)})
+    df.loc[rng.choice(n_rows, n_missing, replace=False), 'data'] = np.nan
+    return df
+
+
+def get_expected_cell_stats(df, l_cell_cols):
+    d_cells = partition_cells(df, 'data', l_cell_cols, get_cell_indices(df, l_cell_cols))
+    return get_cell_stats(d_cells, list(d_cells))[L_DESCRIPTIVE_COLS]
+
+
+@pytest.mark.parametrize('chunksize', [1, 37, 10000])
+@pytest.mark.parametrize('test, l_cell_cols', [('independent_samples', ['group_id']),
+                                               ('mixed_model_ANOVA', ['group_id', 'session_id'])])
+def test_streamed_cell_stats_match_the_engine(tmp_path, test, l_cell_cols, chunksize):
+    df = make_long_table()
+    df.to_csv(tmp_path / 'data.csv')
+    d_column_roles = {'data_col': 'data', 'group_col': 'group_id'}
+    if test == 'mixed_model_ANOVA':
+        d_column_roles.update(subject_col='subject', session_col='session_id')
+    df_streamed = summarize_in_chunks(str(tmp_path / 'data.csv'), test, chunksize, **d_column_roles)
+    df_expected = get_expected_cell_stats(df, l_cell_cols)
+    assert_frame_equal(df_streamed[L_DESCRIPTIVE_COLS].sort_index(), df_expected.sort_index(), rtol=1e-12, check_dtype=False)
+    assert df_streamed[['W', 'pval', 'normal']].isna().all().all()
+
+
+def test_median_of_compressed_sketch_is_close():
+    df = make_long_table(n_rows=20000, n_missing=0)
+    buffer = df.to_csv().encode()
+    df_streamed = summarize_in_chunks(buffer, 'independent_samples', 3000, filename='data.csv', max_centroids=256,
+                                      data_col='data', group_col='group_id')
+    df_expected = get_expected_cell_stats(df, ['group_id'])
+    assert_frame_equal(df_streamed[['n', 'mean', 'std']].sort_index(), df_expected[['n', 'mean', 'std']].sort_index(),
+                       rtol=1e-12, check_dtype=False)
+    # The rank of the estimated median is off by at most n / max_centroids values
+    for group_id, median in df_streamed['median'].items():
+        values = np.sort(df.loc[df['group_id'] == group_id, 'data'].to_numpy())
+        rank = np.searchsorted(values, median)
+        assert abs(rank - values.shape[0] / 2) <= values.shape[0] / 256 + 1